@@ -1 +1,36 @@
-from matching_algorithms.main import *
\ No newline at end of file
+import importlib
+
+# Public names and the submodule defining each of them. Submodules are imported on first access, so a job
+# that only runs deferred acceptance never imports PuLP, and importing the package itself loads nothing.
+_SUBMODULES = {
+    'profiles': ('PreferenceProfile', 'SchoolMarket'),
+    'combinatorial': ('MatchingStats', 'add_stats_hook', 'remove_stats_hook', 'deferred_acceptance',
+                      'school_choice_da', 'DAState', 'rematch', 'AdmissionQuery', 'stable_improvement_cycles',
+                      'boston_mechanism', 'top_trading_cycles', 'serial_dictatorship', 'random_serial_dictatorship',
+                      'iter_random_serial_dictatorship', 'random_serial_dictatorship_probabilities'),
+    'lp': ('LPSolver', 'stable_matching_lp', 'egalitarian_stable_matching', 'nash_stable_matching',
+           'utilitarian_stable_matching', 'MatchingLP', 'egalitarian_matching', 'nash_matching',
+           'utilitarian_matching'),
+    'generators': ('generate_instance', 'generate_instance_arrays', 'instance_arrays_to_dicts'),
+    'validation': ('StabilityReport', 'stability_report', 'school_stability_report', 'is_stable'),
+    'cache': ('ResultCache', 'fingerprint', 'enable_cache', 'disable_cache', 'get_cache'),
+    'parallel': ('run_many', 'iter_many'),
+    'storage': ('save_market', 'load_market', 'import_csv'),
+}
+
+_EXPORTS = {name: module for module, names in _SUBMODULES.items() for name in names}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
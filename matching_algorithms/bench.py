@@ -0,0 +1,557 @@
+import argparse
+import datetime
+import fnmatch
+import functools
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pulp
+import matching_algorithms as ma
+
+##Benchmark Instances
+# Instances are generated with generate_instance_arrays from a fixed seed and converted to the
+# dictionary format, so every run of a case times the same markets. The last instances are cached,
+# since the timed functions do not modify their inputs. School choice markets have one school per
+# hundred students, as in large district admissions. Truncated markets give every man or student a
+# list of _LIST_LENGTH partners.
+
+_LIST_LENGTH = 10
+
+
+@functools.lru_cache(maxsize=2)
+def _marriage_instance(size, seed, is_cardinal=False, list_length=None):
+    arrays = ma.generate_instance_arrays(size, is_cardinal=is_cardinal, seed=seed, list_length=list_length)
+    return ma.instance_arrays_to_dicts(*arrays)
+
+
+@functools.lru_cache(maxsize=2)
+def _school_instance(size, seed, list_length=None):
+    arrays = ma.generate_instance_arrays(size, num_schools=max(2, size // 100), is_marriage_market=False, seed=seed,
+                                         list_length=list_length)
+    return ma.instance_arrays_to_dicts(*arrays)
+
+
+def _ordinal_setup(list_length=None, **options):
+    """
+    Returns a setup running a function on an ordinal marriage market.
+    """
+    return lambda size, seed: (_marriage_instance(size, seed, list_length=list_length), options)
+
+
+def _cardinal_setup(**options):
+    """
+    Returns a setup running a function on a cardinal marriage market.
+    """
+    return lambda size, seed: (_marriage_instance(size, seed, is_cardinal=True), options)
+
+
+def _school_setup(list_length=None, **options):
+    """
+    Returns a setup running a function on a school choice market.
+    """
+    return lambda size, seed: (_school_instance(size, seed, list_length), options)
+
+
+def _score_setup(size, seed):
+    """
+    Returns a truncated school choice market with score-based priorities, built from arrays.
+    """
+    arrays = ma.generate_instance_arrays(size, num_schools=max(2, size // 100), is_marriage_market=False, seed=seed,
+                                         list_length=_LIST_LENGTH, score_priorities=True)
+    return arrays, {}
+
+
+def _capacity_setup(**options):
+    """
+    Returns a setup running a function on student preferences and school capacities (serial dictatorships).
+    """
+    def setup(size, seed):
+        students, schools = _school_instance(size, seed)
+        return (students, {school: data['capacity'] for school, data in schools.items()}), options
+    return setup
+
+
+def _stability_setup(size, seed):
+    men, women = _marriage_instance(size, seed)
+    return (ma.deferred_acceptance(men, women), men, women), {}
+
+
+def _school_stability_setup(size, seed):
+    students, schools = _school_instance(size, seed)
+    return (ma.school_choice_da(students, schools), students, schools), {}
+
+
+def _rematch_setup(size, seed):
+    # One percent of the students apply late
+    students, schools = _school_instance(size, seed)
+    late = {f'L{i+1}': preferences for i, preferences in enumerate(list(students.values())[:max(1, size // 100)])}
+    _, state = ma.school_choice_da(students, schools, return_state=True)
+    return (state,), {'new_students': late}
+
+
+def _query_setup(size, seed):
+    # A thousand students ask what moving their second choice to the top would have given them
+    students, schools = _school_instance(size, seed)
+    questions = [(student, preferences[1:2] + preferences[:1] + preferences[2:])
+                 for student, preferences in list(students.items())[:1000]]
+    return (ma.AdmissionQuery(students, schools), questions), {}
+
+
+def _answer_queries(query, questions):
+    return [query.assignment(student, preferences) for student, preferences in questions]
+
+
+def _improvement_setup(size, seed):
+    # Deferred acceptance with multiple tie-breaking over three priority classes, then the improvement step
+    arrays = ma.generate_instance_arrays(size, num_schools=max(2, size // 100), is_marriage_market=False, seed=seed,
+                                         list_length=_LIST_LENGTH, num_priority_classes=3)
+    market = ma.SchoolMarket(*arrays)
+    return (ma.school_choice_da(market, tie_breaking='multiple', seed=seed), market), {}
+
+
+def _solve_all_objectives(men_valuations, women_valuations):
+    # The four objectives on one stability polytope, as in comparison reports
+    model = ma.MatchingLP(men_valuations, women_valuations)
+    return [model.solve(objective) for objective in ('cardinality', 'egalitarian', 'utilitarian', 'nash')]
+
+
+def _arrays_setup(size, seed):
+    return ma.generate_instance_arrays(size, seed=seed), {}
+
+#------------------------------------------------------------------------------------------------------------
+##Benchmark Cases
+
+class Case:
+    """
+    A benchmarked function with the instances it is timed on.
+    
+    Attributes:
+    name (str): Name of the case, the function name with the options in brackets.
+    function (callable): The timed function.
+    setup (callable): setup(size, seed) returns the (args, kwargs) of one call. It is not timed, and is
+                      called again before every call, since some functions update their arguments.
+    sizes (tuple): Default market sizes (number of agents per side, or number of students).
+    """
+    __slots__ = ('name', 'function', 'setup', 'sizes')
+    
+    def __init__(self, name, function, setup, sizes):
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.sizes = tuple(sizes)
+    
+    def __repr__(self):
+        return f"Case({self.name!r}, sizes={self.sizes})"
+
+
+_LP_SIZES = (10, 30, 60)
+_QUADRATIC_SIZES = (100, 500, 1000)
+_LINEAR_SIZES = (1000, 10000, 30000)
+
+CASES = [
+    Case('deferred_acceptance', ma.deferred_acceptance, _ordinal_setup(), _QUADRATIC_SIZES),
+    Case('deferred_acceptance[women_propose]', ma.deferred_acceptance, _ordinal_setup(men_propose=False),
+         _QUADRATIC_SIZES),
+    Case('deferred_acceptance[rounds]', ma.deferred_acceptance, _ordinal_setup(method='rounds'), _QUADRATIC_SIZES),
+    Case('school_choice_da', ma.school_choice_da, _school_setup(), _LINEAR_SIZES),
+    Case('school_choice_da[schools_propose]', ma.school_choice_da, _school_setup(student_proposing=False),
+         _LINEAR_SIZES),
+    Case('school_choice_da[rounds]', ma.school_choice_da, _school_setup(method='rounds'), _LINEAR_SIZES),
+    Case('school_choice_da[truncated]', ma.school_choice_da, _school_setup(list_length=_LIST_LENGTH),
+         (10000, 30000, 100000)),
+    Case('school_choice_da[truncated, rounds]', ma.school_choice_da,
+         _school_setup(list_length=_LIST_LENGTH, method='rounds'), (10000, 30000, 100000)),
+    Case('school_choice_da[scores]', ma.school_choice_da, _score_setup, (10000, 30000, 100000)),
+    Case('rematch[late_applications]', ma.rematch, _rematch_setup, _LINEAR_SIZES),
+    Case('AdmissionQuery[1000_queries]', _answer_queries, _query_setup, _LINEAR_SIZES),
+    Case('stable_improvement_cycles[multiple]', ma.stable_improvement_cycles, _improvement_setup,
+         (10000, 30000, 60000)),
+    Case('boston_mechanism', ma.boston_mechanism, _school_setup(), _LINEAR_SIZES),
+    Case('top_trading_cycles', ma.top_trading_cycles, _school_setup(), _LINEAR_SIZES),
+    Case('serial_dictatorship', ma.serial_dictatorship, _capacity_setup(), _LINEAR_SIZES),
+    Case('random_serial_dictatorship', ma.random_serial_dictatorship, _capacity_setup(), _LINEAR_SIZES),
+    Case('random_serial_dictatorship_probabilities', ma.random_serial_dictatorship_probabilities,
+         _capacity_setup(num_draws=1000, seed=0), (100, 1000, 5000)),
+    Case('stable_matching_lp', ma.stable_matching_lp, _ordinal_setup(), _LP_SIZES),
+    Case('egalitarian_stable_matching', ma.egalitarian_stable_matching, _ordinal_setup(), _LP_SIZES),
+    Case('egalitarian_stable_matching[rotations]', ma.egalitarian_stable_matching,
+         _ordinal_setup(method='rotations'), _QUADRATIC_SIZES),
+    Case('egalitarian_stable_matching[truncated]', ma.egalitarian_stable_matching,
+         _ordinal_setup(list_length=_LIST_LENGTH), (30, 60, 150)),
+    Case('nash_stable_matching', ma.nash_stable_matching, _cardinal_setup(), _LP_SIZES),
+    Case('utilitarian_stable_matching', ma.utilitarian_stable_matching, _cardinal_setup(), _LP_SIZES),
+    Case('utilitarian_stable_matching[lazy]', ma.utilitarian_stable_matching, _cardinal_setup(lazy=True),
+         (30, 60, 150)),
+    Case('utilitarian_stable_matching[rotations]', ma.utilitarian_stable_matching,
+         _cardinal_setup(method='rotations'), _QUADRATIC_SIZES),
+    Case('MatchingLP[all_objectives]', _solve_all_objectives, _cardinal_setup(), _LP_SIZES),
+    Case('egalitarian_matching', ma.egalitarian_matching, _ordinal_setup(), _LP_SIZES),
+    Case('egalitarian_matching[hungarian]', ma.egalitarian_matching, _ordinal_setup(backend='hungarian'),
+         _QUADRATIC_SIZES),
+    Case('nash_matching', ma.nash_matching, _cardinal_setup(), _LP_SIZES),
+    Case('nash_matching[hungarian]', ma.nash_matching, _cardinal_setup(backend='hungarian'), _QUADRATIC_SIZES),
+    Case('utilitarian_matching', ma.utilitarian_matching, _cardinal_setup(), _LP_SIZES),
+    Case('utilitarian_matching[hungarian]', ma.utilitarian_matching, _cardinal_setup(backend='hungarian'),
+         _QUADRATIC_SIZES),
+    Case('PreferenceProfile', ma.PreferenceProfile, _ordinal_setup(), _QUADRATIC_SIZES),
+    Case('SchoolMarket', ma.SchoolMarket, _school_setup(), _LINEAR_SIZES),
+    Case('stability_report', ma.stability_report, _stability_setup, _QUADRATIC_SIZES),
+    Case('is_stable', ma.is_stable, _stability_setup, _QUADRATIC_SIZES),
+    Case('school_stability_report', ma.school_stability_report, _school_stability_setup, _LINEAR_SIZES),
+    Case('generate_instance', ma.generate_instance, lambda size, seed: ((size,), {}), _QUADRATIC_SIZES),
+    Case('generate_instance_arrays', ma.generate_instance_arrays, lambda size, seed: ((size,), {'seed': seed}),
+         _QUADRATIC_SIZES),
+    Case('instance_arrays_to_dicts', ma.instance_arrays_to_dicts, _arrays_setup, _QUADRATIC_SIZES),
+]
+
+
+def select_cases(patterns=None):
+    """
+    Selects benchmark cases by name.
+    
+    Args:
+    patterns (list, optional): Case names or shell-style patterns (e.g. 'school*'). Default is None (all cases).
+    
+    Returns:
+    list: The selected cases, in the order of CASES.
+    """
+    if not patterns:
+        return list(CASES)
+    selected = [case for case in CASES
+                if any(case.name == pattern or fnmatch.fnmatchcase(case.name, pattern) for pattern in patterns)]
+    if not selected:
+        raise ValueError(f"No benchmark case matches {patterns}")
+    return selected
+
+#------------------------------------------------------------------------------------------------------------
+##Measurements
+
+class _SolveTimer:
+    """
+    Context manager timing the calls to pulp.LpProblem.solve made inside it, so that model building
+    and solving can be reported separately for the linear programming functions.
+    """
+    __slots__ = ('elapsed', 'calls', '_solve')
+    
+    def __enter__(self):
+        self.elapsed = 0.0
+        self.calls = 0
+        self._solve = pulp.LpProblem.solve
+        timer, solve = self, self._solve
+        
+        def timed_solve(problem, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return solve(problem, *args, **kwargs)
+            finally:
+                timer.elapsed += time.perf_counter() - start
+                timer.calls += 1
+        
+        pulp.LpProblem.solve = timed_solve
+        return self
+    
+    def __exit__(self, *exc_info):
+        pulp.LpProblem.solve = self._solve
+
+
+def _peak_memory(case, size, seed):
+    """
+    Peak memory in bytes allocated by one call, measured with tracemalloc in a separate, untimed call.
+    Memory used by the solver process of the linear programming functions is not included.
+    """
+    args, kwargs = case.setup(size, seed)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(case, size, repeat=5, warmup=1, seed=0, memory=True):
+    """
+    Times one case at one size.
+    
+    Args:
+    case (Case): The benchmark case.
+    size (int): Market size.
+    repeat (int): Number of timed calls. Default is 5.
+    warmup (int): Number of untimed calls before the timed ones. Default is 1.
+    seed (int): Seed of the instance. Default is 0.
+    memory (bool): If True, the peak memory of one extra call is recorded. Default is True.
+    
+    Returns:
+    dict: The case name, the size, the wall-clock time of every timed call ('times') with its minimum,
+          median, mean and standard deviation, the median time spent building and solving linear programs
+          ('build' and 'solve', None for functions that solve none) and the peak memory in bytes ('peak_memory').
+    """
+    times, solve_times = [], []
+    solved = False
+    for run in range(warmup + repeat):
+        args, kwargs = case.setup(size, seed)
+        gc.collect()
+        with _SolveTimer() as solve:
+            start = time.perf_counter()
+            case.function(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+        if run >= warmup:
+            times.append(elapsed)
+            solve_times.append(solve.elapsed)
+            solved = solved or solve.calls > 0
+    
+    result = {
+        'case': case.name,
+        'size': size,
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'build': statistics.median(total - solve for total, solve in zip(times, solve_times)) if solved else None,
+        'solve': statistics.median(solve_times) if solved else None,
+        'peak_memory': _peak_memory(case, size, seed) if memory else None,
+    }
+    return result
+
+
+def run_benchmarks(cases=None, sizes=None, repeat=5, warmup=1, seed=0, memory=True, progress=None):
+    """
+    Runs a size sweep of every selected case.
+    
+    Args:
+    cases (list, optional): Cases or case name patterns. Default is None (all cases).
+    sizes (list, optional): Sizes used for every case instead of the default sizes of each case.
+    repeat (int): Number of timed calls per case and size. Default is 5.
+    warmup (int): Number of untimed calls before the timed ones. Default is 1.
+    seed (int): Seed of the instances. Default is 0.
+    memory (bool): If True, peak memory is recorded. Default is True.
+    progress (callable, optional): Called with each result as soon as it is measured.
+    
+    Returns:
+    dict: 'meta' describes the environment and the settings, 'results' holds one entry per case and size
+          in the format of measure.
+    """
+    if cases is None or all(isinstance(case, str) for case in cases):
+        cases = select_cases(cases)
+    
+    results = []
+    for case in cases:
+        for size in sizes or case.sizes:
+            result = measure(case, size, repeat=repeat, warmup=warmup, seed=seed, memory=memory)
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    
+    meta = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pulp': getattr(pulp, '__version__', None),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'repeat': repeat,
+        'warmup': warmup,
+        'seed': seed,
+    }
+    return {'meta': meta, 'results': results}
+
+#------------------------------------------------------------------------------------------------------------
+##Import Time
+# Every import is timed in a fresh interpreter. With preload, the listed modules are imported before the
+# timer starts, which isolates the cost of the package itself from the cost of NumPy.
+
+IMPORTS = [
+    ('import[package]', 'import matching_algorithms', ()),
+    ('import[deferred_acceptance]', 'from matching_algorithms import deferred_acceptance', ()),
+    ('import[deferred_acceptance,numpy_loaded]', 'from matching_algorithms import deferred_acceptance', ('numpy',)),
+    ('import[school_choice_da,numpy_loaded]', 'from matching_algorithms import school_choice_da', ('numpy',)),
+    ('import[stable_matching_lp]', 'from matching_algorithms import stable_matching_lp', ()),
+    ('import[main]', 'import matching_algorithms.main', ()),
+    ('import[numpy]', 'import numpy', ()),
+    ('import[pulp]', 'import pulp', ()),
+]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+for module in {preload!r}:
+    __import__(module)
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [module for module in ('numpy', 'pulp') if module in sys.modules]]))
+"""
+
+
+def measure_import(name, statement, preload=(), repeat=5):
+    """
+    Times an import statement in fresh interpreters.
+    
+    Args:
+    name (str): Name of the measurement.
+    statement (str): The import statement, e.g. 'from matching_algorithms import deferred_acceptance'.
+    preload (tuple): Modules imported before the timer starts. Default is () (none).
+    repeat (int): Number of interpreters started. Default is 5.
+    
+    Returns:
+    dict: The measurement in the format of measure, with size 0, and the heavy dependencies loaded
+          by the end of the statement ('loaded').
+    """
+    script = _IMPORT_SCRIPT.format(preload=tuple(preload), statement=statement)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = json.loads(output)
+        times.append(elapsed)
+    
+    return {
+        'case': name,
+        'size': 0,
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'build': None,
+        'solve': None,
+        'peak_memory': None,
+        'loaded': loaded,
+    }
+
+
+def run_import_benchmarks(repeat=5, progress=None):
+    """
+    Times every import of IMPORTS.
+    
+    Args:
+    repeat (int): Number of interpreters started per import. Default is 5.
+    progress (callable, optional): Called with each result as soon as it is measured.
+    
+    Returns:
+    dict: Results in the format of run_benchmarks.
+    """
+    results = []
+    for name, statement, preload in IMPORTS:
+        result = measure_import(name, statement, preload, repeat=repeat)
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    
+    meta = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'repeat': repeat,
+    }
+    return {'meta': meta, 'results': results}
+
+#------------------------------------------------------------------------------------------------------------
+##Regression Tracking
+
+def compare_results(results, baseline, threshold=0.1, metric='median'):
+    """
+    Compares benchmark results with a baseline run.
+    
+    Args:
+    results (dict): Results of run_benchmarks (or loaded from its JSON file).
+    baseline (dict): Baseline results in the same format.
+    threshold (float): Relative change treated as noise. Default is 0.1 (10%).
+    metric (str): Timing compared: 'min', 'median' or 'mean'. Default is 'median'.
+    
+    Returns:
+    list: One dictionary per case and size found in both runs, with the baseline and current time,
+          their ratio and a status: 'regression', 'improvement' or 'unchanged'.
+    """
+    baseline_times = {(entry['case'], entry['size']): entry[metric] for entry in baseline['results']}
+    comparison = []
+    for entry in results['results']:
+        key = (entry['case'], entry['size'])
+        if key not in baseline_times:
+            continue
+        ratio = entry[metric] / baseline_times[key] if baseline_times[key] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        comparison.append({'case': entry['case'], 'size': entry['size'], 'baseline': baseline_times[key],
+                           'current': entry[metric], 'ratio': ratio, 'status': status})
+    return comparison
+
+
+def _format_result(result):
+    line = f"{result['case']:<45} {result['size']:>7} {result['median'] * 1e3:>11.2f} ms"
+    if result['solve'] is not None:
+        line += f"  (build {result['build'] * 1e3:.2f} ms, solve {result['solve'] * 1e3:.2f} ms)"
+    if result['peak_memory'] is not None:
+        line += f"  peak {result['peak_memory'] / 2**20:.1f} MiB"
+    if result.get('loaded') is not None:
+        line += f"  loads {', '.join(result['loaded']) or 'no heavy dependency'}"
+    return line
+
+
+def main_cli(argv=None):
+    """
+    Command line entry point (python -m matching_algorithms.bench, or matching-bench once installed).
+    
+    Returns:
+    int: The exit status, 1 if a regression against the baseline was found, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(prog='matching-bench',
+                                     description="Benchmarks the matching algorithms over a sweep of market sizes.")
+    parser.add_argument('cases', nargs='*', help="Case names or shell-style patterns (default: all cases).")
+    parser.add_argument('--list', action='store_true', help="List the cases and their default sizes, then exit.")
+    parser.add_argument('--sizes', type=int, nargs='+', help="Sizes used for every case instead of their defaults.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per case and size (default: 5).")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed calls before timing (default: 1).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the instances (default: 0).")
+    parser.add_argument('--no-memory', action='store_true', help="Do not record peak memory.")
+    parser.add_argument('--imports', action='store_true',
+                        help="Time importing the package in fresh interpreters instead of running the cases.")
+    parser.add_argument('--output', '-o', help="Write the results as JSON to this file.")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare with.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative slowdown reported as a regression (default: 0.1).")
+    parser.add_argument('--metric', choices=('min', 'median', 'mean'), default='median',
+                        help="Timing compared with the baseline (default: median).")
+    args = parser.parse_args(argv)
+    
+    cases = select_cases(args.cases)
+    if args.list:
+        for case in cases:
+            print(f"{case.name:<45} {' '.join(map(str, case.sizes))}")
+        return 0
+    
+    if args.imports:
+        results = run_import_benchmarks(repeat=args.repeat, progress=lambda result: print(_format_result(result)))
+    else:
+        results = run_benchmarks(cases, sizes=args.sizes, repeat=args.repeat, warmup=args.warmup, seed=args.seed,
+                                 memory=not args.no_memory, progress=lambda result: print(_format_result(result)))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    comparison = compare_results(results, baseline, threshold=args.threshold, metric=args.metric)
+    print()
+    for entry in comparison:
+        print(f"{entry['case']:<45} {entry['size']:>7} {entry['baseline'] * 1e3:>11.2f} ms -> "
+              f"{entry['current'] * 1e3:>11.2f} ms  x{entry['ratio']:.2f}  {entry['status']}")
+    num_regressions = sum(entry['status'] == 'regression' for entry in comparison)
+    print(f"\n{num_regressions} regression(s) out of {len(comparison)} compared measurements")
+    return 1 if num_regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,302 @@
+import collections
+import functools
+import os
+import pickle
+import threading
+import numpy as np
+
+##Instance Fingerprints
+# Arguments are hashed in a canonical form without building intermediate objects per agent: lists of
+# names are joined into one string, lists of numbers become one array, compiled profiles and markets
+# contribute their arrays, and the array bytes are hashed directly. The insertion order of dictionaries
+# is part of the fingerprint, since it determines the order of the results.
+
+_FINGERPRINT_VERSION = b'2'
+
+
+class _Uncacheable(Exception):
+    """
+    Raised for arguments that have no stable fingerprint; the call then bypasses the cache.
+    """
+
+
+def _update_sequence(hasher, values):
+    """
+    Feeds a list or tuple to a hash, in one update when it holds only names or only numbers.
+    """
+    hasher.update(b'l' + str(len(values)).encode())
+    try:
+        joined = '\x00'.join(values)
+    except TypeError:
+        pass
+    else:
+        hasher.update(b's' + joined.encode('utf-8', 'surrogatepass'))
+        return
+    
+    if values and not isinstance(values[0], (list, tuple, dict, str)):
+        try:
+            array = np.array(values)
+        except ValueError:
+            array = None
+        if array is not None and array.dtype.kind in 'biuf':
+            _update(hasher, array)
+            return
+    for value in values:
+        _update(hasher, value)
+
+
+def _update(hasher, value):
+    """
+    Feeds the canonical form of a value to a hash.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        hasher.update(b'v' + repr(value).encode() + b'\x00')
+    
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object:
+            _update_sequence(hasher, value.tolist())
+            return
+        hasher.update(b'a' + f"{value.dtype.str}{value.shape}".encode())
+        hasher.update(np.ascontiguousarray(value).data)
+    
+    elif isinstance(value, dict):
+        hasher.update(b'd')
+        _update_sequence(hasher, list(value))
+        _update_sequence(hasher, list(value.values()))
+    
+    elif isinstance(value, (list, tuple)):
+        _update_sequence(hasher, value)
+    
+    elif hasattr(value, '_content'):
+        # PreferenceProfile and SchoolMarket
+        _update(hasher, value._content())
+    
+    else:
+        try:
+            hasher.update(b'o' + pickle.dumps(value, protocol=4))
+        except Exception:
+            raise _Uncacheable(type(value).__name__) from None
+
+
+def fingerprint(*values):
+    """
+    Computes a content hash of matching instances and parameters.
+    
+    Args:
+    *values: Preference dictionaries, arrays, PreferenceProfile or SchoolMarket objects, or parameters.
+    
+    Returns:
+    str: A hexadecimal digest; equal inputs give equal digests across processes and sessions.
+    """
+    # hashlib and tempfile are imported on use, keeping the import of the mechanisms light
+    import hashlib
+    hasher = hashlib.blake2b(_FINGERPRINT_VERSION, digest_size=20)
+    for value in values:
+        _update(hasher, value)
+    return hasher.hexdigest()
+
+#------------------------------------------------------------------------------------------------------------
+##Result Cache
+
+class ResultCache:
+    """
+    A bounded least-recently-used store of pickled results, with an optional directory on disk.
+    
+    Results are kept pickled, so every hit returns a fresh copy that callers can modify freely.
+    
+    Args:
+    max_entries (int): Maximum number of results kept in memory. Default is 1024.
+    max_bytes (int): Maximum total size of the pickled results kept in memory. Default is 256 MiB.
+    directory (str, optional): Directory where results are also written, and read back after a memory miss,
+                               e.g. across processes. Only use a directory you trust, since results are
+                               unpickled from it. Default is None (memory only).
+    
+    Attributes:
+    hits (int): Number of lookups answered from the cache.
+    misses (int): Number of lookups that had to run the function.
+    """
+    __slots__ = ('max_entries', 'max_bytes', 'directory', 'hits', 'misses', '_entries', '_size', '_lock')
+    
+    def __init__(self, max_entries=1024, max_bytes=256 * 2**20, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @property
+    def size(self):
+        """
+        int: Total size in bytes of the pickled results kept in memory.
+        """
+        return self._size
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+    
+    def _remember(self, key, data):
+        # Called with the lock held; evicts the least recently used results beyond the bounds
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self._size += len(data)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+    
+    def get(self, key):
+        """
+        Looks up a result.
+        
+        Args:
+        key (str): The fingerprint of the call.
+        
+        Returns:
+        tuple: (True, result) on a hit, (False, None) on a miss.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        
+        if data is None and self.directory is not None:
+            try:
+                with open(self._path(key), 'rb') as file:
+                    data = file.read()
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self._remember(key, data)
+        
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, pickle.loads(data)
+    
+    def put(self, key, result):
+        """
+        Stores a result.
+        
+        Args:
+        key (str): The fingerprint of the call.
+        result: The result; it must be picklable.
+        """
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, data)
+        
+        if self.directory is not None:
+            # Write to a temporary file first, so readers never see a partial result
+            import tempfile
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, self._path(key))
+    
+    def clear(self, disk=False):
+        """
+        Empties the in-memory store, and the directory too if disk is True.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, name))
+
+#------------------------------------------------------------------------------------------------------------
+##Memoization
+
+_active_cache = None
+
+
+def enable_cache(max_entries=1024, max_bytes=256 * 2**20, directory=None, cache=None):
+    """
+    Turns on result caching for the mechanisms of the package.
+    
+    Args:
+    max_entries (int): Maximum number of results kept in memory. Default is 1024.
+    max_bytes (int): Maximum total size of the results kept in memory. Default is 256 MiB.
+    directory (str, optional): Directory of an on-disk store shared across processes. Default is None.
+    cache (ResultCache, optional): A cache to use instead of a new one.
+    
+    Returns:
+    ResultCache: The active cache.
+    """
+    global _active_cache
+    _active_cache = cache if cache is not None else ResultCache(max_entries, max_bytes, directory)
+    return _active_cache
+
+
+def disable_cache():
+    """
+    Turns off result caching. The results stored so far are dropped from memory.
+    """
+    global _active_cache
+    _active_cache = None
+
+
+def get_cache():
+    """
+    Returns the active ResultCache, or None if caching is off.
+    """
+    return _active_cache
+
+
+def cached(bypass=None):
+    """
+    Decorator memoizing a deterministic function in the active cache, keyed by the fingerprint of
+    the function name and of all its arguments (defaults included). While caching is off, calls go
+    straight to the function.
+    
+    Args:
+    bypass (callable, optional): Called with the bound arguments (a dictionary); calls for which it returns
+                                 True are not cached, e.g. calls filling a stats object.
+    """
+    def decorate(function):
+        name = f"{function.__module__}.{function.__qualname__}"
+        signature = None
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            nonlocal signature
+            cache = _active_cache
+            if cache is None:
+                return function(*args, **kwargs)
+            
+            if signature is None:
+                # Imported here so that inspect only loads once caching is turned on
+                import inspect
+                signature = inspect.signature(function)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if bypass is not None and bypass(bound.arguments):
+                return function(*args, **kwargs)
+            try:
+                key = fingerprint(name, *bound.arguments.items())
+            except _Uncacheable:
+                return function(*args, **kwargs)
+            
+            found, result = cache.get(key)
+            if found:
+                return result
+            result = function(*args, **kwargs)
+            cache.put(key, result)
+            return result
+        
+        return wrapper
+    return decorate
@@ -0,0 +1,1977 @@
+import heapq
+import random
+import time
+import numpy as np
+from matching_algorithms.cache import cached
+from matching_algorithms.profiles import (SchoolMarket, _admission_ranks, _agent_index, _has_priorities, _marriage_profile,
+                                         _school_market, _score_lists, _score_ranks)
+
+##Deferred Acceptance Engine
+
+def _deferred_acceptance_engine(indptr, indices, acceptor_ranks, num_acceptors, stats=None):
+    """
+    Runs proposer-proposing deferred acceptance on a compiled instance.
+    
+    Each proposal costs O(1): the rank the acceptor gives the proposer is stored next to the
+    proposal, and acceptors keep their current partner and its rank in arrays, so the whole run
+    is O(number of proposals).
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the proposers' preference lists.
+    indices (numpy.ndarray): CSR acceptor ids of the proposers' preference lists.
+    acceptor_ranks (numpy.ndarray): Rank the acceptor gives the proposer, aligned with indices; -1 if the
+                                    acceptor does not list the proposer, who is then rejected.
+    num_acceptors (int): Number of acceptors.
+    stats (MatchingStats, optional): Counters of the run, updated in place.
+    
+    Returns:
+    list: The proposer held by each acceptor, or -1 if the acceptor is unmatched.
+    """
+    num_proposers = len(indptr) - 1
+    next_to_propose = indptr[:-1].tolist()
+    list_end = indptr[1:].tolist()
+    acceptor_ranks = acceptor_ranks.tolist()
+    holder = [-1] * num_acceptors
+    holder_rank = [0] * num_acceptors
+    num_proposals = longest_chain = 0
+    
+    # Free proposers are kept on a stack; a rejected proposer keeps proposing immediately
+    free_proposers = list(range(num_proposers - 1, -1, -1))
+    
+    while free_proposers:
+        proposer = free_proposers.pop()
+        chain = 0
+        
+        while next_to_propose[proposer] < list_end[proposer]:
+            position = next_to_propose[proposer]
+            acceptor = int(indices[position])
+            next_to_propose[proposer] += 1
+            chain += 1
+            
+            rank = acceptor_ranks[position]
+            if rank < 0:
+                continue
+            current_partner = holder[acceptor]
+            
+            # If the acceptor is free, engage them
+            if current_partner == -1:
+                holder[acceptor] = proposer
+                holder_rank[acceptor] = rank
+                break
+            
+            # If the acceptor prefers this proposer, the previous partner becomes the proposer
+            if rank < holder_rank[acceptor]:
+                holder[acceptor] = proposer
+                holder_rank[acceptor] = rank
+                proposer = current_partner
+        
+        num_proposals += chain
+        if chain > longest_chain:
+            longest_chain = chain
+    
+    if stats is not None:
+        stats.record(proposals=num_proposals, accepted=len(holder) - holder.count(-1), longest_chain=longest_chain,
+                     queue_length=num_proposers)
+    return holder
+
+#------------------------------------------------------------------------------------------------------------
+##Round-Based Deferred Acceptance
+# The sequential engines answer one proposal at a time in Python. The round-based engine lets every free
+# proposer propose at once and answers the whole round with a few array operations, so its cost is a
+# constant number of NumPy calls per round plus vectorized work per proposal. Acceptors hold their proposers
+# in seats: acceptor a owns the seats seat_indptr[a]:seat_indptr[a+1], sorted by rank, and empty seats hold
+# proposer -1 with a rank after every real one.
+
+
+def _ranges(starts, lengths):
+    """
+    Concatenates the integer ranges [starts[i], starts[i] + lengths[i]) into one array.
+    """
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(len(offsets))
+
+
+def _round_engine(indptr, indices, acceptor_ranks, capacities, quotas=None, stats=None, progress=None):
+    """
+    Runs deferred acceptance in synchronous rounds with NumPy array operations.
+    
+    In every round, each proposer with free quota proposes to as many of its next choices, and every
+    acceptor that receives proposals keeps the best ones among them and the proposers it holds, up to its
+    capacity. The proposals that end up held do not depend on the order in which they are made, so the
+    result is the same proposer-optimal stable matching as with the sequential engines.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the proposers' preference lists.
+    indices (numpy.ndarray): CSR acceptor ids of the proposers' preference lists.
+    acceptor_ranks (numpy.ndarray): Rank the acceptor gives the proposer, aligned with indices; -1 if the
+                                    acceptor rejects the proposer outright.
+    capacities (numpy.ndarray): Number of proposers each acceptor can hold.
+    quotas (numpy.ndarray, optional): Number of acceptors each proposer can be held by (the capacities of
+                                      proposing schools). Default is None (one each).
+    stats (MatchingStats, optional): Counters of the run, updated in place.
+    progress (callable, optional): Called after every round with the round number, the number of proposals
+                                   made in the round and the number of proposers left to propose.
+    
+    Returns:
+    tuple: (seat_indptr, seat_proposers, seat_ranks, next_to_propose), where acceptor a holds the proposers
+           seat_proposers[seat_indptr[a]:seat_indptr[a+1]] (best first, -1 for empty seats) and next_to_propose
+           is the position in indices of the next proposal of each proposer.
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    acceptor_ranks = np.asarray(acceptor_ranks)
+    capacities = np.asarray(capacities, dtype=np.int64)
+    num_proposers = len(indptr) - 1
+    next_to_propose = indptr[:-1].copy()
+    list_end = indptr[1:]
+    if quotas is None:
+        free_quota = np.ones(num_proposers, dtype=np.int64)
+    else:
+        free_quota = np.array(quotas, dtype=np.int64)
+    
+    # Proposals are sorted by one key, acceptor * stride + rank
+    empty_rank = int(acceptor_ranks.max(initial=-1)) + 1
+    stride = empty_rank + 1
+    seat_indptr = np.zeros(len(capacities) + 1, dtype=np.int64)
+    np.cumsum(capacities, out=seat_indptr[1:])
+    seat_proposers = np.full(seat_indptr[-1], -1, dtype=np.int64)
+    seat_ranks = np.full(seat_indptr[-1], empty_rank, dtype=np.int64)
+    
+    active = np.flatnonzero((free_quota > 0) & (next_to_propose < list_end))
+    pending = np.zeros(num_proposers, dtype=bool)
+    num_rounds = num_proposals = queue_length = 0
+    
+    while len(active):
+        num_rounds += 1
+        queue_length = max(queue_length, len(active))
+        
+        # Gather the next choices of every active proposer, one per unit of free quota
+        counts = np.minimum(free_quota[active], list_end[active] - next_to_propose[active])
+        positions = _ranges(next_to_propose[active], counts)
+        next_to_propose[active] += counts
+        num_proposals += len(positions)
+        proposers = np.repeat(active, counts)
+        acceptors = indices[positions].astype(np.int64)
+        ranks = acceptor_ranks[positions].astype(np.int64)
+        valid = (ranks >= 0) & (capacities[acceptors] > 0)
+        proposers, acceptors, ranks = proposers[valid], acceptors[valid], ranks[valid]
+        
+        # A proposal ranked below the last seat of its acceptor is rejected without touching the seats; most
+        # proposals of late rounds end here
+        entering = ranks < seat_ranks[seat_indptr[acceptors + 1] - 1]
+        proposers, acceptors, ranks = proposers[entering], acceptors[entering], ranks[entering]
+        np.subtract.at(free_quota, proposers, 1)
+        
+        # Sort the proposals together with the seats of the acceptors they reach by acceptor and rank;
+        # the first entries of every acceptor take its seats, and the others are rejected
+        reached, num_reaching = np.unique(acceptors, return_counts=True)
+        num_seats = capacities[reached]
+        seats = _ranges(seat_indptr[reached], num_seats)
+        candidates = np.concatenate((seat_proposers[seats], proposers))
+        candidate_ranks = np.concatenate((seat_ranks[seats], ranks))
+        keys = np.concatenate((np.repeat(reached, num_seats), acceptors)) * stride + candidate_ranks
+        order = np.argsort(keys)
+        group_sizes = num_seats + num_reaching
+        kept = (np.arange(len(order)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+                < np.repeat(num_seats, group_sizes))
+        seat_proposers[seats] = candidates[order[kept]]
+        seat_ranks[seats] = candidate_ranks[order[kept]]
+        
+        # Rejected proposers get their quota back and propose again in the next round, together with the
+        # active proposers that were turned down before reaching the seats
+        rejected = candidates[order[~kept]]
+        rejected = rejected[rejected >= 0]
+        np.add.at(free_quota, rejected, 1)
+        pending[active] = True
+        pending[rejected] = True
+        active = np.flatnonzero(pending)
+        pending[active] = False
+        active = active[(free_quota[active] > 0) & (next_to_propose[active] < list_end[active])]
+        if progress is not None:
+            progress(num_rounds, len(positions), len(active))
+    
+    if stats is not None:
+        stats.record(proposals=num_proposals, accepted=int(np.count_nonzero(seat_proposers >= 0)), rounds=num_rounds,
+                     queue_length=queue_length)
+    return seat_indptr, seat_proposers, seat_ranks, next_to_propose
+
+
+def _check_method(method):
+    """
+    Raises ValueError for an unknown deferred acceptance method.
+    """
+    if method not in ('sequential', 'rounds'):
+        raise ValueError(f"Unknown method '{method}', expected 'sequential' or 'rounds'")
+
+#------------------------------------------------------------------------------------------------------------
+##Run Statistics
+
+_stats_hooks = []
+
+
+class MatchingStats:
+    """
+    Counters and phase timings of one run of deferred_acceptance, school_choice_da, boston_mechanism,
+    top_trading_cycles or stable_improvement_cycles, filled when passed as stats= or when a stats hook
+    is registered.
+    
+    Attributes:
+    mechanism (str): Name of the function that filled the statistics.
+    proposals (int): Proposals (applications for the Boston mechanism, offers when schools propose).
+    rejections (int): Proposals that were turned down, at once or after being held for a while.
+    rounds (int): Rounds of the Boston mechanism, or of deferred acceptance with method='rounds'.
+    cycles (int): Cycles cleared by top trading cycles, or executed by stable_improvement_cycles.
+    longest_chain (int): Most proposals made in one rejection chain, where each displaced proposer proposes
+                         next (for the cycle mechanisms, the number of students in the longest cycle).
+    max_queue_length (int): Largest number of agents waiting to propose (applicants in one Boston round or
+                            proposers in one round of deferred acceptance with method='rounds', or the depth
+                            of the pointer walk of top trading cycles).
+    phase_times (dict): Seconds spent compiling the market ('compile'), running the algorithm ('run')
+                        and building the result ('output').
+    """
+    __slots__ = ('mechanism', 'proposals', 'rejections', 'rounds', 'cycles', 'longest_chain', 'max_queue_length',
+                 'phase_times', '_clock')
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self, mechanism=None):
+        """
+        Clears all counters, and starts the clock of the first phase.
+        """
+        self.mechanism = mechanism
+        self.proposals = self.rejections = self.rounds = self.cycles = 0
+        self.longest_chain = self.max_queue_length = 0
+        self.phase_times = {}
+        self._clock = time.perf_counter()
+    
+    def lap(self, phase):
+        """
+        Records the time since the previous phase ended as the time of this phase.
+        """
+        now = time.perf_counter()
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + now - self._clock
+        self._clock = now
+    
+    def record(self, proposals=0, accepted=0, rounds=0, cycles=0, longest_chain=0, queue_length=0):
+        """
+        Adds the counters of an engine run; proposals that were not accepted in the end count as rejections.
+        """
+        self.proposals += proposals
+        self.rejections += proposals - accepted
+        self.rounds += rounds
+        self.cycles += cycles
+        self.longest_chain = max(self.longest_chain, longest_chain)
+        self.max_queue_length = max(self.max_queue_length, queue_length)
+    
+    @property
+    def total_time(self):
+        """
+        Total seconds of the recorded phases.
+        """
+        return sum(self.phase_times.values())
+    
+    def as_dict(self):
+        """
+        Returns the statistics as a plain dictionary, e.g. for logging.
+        """
+        return {'mechanism': self.mechanism, 'proposals': self.proposals, 'rejections': self.rejections,
+                'rounds': self.rounds, 'cycles': self.cycles, 'longest_chain': self.longest_chain,
+                'max_queue_length': self.max_queue_length, 'phase_times': dict(self.phase_times)}
+    
+    def __repr__(self):
+        counters = ', '.join(f"{key}={value!r}" for key, value in self.as_dict().items())
+        return f"MatchingStats({counters})"
+
+
+def add_stats_hook(hook):
+    """
+    Registers a function called with the MatchingStats of every run of deferred_acceptance,
+    school_choice_da, boston_mechanism and top_trading_cycles, e.g. to log slow runs.
+    Statistics are only collected while at least one hook is registered or stats= is passed, and
+    such runs bypass the result cache so that every call reaches the hooks.
+    
+    Args:
+    hook (callable): Function taking a MatchingStats.
+    """
+    _stats_hooks.append(hook)
+
+
+def remove_stats_hook(hook):
+    """
+    Unregisters a function added with add_stats_hook.
+    """
+    _stats_hooks.remove(hook)
+
+
+def _start_stats(stats, mechanism):
+    """
+    Returns the MatchingStats to fill in one run: the one given, a new one if hooks are registered, or None.
+    """
+    if stats is None and _stats_hooks:
+        stats = MatchingStats()
+    if stats is not None:
+        stats.reset(mechanism)
+    return stats
+
+
+def _collects_stats(arguments):
+    """
+    Tells whether a call fills statistics, through stats= or a registered hook, and must therefore
+    run rather than be answered from the cache.
+    """
+    return arguments['stats'] is not None or bool(_stats_hooks)
+
+
+def _finish_stats(stats):
+    """
+    Records the output phase and passes the statistics of a run to the registered hooks.
+    """
+    if stats is not None:
+        stats.lap('output')
+        for hook in list(_stats_hooks):
+            hook(stats)
+
+#------------------------------------------------------------------------------------------------------------
+##Marriage Market Deferred Acceptance
+
+@cached(bypass=lambda arguments: (arguments['return_state'] or _collects_stats(arguments)
+                                  or arguments['progress'] is not None))
+def deferred_acceptance(men_preferences, women_preferences=None, men_propose=True, return_state=False, stats=None,
+                        method='sequential', progress=None):
+    """
+    Implements the Gale-Shapley deferred acceptance algorithm for stable matching.
+    
+    Agent names are mapped to integer ids once, so every proposal is answered in constant time
+    and the algorithm runs in O(n^2) for complete preference lists, and in time linear in the number
+    of listed pairs for truncated ones. Sides may differ in size; a proposal is only accepted when
+    the acceptor lists the proposer.
+    
+    Args:
+    men_preferences (dict or PreferenceProfile): A dictionary where keys are men and values are lists of women in order
+                                                 of preference, or a PreferenceProfile of the whole market.
+    women_preferences (dict): A dictionary where keys are women and values are lists of men in order of preference.
+                              Omitted when a PreferenceProfile is given.
+    men_propose (bool): If True, men propose to women. If False, women propose to men. Default is True.
+    return_state (bool): If True, also returns the DAState of the run, which rematch updates after small
+                         changes to the market. Default is False.
+    stats (MatchingStats, optional): Filled with the counters and phase timings of the run. Default is None.
+    method (str): 'sequential' answers one proposal at a time. 'rounds' lets all free proposers propose at once
+                  and answers every round with NumPy array operations, which is faster on large markets.
+                  Both give the same matching. Default is 'sequential'.
+    progress (callable, optional): With method='rounds', called after every round with the round number, the number
+                                   of proposals of the round and the number of proposers left to propose.
+    
+    Returns:
+    dict: A dictionary representing the stable matching, where keys are proposers and values are their matched partners
+          (with return_state, a tuple of the matching and the DAState).
+    """
+    
+    _check_method(method)
+    stats = _start_stats(stats, 'deferred_acceptance')
+    profile = _marriage_profile(men_preferences, women_preferences, is_cardinal=False)
+    proposing_side = 0 if men_propose else 1
+    proposers = profile.names[proposing_side]
+    acceptors = profile.names[1 - proposing_side]
+    
+    if return_state:
+        state = _deferred_acceptance_state('marriage', proposers, acceptors, profile.csr(proposing_side),
+                                           profile.partner_ranks(proposing_side), profile.csr(1 - proposing_side),
+                                           [1] * len(acceptors), stats, method, progress)
+        result = _state_result(state)
+        _finish_stats(stats)
+        return result, state
+    
+    acceptor_ranks = profile.partner_ranks(proposing_side)
+    if stats is not None:
+        stats.lap('compile')
+    if method == 'rounds':
+        # With one seat per acceptor, seat a belongs to acceptor a
+        holder = _round_engine(*profile.csr(proposing_side), acceptor_ranks, np.ones(len(acceptors), dtype=np.int64),
+                               stats=stats, progress=progress)[1].tolist()
+    else:
+        holder = _deferred_acceptance_engine(*profile.csr(proposing_side), acceptor_ranks, len(acceptors), stats)
+    if stats is not None:
+        stats.lap('run')
+    
+    partner = [-1] * len(proposers)
+    for acceptor, proposer in enumerate(holder):
+        if proposer != -1:
+            partner[proposer] = acceptor
+    
+    matching = {proposers[p]: acceptors[a] for p, a in enumerate(partner) if a != -1}
+    _finish_stats(stats)
+    return matching
+
+#------------------------------------------------------------------------------------------------------------
+##School Choice Deferred Acceptance
+
+def _student_proposing_engine(indptr, indices, priority_ranks, capacities, next_to_propose=None, admitted=None,
+                              free_students=None, stats=None):
+    """
+    Runs student-proposing deferred acceptance with capacitated schools.
+    
+    Every school keeps its tentatively admitted students in a heap bounded by its capacity,
+    keyed by priority rank, so the lowest-priority admitted student is found in O(1).
+    A run can be resumed by passing the cursors and heaps of a previous run together with the
+    students that have to propose again.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the students' preference lists.
+    indices (numpy.ndarray): CSR school ids of the students' preference lists.
+    priority_ranks (numpy.ndarray): Priority rank of every application, aligned with indices; -1 if the school
+                                    rejects the student outright.
+    capacities (list): Capacity of each school.
+    next_to_propose (list, optional): Position in indices of the next proposal of each student, updated in place.
+    admitted (list, optional): Heaps of admitted students of each school, updated in place.
+    free_students (list, optional): Students that have to propose. Default is every student.
+    stats (MatchingStats, optional): Counters of the run, updated in place.
+    
+    Returns:
+    list: For each school, a heap of (-priority rank, student) pairs of the admitted students.
+    """
+    num_students = len(indptr) - 1
+    if next_to_propose is None:
+        next_to_propose = indptr[:-1].tolist()
+    list_end = indptr[1:].tolist()
+    if admitted is None:
+        admitted = [[] for _ in range(len(capacities))]
+    if free_students is None:
+        free_students = list(range(num_students - 1, -1, -1))
+    num_held = sum(map(len, admitted))
+    queue_length = len(free_students)
+    num_proposals = longest_chain = 0
+    
+    while free_students:
+        student = free_students.pop()
+        chain = 0
+        
+        while next_to_propose[student] < list_end[student]:
+            position = next_to_propose[student]
+            school = int(indices[position])
+            next_to_propose[student] += 1
+            chain += 1
+            
+            capacity = capacities[school]
+            rank = int(priority_ranks[position])
+            if capacity == 0 or rank < 0:
+                continue
+            
+            heap = admitted[school]
+            
+            # Admit the student while the school has free seats
+            if len(heap) < capacity:
+                heapq.heappush(heap, (-rank, student))
+                break
+            
+            # Otherwise replace the lowest-priority admitted student, who proposes next
+            if rank < -heap[0][0]:
+                student = heapq.heapreplace(heap, (-rank, student))[1]
+        
+        num_proposals += chain
+        if chain > longest_chain:
+            longest_chain = chain
+    
+    if stats is not None:
+        stats.record(proposals=num_proposals, accepted=sum(map(len, admitted)) - num_held,
+                     longest_chain=longest_chain, queue_length=queue_length)
+    return admitted
+
+
+def _school_proposing_engine(indptr, indices, student_ranks, num_students, capacities, stats=None):
+    """
+    Runs school-proposing deferred acceptance with capacitated schools.
+    
+    Schools make as many simultaneous offers as they have free seats, following their priority
+    lists, and students hold on to the best offer received so far.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the school priority lists.
+    indices (numpy.ndarray): CSR student ids of the school priority lists.
+    student_ranks (numpy.ndarray): Rank the student gives the school, aligned with indices; -1 if the student
+                                   does not list the school, and rejects the offer.
+    num_students (int): Number of students.
+    capacities (list): Capacity of each school.
+    stats (MatchingStats, optional): Counters of the run, updated in place.
+    
+    Returns:
+    list: The school held by each student, or -1 if the student is unassigned.
+    """
+    num_schools = len(indptr) - 1
+    next_to_propose = indptr[:-1].tolist()
+    list_end = indptr[1:].tolist()
+    student_ranks = student_ranks.tolist()
+    free_seats = list(capacities)
+    held_offer = [-1] * num_students
+    held_rank = [0] * num_students
+    num_offers = longest_chain = 0
+    
+    schools_with_seats = list(range(num_schools - 1, -1, -1))
+    queue_length = num_schools
+    
+    while schools_with_seats:
+        if len(schools_with_seats) > queue_length:
+            queue_length = len(schools_with_seats)
+        school = schools_with_seats.pop()
+        chain = 0
+        
+        while free_seats[school] > 0 and next_to_propose[school] < list_end[school]:
+            position = next_to_propose[school]
+            student = int(indices[position])
+            next_to_propose[school] += 1
+            chain += 1
+            
+            rank = student_ranks[position]
+            if rank < 0:
+                continue
+            current_school = held_offer[student]
+            
+            # A free student holds the offer
+            if current_school == -1:
+                held_offer[student] = school
+                held_rank[student] = rank
+                free_seats[school] -= 1
+            
+            # A student holding a worse offer releases a seat at the previous school
+            elif rank < held_rank[student]:
+                held_offer[student] = school
+                held_rank[student] = rank
+                free_seats[school] -= 1
+                free_seats[current_school] += 1
+                schools_with_seats.append(current_school)
+        
+        num_offers += chain
+        if chain > longest_chain:
+            longest_chain = chain
+    
+    if stats is not None:
+        stats.record(proposals=num_offers, accepted=len(held_offer) - held_offer.count(-1),
+                     longest_chain=longest_chain, queue_length=queue_length)
+    return held_offer
+
+
+def _offer_lists(market):
+    """
+    Builds the lists schools propose along: each school priority list, followed by the students who apply
+    to the school without being listed, by student id. With score-based priorities, each school proposes
+    to its applicants in priority order.
+    
+    Returns:
+    tuple: (indptr, indices, student_ranks) where student_ranks is the rank every student gives the school
+           of each entry, or -1 if the student does not list it.
+    """
+    student_indptr, student_indices = market.student_csr
+    if market.priority_scores is not None:
+        students = np.repeat(np.arange(len(student_indptr) - 1), np.diff(student_indptr))
+        order = np.lexsort((market.application_ranks(), student_indices))
+        indptr = np.zeros(len(market.school_names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(student_indices, minlength=len(market.school_names)), out=indptr[1:])
+        return indptr, students[order].astype(np.int32), (np.arange(len(students)) - student_indptr[students])[order]
+    
+    priority_indptr, priority_indices = market.priority_csr
+    unlisted = np.flatnonzero(market.application_ranks() < 0)
+    students = np.searchsorted(student_indptr, unlisted, side='right') - 1
+    schools = student_indices[unlisted].astype(np.int64)
+    order = np.lexsort((students, schools))
+    students, schools, unlisted = students[order], schools[order], unlisted[order]
+    
+    num_schools = len(priority_indptr) - 1
+    listed_lengths = np.diff(priority_indptr)
+    extra = np.bincount(schools, minlength=num_schools)
+    indptr = np.zeros(num_schools + 1, dtype=np.int64)
+    np.cumsum(listed_lengths + extra, out=indptr[1:])
+    
+    # Listed entries keep their position in the row; unlisted applicants follow them
+    listed_rows = np.repeat(np.arange(num_schools), listed_lengths)
+    listed_at = np.arange(len(priority_indices)) - priority_indptr[listed_rows] + indptr[listed_rows]
+    extra_at = (np.arange(len(schools)) - np.repeat(np.cumsum(extra) - extra, extra)
+                + indptr[schools] + listed_lengths[schools])
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    student_ranks = np.empty(indptr[-1], dtype=np.int64)
+    indices[listed_at] = priority_indices
+    student_ranks[listed_at] = market.offer_ranks()
+    indices[extra_at] = students
+    student_ranks[extra_at] = unlisted - student_indptr[students]
+    return indptr, indices, student_ranks
+
+
+def _strict_market(market, tie_breaking, seed):
+    """
+    Returns the market with the ties of its priority classes broken by lottery, or as is without classes.
+    """
+    if tie_breaking is not None:
+        return market.break_ties(tie_breaking, seed)
+    if market.priority_classes is not None:
+        raise ValueError("The school priorities have ties; pass tie_breaking='single' or 'multiple'")
+    return market
+
+
+def _unseeded_lottery(arguments):
+    """
+    Tells whether a call breaks priority ties with an unseeded lottery, whose result must not be cached.
+    """
+    return arguments['tie_breaking'] is not None and arguments['seed'] is None
+
+
+@cached(bypass=lambda arguments: (arguments['return_state'] or _collects_stats(arguments)
+                                  or arguments['progress'] is not None or _unseeded_lottery(arguments)))
+def school_choice_da(students, schools=None, student_proposing=True, return_state=False, stats=None,
+                     method='sequential', progress=None, return_cutoffs=False, tie_breaking=None, seed=None):
+    """
+    Implements the deferred acceptance algorithm for school choice.
+    
+    Schools are handled natively with their capacities: each school keeps a bounded heap of
+    tentatively admitted students, so memory and time do not grow with the number of seats.
+    Students only apply to the schools on their lists; a school that does not list a student
+    ranks them below every listed student, ties broken by student id.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school names
+                                     in order of preference, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are dictionaries containing:
+                    'priorities': list of student names in order of priority (a list or set of students inside
+                                  it is a class of equally ranked students, see tie_breaking)
+                    'capacity': integer representing the school's capacity
+                    Omitted when a SchoolMarket is given.
+    student_proposing (bool): If True, students propose to schools. If False, schools propose to students. Default is True.
+    return_state (bool): If True, also returns the DAState of the run, which rematch updates after small
+                         changes to the market. Requires student_proposing and priority lists. Default is False.
+    stats (MatchingStats, optional): Filled with the counters and phase timings of the run. Default is None.
+    method (str): 'sequential' answers one proposal at a time. 'rounds' lets all students (or all schools with free
+                  seats) propose at once and answers every round with NumPy array operations, which is faster on
+                  large markets. Both give the same matching. Default is 'sequential'.
+    progress (callable, optional): With method='rounds', called after every round with the round number, the number
+                                   of proposals of the round and the number of proposers left to propose.
+    return_cutoffs (bool): If True, also returns the cutoff of every school: the priority rank of its last admitted
+                           student (its position in the priority list; students the school does not list rank after
+                           it, by id), None for a school with free seats, or -1 for a school without seats. Default
+                           is False.
+    tie_breaking (str, optional): How ties within priority classes are broken: 'single' (one lottery shared by all
+                                  schools) or 'multiple' (one lottery per school). Required when the priorities
+                                  have classes. Default is None.
+    seed (int or numpy.random.Generator, optional): Seed of the tie-breaking lottery. Default is None.
+    
+    Returns:
+    dict: A dictionary representing the matching, where keys are school names and values are lists of assigned students
+          (with return_state or return_cutoffs, a tuple of the matching followed by the DAState and/or the cutoffs)
+    """
+    
+    _check_method(method)
+    stats = _start_stats(stats, 'school_choice_da')
+    market = _strict_market(_school_market(students, schools), tie_breaking, seed)
+    if return_state:
+        if not student_proposing:
+            raise ValueError("return_state requires student_proposing=True")
+        if market.priority_scores is not None:
+            raise ValueError("return_state requires priority lists, not scores")
+        if market.priority_csr is None:
+            raise ValueError("The market has no school priorities")
+        state = _deferred_acceptance_state('school', market.student_names, market.school_names, market.student_csr,
+                                           _admission_ranks(market), market.priority_csr,
+                                           market.capacities.tolist(), stats, method, progress)
+        result = _state_result(state)
+        if return_cutoffs:
+            assignment = np.full(len(market.student_names), -1, dtype=np.int64)
+            for school, heap in enumerate(state.admitted):
+                assignment[[student for _, student in heap]] = school
+            cutoffs = _admission_cutoffs(market.student_csr, state.edge_ranks, market.capacities, assignment)
+            _finish_stats(stats)
+            return result, state, _cutoff_dict(cutoffs, market.school_names)
+        _finish_stats(stats)
+        return result, state
+    
+    student_names, school_names = market.student_names, market.school_names
+    capacities = market.capacities.tolist()
+    
+    assigned = [[] for _ in school_names]
+    if student_proposing:
+        priority_ranks = _admission_ranks(market)
+        if stats is not None:
+            stats.lap('compile')
+        if method == 'rounds':
+            seat_indptr, seat_students, _, _ = _round_engine(*market.student_csr, priority_ranks, market.capacities,
+                                                             stats=stats, progress=progress)
+            if stats is not None:
+                stats.lap('run')
+            seat_students = seat_students.tolist()
+            for school, (start, end) in enumerate(zip(seat_indptr[:-1].tolist(), seat_indptr[1:].tolist())):
+                assigned[school] = [student for student in seat_students[start:end] if student != -1]
+        else:
+            admitted = _student_proposing_engine(*market.student_csr, priority_ranks, capacities, stats=stats)
+            if stats is not None:
+                stats.lap('run')
+            for school, heap in enumerate(admitted):
+                assigned[school] = [student for _, student in sorted(heap, reverse=True)]
+    else:
+        if not _has_priorities(market):
+            raise ValueError("The market has no school priorities")
+        offer_lists = _offer_lists(market)
+        if stats is not None:
+            stats.lap('compile')
+        if method == 'rounds':
+            # Schools propose up to their free seats, and every student holds one offer
+            held_offer = _round_engine(*offer_lists, np.ones(len(student_names), dtype=np.int64),
+                                       quotas=market.capacities, stats=stats, progress=progress)[1].tolist()
+        else:
+            held_offer = _school_proposing_engine(*offer_lists, len(student_names), capacities, stats)
+        if stats is not None:
+            stats.lap('run')
+        for student, school in enumerate(held_offer):
+            if school != -1:
+                assigned[school].append(student)
+    
+    matching = {school_names[school]: [student_names[student] for student in members]
+                for school, members in enumerate(assigned) if members}
+    if return_cutoffs:
+        assignment = np.full(len(student_names), -1, dtype=np.int64)
+        for school, members in enumerate(assigned):
+            assignment[members] = school
+        if not student_proposing:
+            priority_ranks = _admission_ranks(market)
+        cutoffs = _admission_cutoffs(market.student_csr, priority_ranks, market.capacities, assignment)
+        _finish_stats(stats)
+        return matching, _cutoff_dict(cutoffs, school_names)
+    _finish_stats(stats)
+    return matching
+
+#------------------------------------------------------------------------------------------------------------
+##Incremental Deferred Acceptance
+
+class DAState:
+    """
+    Internal state of a student-proposing deferred acceptance run, returned with return_state=True
+    and resumed by rematch.
+    
+    Attributes:
+    kind (str): 'school' for school_choice_da, 'marriage' for deferred_acceptance.
+    student_names (list): Student (proposer) names indexed by id, including withdrawn students.
+    school_names (list): School (acceptor) names indexed by id.
+    student_index (dict): A dictionary mapping student names to ids.
+    school_index (dict): A dictionary mapping school names to ids.
+    indptr (numpy.ndarray): CSR row pointers of the student preference lists.
+    indices (numpy.ndarray): CSR school ids of the student preference lists.
+    edge_ranks (numpy.ndarray): Priority rank of every application, aligned with indices (-1 if rejected outright).
+    priority_lists (list): Priority list of every school, as an array of student ids.
+    priority_since (list): Number of students when the priority list of every school was set; students added
+                           later rank after the list even in marriage markets.
+    capacities (list): Capacity of each school.
+    next_to_propose (list): Position in indices of the next proposal of each student.
+    admitted (list): For each school, a heap of (-priority rank, student) pairs of the admitted students.
+    withdrawn (set): Ids of the withdrawn students.
+    """
+    __slots__ = ('kind', 'student_names', 'school_names', 'student_index', 'school_index', 'indptr', 'indices',
+                 'edge_ranks', 'priority_lists', 'priority_since', 'capacities', 'next_to_propose', 'admitted',
+                 'withdrawn')
+
+
+def _deferred_acceptance_state(kind, student_names, school_names, student_csr, edge_ranks, priority_csr, capacities,
+                               stats=None, method='sequential', progress=None):
+    """
+    Runs student-proposing deferred acceptance and keeps everything needed to resume it.
+    The run itself is recorded as the 'run' phase of stats, if given. With method='rounds', the
+    seats of the round-based run are turned into the heaps that rematch resumes from.
+    
+    Returns:
+    DAState: The state of the finished run.
+    """
+    state = DAState()
+    state.kind = kind
+    state.student_names = list(student_names)
+    state.school_names = list(school_names)
+    state.student_index = _agent_index(state.student_names)
+    state.school_index = _agent_index(state.school_names)
+    state.indptr = np.array(student_csr[0], dtype=np.int64)
+    state.indices = np.array(student_csr[1], dtype=np.int32)
+    state.edge_ranks = np.array(edge_ranks, dtype=np.int64)
+    state.priority_lists = np.split(np.asarray(priority_csr[1]), np.asarray(priority_csr[0])[1:-1])
+    state.priority_since = [len(state.student_names)] * len(state.school_names)
+    state.capacities = list(capacities)
+    state.next_to_propose = state.indptr[:-1].tolist()
+    state.admitted = [[] for _ in state.school_names]
+    state.withdrawn = set()
+    
+    if stats is not None:
+        stats.lap('compile')
+    if method == 'rounds':
+        seat_indptr, seat_students, seat_ranks, next_to_propose = _round_engine(
+            state.indptr, state.indices, state.edge_ranks, state.capacities, stats=stats, progress=progress)
+        state.next_to_propose = next_to_propose.tolist()
+        seat_students, seat_ranks = seat_students.tolist(), seat_ranks.tolist()
+        for school, (start, end) in enumerate(zip(seat_indptr[:-1].tolist(), seat_indptr[1:].tolist())):
+            heap = [(-rank, student) for rank, student in zip(seat_ranks[start:end], seat_students[start:end])
+                    if student != -1]
+            heapq.heapify(heap)
+            state.admitted[school] = heap
+    else:
+        _student_proposing_engine(state.indptr, state.indices, state.edge_ranks, state.capacities,
+                                  state.next_to_propose, state.admitted, stats=stats)
+    if stats is not None:
+        stats.lap('run')
+    return state
+
+
+def _state_result(state):
+    """
+    Reads the matching of a DAState in the format of school_choice_da or deferred_acceptance.
+    """
+    if state.kind == 'marriage':
+        partner = [-1] * len(state.student_names)
+        for school, heap in enumerate(state.admitted):
+            for _, student in heap:
+                partner[student] = school
+        return {state.student_names[s]: state.school_names[c] for s, c in enumerate(partner) if c != -1}
+    
+    return {state.school_names[school]: [state.student_names[student] for _, student in sorted(heap, reverse=True)]
+            for school, heap in enumerate(state.admitted) if heap}
+
+
+def _priority_rank(state, student, school):
+    """
+    Looks up the priority rank of one application in a DAState: the position of the student in the list of the
+    school, else after the list by id, or -1 for a marriage market acceptor that does not list the proposer.
+    """
+    order = state.priority_lists[school]
+    found = np.flatnonzero(order == student)
+    if len(found):
+        return int(found[0])
+    if state.kind == 'school' or student >= state.priority_since[school]:
+        return len(order) + student
+    return -1
+
+
+def _append_preferences(state, rows, lists):
+    """
+    Appends school ids to the preference lists of existing students, keeping every cursor on the same entry.
+    
+    Args:
+    state (DAState): The state, updated in place.
+    rows (list): Student ids.
+    lists (list): Lists of school ids appended to the preference list of each student.
+    """
+    old_indptr = state.indptr
+    extra = np.zeros(len(old_indptr) - 1, dtype=np.int64)
+    np.add.at(extra, rows, [len(schools) for schools in lists])
+    lengths = np.diff(old_indptr) + extra
+    indptr = np.zeros(len(old_indptr), dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    shift = indptr[:-1] - old_indptr[:-1]
+    
+    # Old entries move by the shift of their row; appended entries follow them
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    edge_ranks = np.empty(indptr[-1], dtype=np.int64)
+    old_rows = np.repeat(np.arange(len(lengths)), np.diff(old_indptr))
+    moved = np.arange(len(state.indices)) + shift[old_rows]
+    indices[moved] = state.indices
+    edge_ranks[moved] = state.edge_ranks
+    written = np.diff(old_indptr)
+    for student, schools in zip(rows, lists):
+        start = indptr[student] + written[student]
+        indices[start:start + len(schools)] = schools
+        edge_ranks[start:start + len(schools)] = [_priority_rank(state, student, school) for school in schools]
+        written[student] += len(schools)
+    
+    state.next_to_propose = (np.array(state.next_to_propose, dtype=np.int64) + shift).tolist()
+    state.indptr, state.indices, state.edge_ranks = indptr, indices, edge_ranks
+
+
+def rematch(state, capacities=None, new_students=None, withdrawn=None, appended_preferences=None, priorities=None):
+    """
+    Updates a deferred acceptance result after small changes to the market, without re-running it.
+    
+    Student-proposing deferred acceptance does not depend on the order of proposals, so new students
+    and students that lose their seat simply resume proposing from where they stopped. Changes that can
+    undo earlier rejections (more seats, new priorities, a withdrawn student at every school it proposed to)
+    mark schools as affected: every student rejected by an affected school is moved back to it, and the
+    schools it proposed to since then are affected in turn. The proposals that are kept then form a valid
+    run on the changed market, so resuming from there gives exactly the result of a full re-run, as long
+    as priorities are strict. In congested markets a released seat can affect most schools; once a quarter
+    of the students would be moved back, the run simply starts over on the updated market.
+    
+    Args:
+    state (DAState): The state returned by school_choice_da or deferred_acceptance with return_state=True,
+                     or by a previous rematch. It is updated in place.
+    capacities (dict, optional): New capacities by school name (school choice only). A school that is not
+                                 in the market is added, and must then be given priorities.
+    new_students (dict, optional): Preference lists of new students (proposers) by name. Unless priorities
+                                   of a school are given, new students are added at the end of its priority list.
+    withdrawn (list, optional): Names of students (proposers) leaving the market.
+    appended_preferences (dict, optional): Schools appended at the end of the preference lists of existing students.
+    priorities (dict, optional): New priority lists by school name; students missing from a list rank after it,
+                                 or are not acceptable to a marriage market acceptor.
+    
+    Returns:
+    tuple: The updated matching, in the format of the function that created the state, and the state.
+    """
+    if capacities and state.kind == 'marriage':
+        raise ValueError("Capacities can only be changed in school choice markets")
+    
+    free_students = []
+    affected = set()
+    priorities = priorities or {}
+    
+    # New schools, and capacity changes: a smaller school turns away its lowest-priority students
+    for school, capacity in (capacities or {}).items():
+        if school not in state.school_index:
+            if school not in priorities:
+                raise ValueError(f"New school '{school}' needs priorities")
+            state.school_index[school] = len(state.school_names)
+            state.school_names.append(school)
+            state.capacities.append(0)
+            state.admitted.append([])
+            state.priority_lists.append(np.empty(0, dtype=np.int32))
+            state.priority_since.append(len(state.student_names))
+        c = state.school_index[school]
+        if capacity > state.capacities[c]:
+            affected.add(c)
+        state.capacities[c] = capacity
+        heap = state.admitted[c]
+        while len(heap) > capacity:
+            free_students.append(heapq.heappop(heap)[1])
+    
+    # New students propose from the start of their lists, ranked after the list of every school
+    if new_students:
+        start = len(state.student_names)
+        for name in new_students:
+            if name in state.student_index:
+                raise ValueError(f"Student '{name}' is already in the market")
+            state.student_index[name] = len(state.student_names)
+            state.student_names.append(name)
+        new_ids = np.arange(start, len(state.student_names))
+        
+        lists = [np.fromiter(map(state.school_index.__getitem__, schools), dtype=np.int32, count=len(schools))
+                 for schools in new_students.values()]
+        lengths = np.array([len(schools) for schools in lists], dtype=np.int64)
+        schools = np.concatenate([np.empty(0, dtype=np.int32)] + lists)
+        list_lengths = np.array([len(order) for order in state.priority_lists], dtype=np.int64)
+        state.indptr = np.concatenate([state.indptr, state.indptr[-1] + np.cumsum(lengths)])
+        state.indices = np.concatenate([state.indices, schools])
+        state.edge_ranks = np.concatenate([state.edge_ranks, list_lengths[schools] + np.repeat(new_ids, lengths)])
+        state.next_to_propose.extend(state.indptr[start:-1].tolist())
+        free_students.extend(new_ids.tolist())
+    
+    num_students = len(state.student_names)
+    held = np.full(num_students, -1, dtype=np.int64)
+    for school, heap in enumerate(state.admitted):
+        for _, student in heap:
+            held[student] = school
+    
+    # Appended schools only matter to students that ran out of schools
+    if appended_preferences:
+        rows = [state.student_index[student] for student in appended_preferences]
+        lists = [[state.school_index[school] for school in schools] for schools in appended_preferences.values()]
+        exhausted = [s for s in rows if held[s] == -1 and s not in state.withdrawn]
+        _append_preferences(state, rows, lists)
+        free_students.extend(exhausted)
+    
+    # New priorities re-rank the applications to the school, re-key the admitted students and may reverse
+    # earlier rejections; a marriage market acceptor turns away the proposer it no longer lists
+    row_of = None
+    for school, order in priorities.items():
+        c = state.school_index[school]
+        ids = np.fromiter(map(state.student_index.__getitem__, order), dtype=np.int64, count=len(order))
+        if state.kind == 'school':
+            row = len(ids) + np.arange(num_students, dtype=np.int64)
+        else:
+            row = np.full(num_students, -1, dtype=np.int64)
+        row[ids] = np.arange(len(ids))
+        state.priority_lists[c] = ids
+        state.priority_since[c] = num_students
+        
+        if row_of is None:
+            row_of = np.repeat(np.arange(num_students), np.diff(state.indptr))
+        entries = np.flatnonzero(state.indices == c)
+        state.edge_ranks[entries] = row[row_of[entries]]
+        
+        kept = []
+        for _, student in state.admitted[c]:
+            if row[student] < 0:
+                held[student] = -1
+                free_students.append(student)
+            else:
+                kept.append((-int(row[student]), student))
+        heapq.heapify(kept)
+        state.admitted[c] = kept
+        affected.add(c)
+    
+    # Withdrawn students stop proposing; every school they proposed to may have rejected someone because of them
+    cursor = np.array(state.next_to_propose, dtype=np.int64)
+    left = set()
+    for name in withdrawn or []:
+        s = state.student_index[name]
+        state.withdrawn.add(s)
+        affected.update(state.indices[state.indptr[s]:cursor[s]].tolist())
+        cursor[s] = state.indptr[s + 1]
+        if held[s] != -1:
+            left.add(s)
+            held[s] = -1
+    
+    # Move every student rejected by an affected school back to it; the schools it proposed to since then are
+    # affected in turn, so the proposals that are kept only involve unaffected students and remain valid
+    if affected:
+        positions = np.argsort(state.indices, kind='stable')
+        school_ptr = np.zeros(len(state.school_names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(state.indices, minlength=len(state.school_names)), out=school_ptr[1:])
+        if row_of is None:
+            row_of = np.repeat(np.arange(num_students), np.diff(state.indptr))
+        is_withdrawn = np.zeros(num_students, dtype=bool)
+        is_withdrawn[list(state.withdrawn)] = True
+        
+        # Past a quarter of the students, starting over on the updated market is cheaper than the closure
+        reset_limit = num_students // 4
+        num_reset = 0
+        queue = list(affected)
+        while queue and num_reset <= reset_limit:
+            c = queue.pop()
+            entries = positions[school_ptr[c]:school_ptr[c + 1]]
+            students = row_of[entries]
+            rejected = (entries < cursor[students]) & (held[students] != c) & ~is_withdrawn[students]
+            students, entries = students[rejected], entries[rejected]
+            
+            for s, position in zip(students.tolist(), entries.tolist()):
+                for d in state.indices[position:cursor[s]].tolist():
+                    if d not in affected:
+                        affected.add(d)
+                        queue.append(d)
+                cursor[s] = position
+                if held[s] != -1:
+                    left.add(s)
+                    held[s] = -1
+            free_students.extend(students.tolist())
+            num_reset += len(students)
+        
+        if queue:
+            cursor = state.indptr[:-1].copy()
+            cursor[is_withdrawn] = state.indptr[1:][is_withdrawn]
+            state.admitted = [[] for _ in state.school_names]
+            affected = set()
+            free_students = np.flatnonzero(~is_withdrawn).tolist()
+    state.next_to_propose = cursor.tolist()
+    
+    # Drop the students that left their school from its heap
+    for c in affected:
+        heap = state.admitted[c]
+        state.admitted[c] = [entry for entry in heap if entry[1] not in left]
+        heapq.heapify(state.admitted[c])
+    
+    free_students = [s for s in dict.fromkeys(free_students) if s not in state.withdrawn]
+    _student_proposing_engine(state.indptr, state.indices, state.edge_ranks, state.capacities,
+                              state.next_to_propose, state.admitted, free_students[::-1])
+    return _state_result(state), state
+
+#------------------------------------------------------------------------------------------------------------
+##Admission Cutoffs
+# A school's cutoff is the priority rank of the last student it admits. Student-proposing deferred
+# acceptance admits every student to the first school of their list whose cutoff they clear, so the
+# cutoffs of one run answer what-if questions about other lists without running the mechanism again.
+
+_OPEN = np.iinfo(np.int64).max
+
+
+def _admission_cutoffs(student_csr, priority_ranks, capacities, assignment):
+    """
+    Computes the cutoff of every school from an assignment.
+    
+    Args:
+    student_csr (tuple): (indptr, indices) of the student preference lists.
+    priority_ranks (numpy.ndarray): Priority rank of every application, aligned with the student lists.
+    capacities (numpy.ndarray): Capacity of each school.
+    assignment (numpy.ndarray): School of each student, or -1 if unassigned.
+    
+    Returns:
+    numpy.ndarray: The priority rank of the last admitted student of every full school, _OPEN for schools
+                   with free seats and -1 for schools without seats.
+    """
+    indptr, indices = student_csr
+    capacities = np.asarray(capacities, dtype=np.int64)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    admitted = indices == assignment[rows]
+    cutoffs = np.full(len(capacities), -1, dtype=np.int64)
+    np.maximum.at(cutoffs, indices[admitted], np.asarray(priority_ranks)[admitted])
+    counts = np.bincount(assignment[assignment >= 0], minlength=len(capacities))
+    cutoffs[counts < capacities] = _OPEN
+    return cutoffs
+
+
+def _cutoff_dict(cutoffs, school_names):
+    """
+    Converts cutoffs to the dictionary returned by school_choice_da, with None for schools with free seats.
+    """
+    return {name: None if cutoff == _OPEN else cutoff for name, cutoff in zip(school_names, cutoffs.tolist())}
+
+
+class AdmissionQuery:
+    """
+    Answers what-if questions about student-proposing deferred acceptance, such as "would I have been
+    admitted if I had ranked this school higher", from the cutoffs of one run.
+    
+    With another preference list, a student gets the first school of the list whose cutoff they clear.
+    This is exact when the student is too small a part of the market to move the cutoffs, as in large
+    markets; in small markets the seat the student leaves or takes can shift them, and verify=True
+    re-runs the mechanism instead. A query on a list of k schools takes O(k log E) time, where E is
+    the number of priority entries, through an index of the priority lists built once.
+    
+    Args:
+    students (dict or SchoolMarket): Student preferences, or a SchoolMarket of the whole market.
+    schools (dict): School priorities and capacities, as for school_choice_da. Omitted when a SchoolMarket is given.
+    method (str): Deferred acceptance method of the run and of verifications. Default is 'sequential'.
+    
+    Attributes:
+    market (SchoolMarket): The compiled market.
+    matching (dict): The matching of the run, as returned by school_choice_da.
+    cutoffs (dict): The cutoff of every school, as returned by school_choice_da with return_cutoffs=True.
+    """
+    __slots__ = ('market', 'matching', 'cutoffs', 'method', '_cutoffs', '_assignment', '_priority_keys',
+                 '_priority_positions')
+    
+    def __init__(self, students, schools=None, method='sequential'):
+        _check_method(method)
+        market = _school_market(students, schools)
+        if not _has_priorities(market):
+            raise ValueError("The market has no school priorities")
+        self.market = market
+        self.method = method
+        self.matching, self.cutoffs = school_choice_da(market, method=method, return_cutoffs=True)
+        self._cutoffs = np.array([_OPEN if cutoff is None else cutoff for cutoff in self.cutoffs.values()],
+                                 dtype=np.int64)
+        self._assignment = {student: school for school, members in self.matching.items() for student in members}
+        
+        self._priority_keys = self._priority_positions = None
+        if market.priority_scores is not None:
+            return
+        
+        # Priority entries sorted by (school, student) key, with their positions in the lists
+        indptr, indices = market.priority_csr
+        lengths = np.diff(indptr)
+        keys = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths) * len(market.student_names) + indices
+        order = np.argsort(keys)
+        self._priority_keys = keys[order]
+        self._priority_positions = (np.arange(len(indices)) - np.repeat(indptr[:-1], lengths))[order]
+    
+    def _ids(self, student, schools):
+        """
+        Maps a student name and a list of school names to ids.
+        """
+        if student not in self.market.student_index:
+            raise ValueError(f"Unknown student '{student}'")
+        unknown = [school for school in schools if school not in self.market.school_index]
+        if unknown:
+            raise ValueError(f"Unknown school '{unknown[0]}'")
+        ids = np.fromiter(map(self.market.school_index.__getitem__, schools), dtype=np.int64, count=len(schools))
+        return self.market.student_index[student], ids
+    
+    def priority_ranks(self, student, schools):
+        """
+        Returns the priority ranks of a student at the given schools; students a school does not list rank
+        after its list, by id, as in school_choice_da.
+        
+        Args:
+        student: Student name.
+        schools (list): School names.
+        
+        Returns:
+        numpy.ndarray: The priority rank at each school.
+        """
+        student, schools = self._ids(student, schools)
+        return self._priority_ranks(student, schools)
+    
+    def _priority_ranks(self, student, schools):
+        if self.market.priority_scores is not None:
+            return _score_ranks(self.market, schools, np.full(len(schools), student))
+        keys = schools * len(self.market.student_names) + student
+        lengths = np.diff(self.market.priority_csr[0])[schools]
+        if not len(self._priority_keys):
+            return lengths + student
+        found = np.minimum(np.searchsorted(self._priority_keys, keys), len(self._priority_keys) - 1)
+        listed = self._priority_keys[found] == keys
+        return np.where(listed, self._priority_positions[found], lengths + student)
+    
+    def clears_cutoff(self, student, school):
+        """
+        Tells whether a student would be admitted by a school they ranked first.
+        
+        Args:
+        student: Student name.
+        school: School name.
+        
+        Returns:
+        bool: True if the priority rank of the student at the school is within its cutoff.
+        """
+        student, schools = self._ids(student, [school])
+        return bool(self._priority_ranks(student, schools)[0] <= self._cutoffs[schools[0]])
+    
+    def assignment(self, student, preferences=None, verify=False):
+        """
+        Returns the school a student would be assigned to with a given preference list.
+        
+        Args:
+        student: Student name.
+        preferences (list, optional): Alternative preference list of school names. Default is None (the
+                                      assignment of the run).
+        verify (bool): If True, re-runs deferred acceptance with the alternative list instead of reading the
+                       cutoffs, which is exact in any market but costs a full run. Default is False.
+        
+        Returns:
+        The name of the school, or None if the student would be unassigned.
+        """
+        if preferences is None:
+            if student not in self.market.student_index:
+                raise ValueError(f"Unknown student '{student}'")
+            return self._assignment.get(student)
+        
+        student_id, schools = self._ids(student, preferences)
+        if verify:
+            return self._rerun(student_id, schools)
+        admitted = np.flatnonzero(self._priority_ranks(student_id, schools) <= self._cutoffs[schools])
+        return self.market.school_names[schools[admitted[0]]] if len(admitted) else None
+    
+    def _rerun(self, student, schools):
+        """
+        Runs deferred acceptance on the market with the list of one student replaced, and returns their school.
+        """
+        indptr, indices = self.market.student_csr
+        start, end = int(indptr[student]), int(indptr[student + 1])
+        new_indices = np.concatenate((indices[:start], schools.astype(indices.dtype), indices[end:]))
+        new_indptr = np.array(indptr, dtype=np.int64)
+        new_indptr[student + 1:] += len(schools) - (end - start)
+        market = SchoolMarket.from_arrays((new_indptr, new_indices), self.market.capacities, self.market.priority_csr,
+                                          self.market.student_names, self.market.school_names,
+                                          priority_scores=self.market.priority_scores,
+                                          priority_bonuses=self.market.priority_bonuses)
+        name = self.market.student_names[student]
+        for school, members in school_choice_da(market, method=self.method).items():
+            if name in members:
+                return school
+        return None
+
+#------------------------------------------------------------------------------------------------------------
+##Stable Improvement Cycles
+# Breaking the ties of weak priorities with a lottery can cost efficiency: after deferred acceptance,
+# students may be able to swap seats without anyone gaining justified envy. Erdil and Ergin (2008)
+# find these swaps as cycles of a graph over the schools, and a stable assignment without such a
+# cycle is not Pareto dominated by any other stable assignment.
+
+@cached(bypass=_collects_stats)
+def stable_improvement_cycles(matching, students, schools=None, stats=None):
+    """
+    Improves a stable school choice assignment under weak priorities by executing stable improvement cycles.
+    
+    A student desires the schools they prefer to their own, and the desiring students of the best
+    priority class at a school could take its seats without creating justified envy. The schools form
+    a graph with an edge from t to s when a student of t is among them for s; along a cycle, each such
+    student moves to the next school, so every mover is better off and the assignment stays stable.
+    Cycles are found by depth-first search over the schools, and executing one only updates the classes
+    and edges of the movers' schools, so a cycle costs O(S + number of edges) plus the movers' list
+    lengths instead of a search over all students.
+    
+    Args:
+    matching (dict): A stable assignment where keys are school names and values are lists of assigned students,
+                     such as the output of school_choice_da with tie_breaking.
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school names
+                                     in order of preference, or a SchoolMarket of the whole market.
+    schools (dict): School priorities (with classes) and capacities, as for school_choice_da.
+                    Omitted when a SchoolMarket is given.
+    stats (MatchingStats, optional): Filled with the number of cycles, the number of students in the longest
+                                     one and the phase timings. Default is None.
+    
+    Returns:
+    dict: The improved assignment, where keys are school names and values are lists of assigned students.
+    """
+    
+    stats = _start_stats(stats, 'stable_improvement_cycles')
+    market = _school_market(students, schools)
+    if not _has_priorities(market):
+        raise ValueError("The market has no school priorities")
+    student_names, school_names = market.student_names, market.school_names
+    student_index, school_index = market.student_index, market.school_index
+    num_students, num_schools = len(student_names), len(school_names)
+    
+    # Position of every student's assignment in their list (the end of the list when unassigned)
+    indptr, indices = market.student_csr
+    rows = np.repeat(np.arange(num_students), np.diff(indptr))
+    assignment = np.full(num_students, -1, dtype=np.int64)
+    for school, members in matching.items():
+        assignment[[student_index[student] for student in members]] = school_index[school]
+    own = indices == assignment[rows]
+    own_entry = indptr[1:].copy()
+    own_entry[rows[own]] = np.flatnonzero(own)
+    desired = np.flatnonzero(np.arange(len(indices)) < own_entry[rows])
+    
+    list_start = indptr[:-1].tolist()
+    own_entry = own_entry.tolist()
+    assigned = assignment.tolist()
+    classes = _admission_ranks(market).tolist()
+    indices = indices.tolist()
+    
+    # Students desiring every school, by priority class, and the classes left in increasing order
+    desirers = [{} for _ in range(num_schools)]
+    for student, entry in zip(rows[desired].tolist(), desired.tolist()):
+        desirers[indices[entry]].setdefault(classes[entry], set()).add(student)
+    levels = [sorted(by_class, reverse=True) for by_class in desirers]
+    top = [level[-1] if level else None for level in levels]
+    
+    # witnesses[t][s]: students of school t in the best class desiring s (the edge t -> s); the last
+    # entry holds the unassigned students, who take part in the classes but not in the cycles
+    witnesses = [{} for _ in range(num_schools + 1)]
+    for school in range(num_schools):
+        for student in desirers[school].get(top[school], ()):
+            witnesses[assigned[student]].setdefault(school, set()).add(student)
+    if stats is not None:
+        stats.lap('compile')
+    
+    def promote(school):
+        # The best class of the school has no desiring student left: the next one takes its place
+        level = levels[school]
+        while level and level[-1] not in desirers[school]:
+            level.pop()
+        top[school] = level[-1] if level else None
+        for student in desirers[school].get(top[school], ()):
+            witnesses[assigned[student]].setdefault(school, set()).add(student)
+    
+    def forget(student, school, level):
+        # The student no longer desires the school
+        members = desirers[school][level]
+        members.discard(student)
+        if level == top[school]:
+            edge = witnesses[assigned[student]]
+            edge[school].discard(student)
+            if not edge[school]:
+                del edge[school]
+        if not members:
+            del desirers[school][level]
+            if level == top[school]:
+                promote(school)
+    
+    def move(student, school):
+        # The student leaves their school for a school they desire, and stops desiring it and the schools after it
+        start, end = list_start[student], own_entry[student]
+        entry = start + indices[start:end].index(school)
+        for e in range(entry, end):
+            forget(student, indices[e], classes[e])
+        before, after = witnesses[assigned[student]], witnesses[school]
+        for e in range(start, entry):
+            other = indices[e]
+            if classes[e] == top[other]:
+                before[other].discard(student)
+                if not before[other]:
+                    del before[other]
+                after.setdefault(other, set()).add(student)
+        assigned[student] = school
+        own_entry[student] = entry
+    
+    def find_cycle():
+        # Depth-first search over the schools; a school on the current path reached again closes a cycle
+        state = [0] * num_schools  # 0: unvisited, 1: on the path, 2: no cycle through it
+        for root in range(num_schools):
+            if state[root]:
+                continue
+            path, pending = [root], [iter(witnesses[root])]
+            state[root] = 1
+            while path:
+                for school in pending[-1]:
+                    if state[school] == 1:
+                        return path[path.index(school):]
+                    if state[school] == 0:
+                        state[school] = 1
+                        path.append(school)
+                        pending.append(iter(witnesses[school]))
+                        break
+                else:
+                    state[path.pop()] = 2
+                    pending.pop()
+        return None
+    
+    num_cycles = longest = 0
+    cycle = find_cycle()
+    while cycle is not None:
+        movers = [next(iter(witnesses[school][target])) for school, target in zip(cycle, cycle[1:] + cycle[:1])]
+        for student, target in zip(movers, cycle[1:] + cycle[:1]):
+            move(student, target)
+        num_cycles += 1
+        longest = max(longest, len(cycle))
+        cycle = find_cycle()
+    if stats is not None:
+        stats.record(cycles=num_cycles, longest_chain=longest)
+        stats.lap('run')
+    
+    # Students who stayed keep their place in the lists; movers follow, by id
+    assigned_lists = [[] for _ in range(num_schools)]
+    for school, members in matching.items():
+        c = school_index[school]
+        assigned_lists[c] = [student for student in members if assigned[student_index[student]] == c]
+    for student in np.flatnonzero(np.array(assigned, dtype=np.int64) != assignment).tolist():
+        assigned_lists[assigned[student]].append(student_names[student])
+    result = {school_names[c]: members for c, members in enumerate(assigned_lists) if members}
+    _finish_stats(stats)
+    return result
+
+#------------------------------------------------------------------------------------------------------------
+##Boston Mechanism
+
+def _boston_engine(indptr, indices, priority_ranks, capacities, stats=None):
+    """
+    Runs the Boston mechanism on a compiled school choice instance.
+    
+    Each round only looks at students that are still unmatched and still have a choice left.
+    Their applications are bucketed per school with one lexicographic sort on (school, priority
+    rank), and every school admits the first applicants of its bucket up to its free seats.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the students' preference lists.
+    indices (numpy.ndarray): CSR school ids of the students' preference lists.
+    priority_ranks (numpy.ndarray): Priority rank of every application, aligned with indices.
+    capacities (list): Capacity of each school.
+    stats (MatchingStats, optional): Counters of the run, updated in place.
+    
+    Returns:
+    numpy.ndarray: The school assigned to every student, or -1 if the student is unassigned.
+    """
+    lengths = np.diff(indptr)
+    assignment = np.full(len(lengths), -1, dtype=np.int64)
+    free_seats = np.array(capacities, dtype=np.int64)
+    unmatched = np.arange(len(lengths))
+    preference_level = 0
+    num_applications = most_applicants = 0
+    
+    while True:
+        # Collect students who are applying to schools in this round
+        unmatched = unmatched[lengths[unmatched] > preference_level]
+        if not len(unmatched):
+            break
+        num_applications += len(unmatched)
+        most_applicants = max(most_applicants, len(unmatched))
+        applications = indptr[unmatched] + preference_level
+        applied_to = indices[applications].astype(np.int64)
+        
+        # Sort applications by school, then by priority
+        order = np.lexsort((priority_ranks[applications], applied_to))
+        applied_to = applied_to[order]
+        applicants = unmatched[order]
+        
+        # Assign seats to top priority applicants
+        new_school = np.flatnonzero(np.diff(applied_to, prepend=-1))
+        position = np.arange(len(order)) - np.repeat(new_school, np.diff(np.append(new_school, len(order))))
+        admitted = position < free_seats[applied_to]
+        assignment[applicants[admitted]] = applied_to[admitted]
+        free_seats -= np.bincount(applied_to[admitted], minlength=len(free_seats))
+        
+        unmatched = applicants[~admitted]
+        preference_level += 1
+    
+    if stats is not None:
+        stats.record(proposals=num_applications, accepted=int(np.count_nonzero(assignment != -1)),
+                     rounds=preference_level, queue_length=most_applicants)
+    return assignment
+
+
+@cached(bypass=lambda arguments: _collects_stats(arguments) or _unseeded_lottery(arguments))
+def boston_mechanism(students, schools=None, stats=None, tie_breaking=None, seed=None):
+    """
+    Implements the Boston mechanism for school choice.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are dictionaries containing:
+                    'priorities': list of student names in order of priority (a list or set of students inside
+                                  it is a class of equally ranked students, see tie_breaking)
+                    'capacity': integer representing the school's capacity
+                    Omitted when a SchoolMarket is given.
+    stats (MatchingStats, optional): Filled with the counters and phase timings of the run. Default is None.
+    tie_breaking (str, optional): How ties within priority classes are broken: 'single' (one lottery shared by all
+                                  schools) or 'multiple' (one lottery per school). Required when the priorities
+                                  have classes. Default is None.
+    seed (int or numpy.random.Generator, optional): Seed of the tie-breaking lottery. Default is None.
+    
+    Returns:
+    dict: A dictionary representing the matching, where keys are student names and values are assigned schools.
+    """
+    
+    stats = _start_stats(stats, 'boston_mechanism')
+    market = _strict_market(_school_market(students, schools), tie_breaking, seed)
+    school_names = market.school_names
+    priority_ranks = _admission_ranks(market)
+    if stats is not None:
+        stats.lap('compile')
+    
+    assignment = _boston_engine(*market.student_csr, priority_ranks, market.capacities.tolist(), stats)
+    if stats is not None:
+        stats.lap('run')
+    
+    matching = {student: school_names[c] if c != -1 else None
+                for student, c in zip(market.student_names, assignment.tolist())}
+    _finish_stats(stats)
+    return matching
+
+
+#------------------------------------------------------------------------------------------------------------
+
+##Top Trading Cycle(TTC)
+
+def _top_trading_cycles_engine(student_indptr, student_indices, school_indptr, school_indices, capacities, stats=None,
+                               order=None, list_keys=None, order_keys=None):
+    """
+    Runs the Top Trading Cycles algorithm on a compiled school choice instance.
+    
+    Students point to their most preferred school with free seats and schools point to their
+    highest-priority remaining student. Both keep a cursor into their list that only moves
+    forward when the agent it points to leaves the market. Cycles are found by following the
+    pointers with a stack: once a cycle is cleared, only the agent on top of the stack has to
+    re-point, so the walk resumes there and the whole run is linear in the total list length.
+    Clearing cycles in this order gives the same result as clearing them round by round.
+    A school past the end of its priority list points to the remaining students in a shared order
+    (by id by default). With keys, a school instead merges its list with the shared order, as for
+    score-based priorities, where the list holds the students with a bonus at the school.
+    
+    Args:
+    student_indptr (numpy.ndarray): CSR row pointers of the students' preference lists.
+    student_indices (numpy.ndarray): CSR school ids of the students' preference lists.
+    school_indptr (numpy.ndarray): CSR row pointers of the school priority lists.
+    school_indices (numpy.ndarray): CSR student ids of the school priority lists.
+    capacities (list): Capacity of each school.
+    stats (MatchingStats, optional): Counters of the run, updated in place.
+    order (numpy.ndarray, optional): All students in the shared order. Default is None (by id).
+    list_keys (numpy.ndarray, optional): Priority key of every entry of school_indices, lower first.
+    order_keys (numpy.ndarray, optional): Priority key of every entry of order, comparable with list_keys.
+    
+    Returns:
+    list: The school assigned to every student, or -1 if the student is unassigned.
+    """
+    num_students = len(student_indptr) - 1
+    num_cycles = longest_cycle = 0
+    deepest_walk = min(num_students, 1)
+    student_cursor = student_indptr[:-1].tolist()
+    student_end = student_indptr[1:].tolist()
+    school_cursor = school_indptr[:-1].tolist()
+    school_end = school_indptr[1:].tolist()
+    free_seats = list(capacities)
+    assignment = [-1] * num_students
+    removed = [False] * num_students
+    on_stack = [False] * num_students
+    
+    # next_alive leads from a position in the shared order to the first position at or after it whose
+    # student is still in the market
+    order = list(range(num_students)) if order is None else order.tolist()
+    order_position = [0] * num_students
+    for position, student in enumerate(order):
+        order_position[student] = position
+    next_alive = list(range(num_students + 1))
+    merged = list_keys is not None
+    if merged:
+        list_keys, order_keys = list_keys.tolist(), order_keys.tolist()
+        order_cursor = [0] * len(capacities)
+        own_list = [set(school_indices[start:end].tolist()) for start, end in zip(school_cursor, school_end)]
+    
+    def first_alive(position):
+        while next_alive[position] != position:
+            next_alive[position] = next_alive[next_alive[position]]
+            position = next_alive[position]
+        return position
+    
+    def leave(student):
+        removed[student] = True
+        next_alive[order_position[student]] = order_position[student] + 1
+    
+    def pointed_school(student):
+        # Advance the student's cursor past schools without free seats
+        position = student_cursor[student]
+        while position < student_end[student]:
+            school = int(student_indices[position])
+            if free_seats[school] > 0:
+                break
+            position += 1
+        else:
+            school = -1
+        student_cursor[student] = position
+        return school
+    
+    def pointed_student(school):
+        # Advance the school's cursor past students who already left the market
+        position = school_cursor[school]
+        while position < school_end[school]:
+            student = int(school_indices[position])
+            if not removed[student]:
+                break
+            position += 1
+        else:
+            student = -1
+        school_cursor[school] = position
+        if not merged:
+            if student == -1:
+                # Every listed student has left; the school points to the others in the shared order
+                shared = first_alive(0)
+                student = order[shared] if shared < num_students else -1
+            return student
+        
+        # The best remaining student of the shared order who is not on the school's own list
+        shared = first_alive(order_cursor[school])
+        while shared < num_students and order[shared] in own_list[school]:
+            shared = first_alive(shared + 1)
+        order_cursor[school] = shared
+        if shared < num_students and (student == -1 or order_keys[shared] < list_keys[position]):
+            student = order[shared]
+        return student
+    
+    for start in range(num_students):
+        if removed[start]:
+            continue
+        
+        stack = [start]
+        on_stack[start] = True
+        while stack:
+            student = stack[-1]
+            school = pointed_school(student)
+            
+            # A student without any school with free seats leaves unassigned
+            if school == -1:
+                stack.pop()
+                on_stack[student] = False
+                leave(student)
+                continue
+            
+            # A school that has no remaining student to point to cannot trade its seats
+            target = pointed_student(school)
+            if target == -1:
+                free_seats[school] = 0
+                continue
+            
+            if not on_stack[target]:
+                stack.append(target)
+                on_stack[target] = True
+                if len(stack) > deepest_walk:
+                    deepest_walk = len(stack)
+                continue
+            
+            # The students from the target to the top of the stack form a cycle
+            cycle_start = len(stack)
+            while True:
+                member = stack.pop()
+                on_stack[member] = False
+                leave(member)
+                seat = int(student_indices[student_cursor[member]])
+                assignment[member] = seat
+                free_seats[seat] -= 1
+                if member == target:
+                    break
+            num_cycles += 1
+            longest_cycle = max(longest_cycle, cycle_start - len(stack))
+    
+    if stats is not None:
+        stats.record(cycles=num_cycles, longest_chain=longest_cycle, queue_length=deepest_walk)
+    return assignment
+
+
+@cached(bypass=lambda arguments: _collects_stats(arguments) or _unseeded_lottery(arguments))
+def top_trading_cycles(students, schools=None, stats=None, tie_breaking=None, seed=None):
+    """
+    Implements the Top Trading Cycles algorithm for school choice.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are dictionaries containing:
+                    'priorities': list of student names in order of preference (a list or set of students
+                                  inside it is a class of equally ranked students, see tie_breaking)
+                    'capacity': integer representing the school's capacity
+                    Omitted when a SchoolMarket is given.
+    stats (MatchingStats, optional): Filled with the counters and phase timings of the run. Default is None.
+    tie_breaking (str, optional): How ties within priority classes are broken: 'single' (one lottery shared by all
+                                  schools) or 'multiple' (one lottery per school). Required when the priorities
+                                  have classes. Default is None.
+    seed (int or numpy.random.Generator, optional): Seed of the tie-breaking lottery. Default is None.
+    
+    Returns:
+    dict: A dictionary representing the matching, where keys are student names and values are assigned schools.
+    """
+    
+    stats = _start_stats(stats, 'top_trading_cycles')
+    market = _strict_market(_school_market(students, schools), tie_breaking, seed)
+    student_names, school_names = market.student_names, market.school_names
+    if not _has_priorities(market):
+        raise ValueError("The market has no school priorities")
+    if market.priority_scores is not None:
+        school_indptr, school_indices, list_keys, order, order_keys = _score_lists(market)
+        if stats is not None:
+            stats.lap('compile')
+        assignment = _top_trading_cycles_engine(*market.student_csr, school_indptr, school_indices,
+                                                market.capacities.tolist(), stats, order, list_keys, order_keys)
+    else:
+        if stats is not None:
+            stats.lap('compile')
+        assignment = _top_trading_cycles_engine(*market.student_csr, *market.priority_csr,
+                                                market.capacities.tolist(), stats)
+    if stats is not None:
+        stats.lap('run')
+    
+    matching = {student_names[s]: school_names[c] for s, c in enumerate(assignment) if c != -1}
+    _finish_stats(stats)
+    return matching
+
+
+#------------------------------------------------------------------------------------------------------------
+##Serial Dictatorship
+
+def _serial_dictatorship_engine(indptr, indices, capacities, order):
+    """
+    Runs serial dictatorship on a compiled school choice instance.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the students' preference lists.
+    indices (numpy.ndarray): CSR school ids of the students' preference lists.
+    capacities (list): Capacity of each school.
+    order (list): Student ids in the order they choose.
+    
+    Returns:
+    list: The school assigned to each student of the order, or -1 if the student is unassigned.
+    """
+    remaining_capacity = list(capacities)
+    starts = indptr.tolist()
+    indices = indices.tolist()
+    assignment = []
+    
+    for student in order:
+        for school in indices[starts[student]:starts[student + 1]]:
+            if remaining_capacity[school] > 0:
+                remaining_capacity[school] -= 1
+                assignment.append(school)
+                break
+        else:
+            assignment.append(-1)
+    
+    return assignment
+
+
+@cached()
+def serial_dictatorship(students, schools=None, student_order=None):
+    """
+    Implements the Serial Dictatorship algorithm for school choice.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are their capacities.
+                    Omitted when a SchoolMarket is given.
+    student_order (list): List of student names in the order they should choose schools.
+                          Default is None (the order of the students).
+    
+    Returns:
+    dict: A dictionary representing the matching, where keys are student names and values are assigned schools.
+    """
+    
+    market = _school_market(students, schools)
+    student_names, school_names = market.student_names, market.school_names
+    if student_order is None:
+        order = list(range(len(student_names)))
+    else:
+        order = [market.student_index[student] for student in student_order]
+    
+    # Let students choose in the given order; students left without a seat get None
+    assignment = _serial_dictatorship_engine(*market.student_csr, market.capacities.tolist(), order)
+    
+    return {student_names[s]: school_names[c] if c != -1 else None for s, c in zip(order, assignment)}
+
+#------------------------------------------------------------------------------------------------------------
+##Random Serial Dictatorship
+
+def random_serial_dictatorship(students, schools=None):
+    """
+    Implements the Random Serial Dictatorship algorithm for school choice.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are their capacities.
+                    Omitted when a SchoolMarket is given.
+    
+    Returns:
+    dict: A dictionary representing the matching, where keys are student names and values are assigned schools.
+    """
+    
+    market = _school_market(students, schools)
+    student_names, school_names = market.student_names, market.school_names
+    
+    # Create a random order of students
+    order = list(range(len(student_names)))
+    random.shuffle(order)
+    
+    assignment = _serial_dictatorship_engine(*market.student_csr, market.capacities.tolist(), order)
+    
+    return {student_names[s]: school_names[c] if c != -1 else None for s, c in zip(order, assignment)}
+
+
+def _padded_preferences(indptr, indices, fill):
+    """
+    Converts CSR preference lists into a rectangular matrix padded with a fill value.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the preference lists.
+    indices (numpy.ndarray): CSR partner ids of the preference lists.
+    fill (int): Value stored after the end of every list.
+    
+    Returns:
+    numpy.ndarray: An int64 matrix with one preference list per row.
+    """
+    lengths = np.diff(indptr)
+    width = int(lengths.max()) if len(lengths) else 0
+    padded = np.full((len(lengths), max(width, 1)), fill, dtype=np.int64)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    padded[rows, np.arange(len(indices)) - indptr[rows]] = indices
+    return padded
+
+
+def _serial_dictatorship_batch(preferences, capacities, orders):
+    """
+    Runs serial dictatorship for a batch of student orders at once.
+    
+    The loop goes over positions in the order; at every position the students picking in all
+    draws of the batch are handled together with array operations.
+    
+    Args:
+    preferences (numpy.ndarray): Padded preference matrix; padding uses the id len(capacities).
+    capacities (numpy.ndarray): Capacity of each school.
+    orders (numpy.ndarray): One student order per row.
+    
+    Returns:
+    numpy.ndarray: The school assigned to every student in every draw, indexed [draw, student], or -1.
+    """
+    num_draws, num_students = orders.shape
+    draws = np.arange(num_draws)
+    
+    # The extra column stands for the padding "school", which never has a free seat
+    remaining = np.zeros((num_draws, len(capacities) + 1), dtype=np.int64)
+    remaining[:, :-1] = capacities
+    assignment = np.full((num_draws, num_students), -1, dtype=np.int64)
+    
+    for position in range(num_students):
+        student = orders[:, position]
+        choices = preferences[student]
+        available = remaining[draws[:, None], choices] > 0
+        first = np.argmax(available, axis=1)
+        chosen = choices[draws, first]
+        got_seat = available[draws, first]
+        remaining[draws[got_seat], chosen[got_seat]] -= 1
+        assignment[draws[got_seat], student[got_seat]] = chosen[got_seat]
+    
+    return assignment
+
+
+def _random_serial_dictatorship_draws(preferences, capacities, num_draws, seed_sequence):
+    """
+    Draws random student orders from a seed sequence and runs serial dictatorship for all of them.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    num_students = preferences.shape[0]
+    orders = rng.permuted(np.broadcast_to(np.arange(num_students), (num_draws, num_students)), axis=1)
+    return _serial_dictatorship_batch(preferences, capacities, orders)
+
+
+def _assignment_counts(assignment, num_schools):
+    """
+    Counts how often every student is assigned to every school over a batch of draws.
+    """
+    num_students = assignment.shape[1]
+    student = np.broadcast_to(np.arange(num_students), assignment.shape)
+    assigned = assignment >= 0
+    flat = student[assigned] * num_schools + assignment[assigned]
+    return np.bincount(flat, minlength=num_students * num_schools).reshape(num_students, num_schools)
+
+
+_rsd_worker_instance = None
+
+
+def _init_rsd_worker(preferences, capacities):
+    """
+    Stores the compiled instance in a worker process, so it is shipped only once per worker.
+    """
+    global _rsd_worker_instance
+    _rsd_worker_instance = (preferences, capacities)
+
+
+def _rsd_worker_counts(num_draws, seed_sequence):
+    """
+    Runs one batch of lotteries in a worker process and returns the assignment counts.
+    """
+    preferences, capacities = _rsd_worker_instance
+    assignment = _random_serial_dictatorship_draws(preferences, capacities, num_draws, seed_sequence)
+    return _assignment_counts(assignment, len(capacities))
+
+
+def _compile_serial_dictatorship(students, schools):
+    """
+    Compiles a serial dictatorship instance into a padded preference matrix and a capacity array.
+    """
+    market = _school_market(students, schools)
+    preferences = _padded_preferences(*market.student_csr, len(market.school_names))
+    return preferences, market.capacities
+
+
+def _lottery_batches(num_draws, batch_size, seed):
+    """
+    Splits the draws into batches, each with its own independent seed sequence.
+    
+    The seed sequences only depend on the seed and the batch layout, so results do not depend
+    on the number of worker processes.
+    """
+    sizes = [min(batch_size, num_draws - start) for start in range(0, num_draws, batch_size)]
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return list(zip(sizes, seed_sequence.spawn(len(sizes))))
+
+
+def iter_random_serial_dictatorship(students, schools, num_draws, seed=None, batch_size=256):
+    """
+    Runs many Random Serial Dictatorship lotteries and yields the outcome of each draw.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are their capacities (None with a SchoolMarket).
+    num_draws (int): Number of lotteries.
+    seed (int or numpy.random.SeedSequence, optional): Seed of the lotteries. Default is None (fresh entropy).
+    batch_size (int): Number of lotteries run together with array operations. Default is 256.
+    
+    Yields:
+    numpy.ndarray: For every draw, the index (in the order of schools) of the school assigned to each student
+                   (in the order of students), or -1 if the student is unassigned.
+    """
+    preferences, capacities = _compile_serial_dictatorship(students, schools)
+    for size, seed_sequence in _lottery_batches(num_draws, batch_size, seed):
+        yield from _random_serial_dictatorship_draws(preferences, capacities, size, seed_sequence)
+
+
+@cached(bypass=lambda arguments: arguments['seed'] is None)
+def random_serial_dictatorship_probabilities(students, schools, num_draws, seed=None, batch_size=256, workers=None):
+    """
+    Estimates the assignment probabilities of Random Serial Dictatorship by Monte Carlo simulation.
+    
+    Lotteries are run in batches with array operations over the draws, and batches can be spread
+    over a process pool. Each batch has its own seed stream spawned from the seed, so results are
+    reproducible for a given seed regardless of the number of workers.
+    
+    Args:
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are their capacities (None with a SchoolMarket).
+    num_draws (int): Number of lotteries.
+    seed (int or numpy.random.SeedSequence, optional): Seed of the lotteries. Default is None (fresh entropy).
+    batch_size (int): Number of lotteries run together with array operations. Default is 256.
+    workers (int, optional): Number of worker processes. If None or 1, lotteries run in this process.
+    
+    Returns:
+    numpy.ndarray: A students x schools matrix (rows and columns in the order of the input dictionaries)
+                   where entry [i, j] is the fraction of draws in which student i is assigned to school j.
+    """
+    preferences, capacities = _compile_serial_dictatorship(students, schools)
+    batches = _lottery_batches(num_draws, batch_size, seed)
+    counts = np.zeros((preferences.shape[0], len(capacities)), dtype=np.int64)
+    
+    if workers is None or workers <= 1:
+        for size, seed_sequence in batches:
+            assignment = _random_serial_dictatorship_draws(preferences, capacities, size, seed_sequence)
+            counts += _assignment_counts(assignment, len(capacities))
+    else:
+        # Imported here: concurrent.futures pulls in logging, which would slow down importing the module
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_rsd_worker,
+                                                    initargs=(preferences, capacities)) as executor:
+            for batch_counts in executor.map(_rsd_worker_counts, *zip(*batches)):
+                counts += batch_counts
+    
+    return counts / max(num_draws, 1)
@@ -0,0 +1,366 @@
+import random
+import numpy as np
+
+##Instance Generators
+
+def generate_instance(num_agents, num_schools=None, is_marriage_market=True, is_cardinal=False, list_length=None,
+                      num_priority_classes=None, score_priorities=False):
+    """
+    Generates random preference lists or valuations for a given number of agents in a matching market.
+    For school choice, also generates random capacities and priorities for schools.
+    
+    Args:
+    num_agents (int): Number of agents on each side of the market (or number of students for school choice)
+    num_schools (int, optional): Number of schools for school choice, or of women in a marriage market.
+                                 Default is num_agents // 2 schools, or num_agents women.
+    is_marriage_market (bool): If True, generates for marriage market. If False, generates for school choice.
+    is_cardinal (bool): If True, generates cardinal valuations. If False, generates ordinal preferences.
+    list_length (int, optional): Length of the lists of side1. The other side then only ranks (or values) the
+                                 agents that list it. Default is None (complete lists).
+    num_priority_classes (int, optional): For school choice, puts every student a school ranks into one of this
+                                          many priority classes at random, and gives the priorities as lists of
+                                          classes. Default is None (strict priorities).
+    score_priorities (bool): For school choice, ranks students by one test score (0 to 100) shared by all schools
+                             instead of priority lists, plus a bonus of 10 at one random school per student (e.g.
+                             the walk zone). Default is False.
+    
+    Returns:
+    tuple: Two dictionaries (side1_preferences, side2_data)
+    """
+    
+    # Generate lists of agents
+    if is_marriage_market:
+        side1 = [f'M{i+1}' for i in range(num_agents)]
+        side2 = [f'W{i+1}' for i in range(num_agents if num_schools is None else num_schools)]
+    else:
+        side1 = [f'S{i+1}' for i in range(num_agents)]
+        if num_schools is None:
+            num_schools = num_agents // 2
+        num_schools = max(2, min(num_schools, num_agents))  # Ensure at least 2 schools and not more than num_agents
+        side2 = [f'C{i+1}' for i in range(num_schools)]
+    
+    # Generate preferences or valuations for side1
+    length = len(side2) if list_length is None else min(list_length, len(side2))
+    side1_preferences = {}
+    for agent in side1:
+        if is_cardinal:
+            # Complete lists keep the partner order, and the draws, of untruncated instances
+            partners = side2 if list_length is None else random.sample(side2, length)
+            side1_preferences[agent] = {partner: random.uniform(1, 100) for partner in partners}
+        else:
+            side1_preferences[agent] = random.sample(side2, length)
+    
+    # The other side ranks the agents that list it (everyone, with complete lists)
+    listed_by = {partner: [] for partner in side2}
+    for agent, preferences in side1_preferences.items():
+        for partner in preferences:
+            listed_by[partner].append(agent)
+    
+    # Generate preferences/priorities and capacities for side2
+    side2_data = {}
+    if is_marriage_market:
+        for agent in side2:
+            if is_cardinal:
+                side2_data[agent] = {partner: random.uniform(1, 100) for partner in listed_by[agent]}
+            else:
+                side2_data[agent] = random.sample(listed_by[agent], len(listed_by[agent]))
+    else:
+        total_capacity = num_agents // 2  # Set total capacity to half of students
+        base_capacity = total_capacity // len(side2)  # Distribute capacity evenly
+        remaining_capacity = total_capacity % len(side2)  # Any leftover capacity
+        if score_priorities:
+            scores = {student: round(random.uniform(0, 100), 2) for student in side1}
+            bonuses = {school: {} for school in side2}
+            for student in side1:
+                bonuses[random.choice(side2)][student] = 10.0
+        
+        for school in side2:
+            capacity = base_capacity
+            if remaining_capacity > 0:
+                capacity += 1
+                remaining_capacity -= 1
+            if score_priorities:
+                side2_data[school] = {"scores": scores, "bonuses": bonuses[school], "capacity": capacity}
+                continue
+            priorities = random.sample(listed_by[school], len(listed_by[school]))
+            if num_priority_classes is not None:
+                levels = [[] for _ in range(num_priority_classes)]
+                for student in priorities:
+                    levels[random.randrange(num_priority_classes)].append(student)
+                priorities = [level for level in levels if level]
+            side2_data[school] = {
+                "priorities": priorities,
+                "capacity": capacity
+            }
+    
+    return side1_preferences, side2_data
+
+
+def _correlated_utilities(rng, num_rows, num_items, correlation):
+    """
+    Draws utilities mixing a common value per item with idiosyncratic noise per (row, item) pair.
+    
+    Args:
+    rng (numpy.random.Generator): Random number generator.
+    num_rows (int): Number of agents drawing utilities.
+    num_items (int): Number of items being valued.
+    correlation (float): Weight of the common value, between 0 (independent) and 1 (identical utilities).
+    
+    Returns:
+    numpy.ndarray: A num_rows x num_items matrix of utilities in [0, 1).
+    """
+    noise = rng.random((num_rows, num_items))
+    if correlation:
+        noise *= 1 - correlation
+        noise += correlation * rng.random(num_items)
+    return noise
+
+
+def _random_preference_matrix(rng, num_rows, num_items, correlation):
+    """
+    Draws one preference list (a permutation of item ids, best first) per row.
+    
+    Independent preferences are row-wise shuffles; correlated preferences sort correlated utilities,
+    in blocks of rows to bound the memory of the sort.
+    """
+    if not correlation:
+        return rng.permuted(np.broadcast_to(np.arange(num_items, dtype=np.int32), (num_rows, num_items)), axis=1)
+    
+    common = rng.random(num_items) * correlation
+    preferences = np.empty((num_rows, num_items), dtype=np.int32)
+    block = max(1, (1 << 22) // max(num_items, 1))
+    for start in range(0, num_rows, block):
+        stop = min(start + block, num_rows)
+        utilities = rng.random((stop - start, num_items)) * (1 - correlation) + common
+        preferences[start:stop] = np.argsort(-utilities, axis=1)
+    return preferences
+
+
+def _random_list_heads(rng, num_rows, num_items, length, correlation):
+    """
+    Draws the first length entries of one preference list per row, without drawing the rest of the lists.
+    
+    Short independent lists sample their items directly and redraw the few rows that repeat an item;
+    otherwise the best items of each row's utilities are kept with a partial sort, in blocks of rows
+    to bound memory.
+    """
+    lists = np.empty((num_rows, length), dtype=np.int32)
+    if not correlation and length * length <= num_items:
+        # Fewer than half of the rows repeat an item at this length
+        redraw = np.arange(num_rows)
+        while len(redraw):
+            lists[redraw] = rng.integers(0, num_items, (len(redraw), length))
+            ordered = np.sort(lists[redraw], axis=1)
+            redraw = redraw[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)]
+        return lists
+    
+    common = rng.random(num_items) * correlation
+    block = max(1, (1 << 22) // max(num_items, 1))
+    for start in range(0, num_rows, block):
+        stop = min(start + block, num_rows)
+        utilities = rng.random((stop - start, num_items)) * (1 - correlation) + common
+        best = np.argpartition(-utilities, length - 1, axis=1)[:, :length]
+        order = np.argsort(-np.take_along_axis(utilities, best, axis=1), axis=1)
+        lists[start:stop] = np.take_along_axis(best, order, axis=1)
+    return lists
+
+
+def _truncated_lists(rng, side1, num_partners, correlation, is_cardinal):
+    """
+    Draws the lists of the other side for truncated lists of side1: every partner ranks (or values) the agents
+    listing it, with correlated utilities as for complete lists.
+    
+    Args:
+    rng (numpy.random.Generator): Random number generator.
+    side1 (numpy.ndarray): Truncated preference lists of side1 (partner ids, best first, one row per agent).
+    num_partners (int): Number of agents on the other side.
+    correlation (float): Weight of the common value in utilities.
+    is_cardinal (bool): If True, returns valuations, with -inf for the agents not listing the partner.
+    
+    Returns:
+    numpy.ndarray: Preference lists padded with -1 (num_partners x longest list), or a num_partners x num_agents
+                   matrix of valuations.
+    """
+    num_agents, length = side1.shape
+    agents = np.repeat(np.arange(num_agents, dtype=np.int32), length)
+    partners = side1.ravel()
+    utilities = rng.random(len(partners))
+    if correlation:
+        utilities *= 1 - correlation
+        utilities += correlation * rng.random(num_agents)[agents]
+    
+    if is_cardinal:
+        valuations = np.full((num_partners, num_agents), -np.inf)
+        valuations[partners, agents] = 1 + 99 * utilities
+        return valuations
+    
+    # Sort the pairs by partner, best agent first, and place each one at its position in the list
+    order = np.lexsort((-utilities, partners))
+    counts = np.bincount(partners, minlength=num_partners)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.arange(len(order)) - np.repeat(starts, counts)
+    preferences = np.full((num_partners, counts.max(initial=0)), -1, dtype=np.int32)
+    preferences[partners[order], positions] = agents[order]
+    return preferences
+
+
+def _priority_class_matrix(rng, priorities, num_classes):
+    """
+    Puts every entry of priority lists into a random class, reordering each list by class.
+    
+    Args:
+    rng (numpy.random.Generator): Random number generator.
+    priorities (numpy.ndarray): Priority lists (student ids, padded with -1), one row per school.
+    num_classes (int): Number of priority classes.
+    
+    Returns:
+    tuple: (priorities, classes) where classes is aligned with priorities and -1 on the padding.
+    """
+    classes = rng.integers(num_classes, size=priorities.shape)
+    classes[priorities < 0] = num_classes
+    order = np.argsort(classes, axis=1, kind='stable')
+    priorities = np.take_along_axis(priorities, order, axis=1)
+    classes = np.take_along_axis(classes, order, axis=1)
+    classes[priorities < 0] = -1
+    return priorities, classes
+
+
+def generate_instance_arrays(num_agents, num_schools=None, is_marriage_market=True, is_cardinal=False,
+                             correlation=0.0, seed=None, list_length=None, num_priority_classes=None,
+                             score_priorities=False):
+    """
+    Generates a random matching market as NumPy arrays, which the algorithms accept in place of dictionaries.
+    
+    Preferences are drawn for all agents at once, and agents and schools are integer ids. With a
+    positive correlation, every agent's utility for a partner mixes a common value of the partner
+    (e.g. its quality) with idiosyncratic noise, so preferences are similar across agents.
+    
+    Args:
+    num_agents (int): Number of agents on each side of the market (or number of students for school choice)
+    num_schools (int, optional): Number of schools for school choice, or of women in a marriage market.
+                                 Default is num_agents // 2 schools, or num_agents women.
+    is_marriage_market (bool): If True, generates for marriage market. If False, generates for school choice.
+    is_cardinal (bool): If True, generates cardinal valuations. If False, generates ordinal preferences.
+    correlation (float): Weight of the common value in utilities, between 0 (independent preferences) and 1. Default is 0.
+    seed (int or numpy.random.Generator, optional): Seed or generator for reproducible instances. Default is None.
+    list_length (int, optional): Length of the lists of side1. The other side then only ranks (or values) the
+                                 agents that list it, and its lists are padded with -1 (valuations with -inf).
+                                 Default is None (complete lists).
+    num_priority_classes (int, optional): For school choice, puts every priority entry into one of this many classes
+                                          at random, and appends the matrix of classes to the school arrays.
+                                          Default is None (strict priorities).
+    score_priorities (bool): For school choice, ranks students by one test score (0 to 100) shared by all schools,
+                             plus a bonus of 10 at one random school per student, instead of drawing a priority
+                             list per school. Default is False.
+    
+    Returns:
+    tuple: Two arrays (side1_preferences, side2_preferences) for a marriage market, where row i holds the
+           preference list (partner ids, best first) or the valuations of agent i. For school choice,
+           (student_preferences, (priorities, capacities)), or (student_preferences, (priorities, capacities,
+           classes)) with priority classes, or (student_preferences, (scores, capacities, (schools, students,
+           bonuses))) with score priorities.
+    """
+    if not 0 <= correlation <= 1:
+        raise ValueError(f"correlation must be between 0 and 1, got {correlation}")
+    
+    rng = np.random.default_rng(seed)
+    if is_marriage_market:
+        num_partners = num_agents if num_schools is None else num_schools
+    else:
+        if num_schools is None:
+            num_schools = num_agents // 2
+        num_partners = max(2, min(num_schools, num_agents))  # Ensure at least 2 schools and not more than num_agents
+    
+    if list_length is not None and list_length < num_partners:
+        # Truncated lists: the best list_length partners of every agent, and lists of the agents listing them
+        lists = _random_list_heads(rng, num_agents, num_partners, list_length, correlation)
+        if is_cardinal:
+            side1 = np.full((num_agents, num_partners), -np.inf)
+            np.put_along_axis(side1, lists, 1 + 99 * np.sort(rng.random(lists.shape), axis=1)[:, ::-1], axis=1)
+        else:
+            side1 = lists
+        if is_marriage_market:
+            return side1, _truncated_lists(rng, lists, num_partners, correlation, is_cardinal)
+        if not score_priorities:
+            priorities = _truncated_lists(rng, lists, num_partners, correlation, False)
+    
+    else:
+        # Generate preferences or valuations for side1
+        if is_cardinal:
+            side1 = 1 + 99 * _correlated_utilities(rng, num_agents, num_partners, correlation)
+        else:
+            side1 = _random_preference_matrix(rng, num_agents, num_partners, correlation)
+        
+        # Generate preferences/priorities for side2
+        if is_marriage_market:
+            if is_cardinal:
+                side2 = 1 + 99 * _correlated_utilities(rng, num_partners, num_agents, correlation)
+            else:
+                side2 = _random_preference_matrix(rng, num_partners, num_agents, correlation)
+            return side1, side2
+        if not score_priorities:
+            priorities = _random_preference_matrix(rng, num_partners, num_agents, correlation)
+    
+    total_capacity = num_agents // 2  # Set total capacity to half of students
+    capacities = np.full(num_partners, total_capacity // num_partners, dtype=np.int64)
+    capacities[:total_capacity % num_partners] += 1
+    if score_priorities:
+        # One bonus per student, at a random school
+        bonuses = (rng.integers(num_partners, size=num_agents), np.arange(num_agents), np.full(num_agents, 10.0))
+        return side1, (rng.uniform(0, 100, num_agents), capacities, bonuses)
+    if num_priority_classes is not None:
+        priorities, classes = _priority_class_matrix(rng, priorities, num_priority_classes)
+        return side1, (priorities, capacities, classes)
+    return side1, (priorities, capacities)
+
+
+def instance_arrays_to_dicts(side1, side2):
+    """
+    Converts an instance from generate_instance_arrays into the dictionary format of generate_instance.
+    
+    Args:
+    side1 (numpy.ndarray): Preferences or valuations of side1 (men or students).
+    side2 (numpy.ndarray or tuple): Preferences or valuations of side2, or (priorities, capacities) for school choice,
+                                    optionally followed by priority classes.
+    
+    Returns:
+    tuple: Two dictionaries (side1_preferences, side2_data) named like generate_instance ('M1', 'W1', ... or 'S1', 'C1', ...).
+    """
+    is_marriage_market = not isinstance(side2, tuple)
+    num_partners = len(side2) if is_marriage_market else len(side2[1])
+    names1 = [f'M{i+1}' if is_marriage_market else f'S{i+1}' for i in range(side1.shape[0])]
+    names2 = [f'W{i+1}' if is_marriage_market else f'C{i+1}' for i in range(num_partners)]
+    
+    def to_dict(matrix, agents, partners):
+        partners = np.array(partners, dtype=object)
+        if np.issubdtype(matrix.dtype, np.floating):
+            # -inf marks unacceptable partners
+            return {agent: {partner: value for partner, value in zip(partners.tolist(), row) if value != -np.inf}
+                    for agent, row in zip(agents, matrix.tolist())}
+        return {agent: partners[row[row >= 0]].tolist() for agent, row in zip(agents, matrix)}
+    
+    side1_preferences = to_dict(side1, names1, names2)
+    if is_marriage_market:
+        return side1_preferences, to_dict(side2, names2, names1)
+    
+    priorities, capacities, *classes = side2
+    if priorities.ndim == 1:
+        # Score priorities: one score dictionary shared by all schools, and the bonuses of each school
+        scores = dict(zip(names1, priorities.tolist()))
+        bonuses = {school: {} for school in names2}
+        if classes:
+            for school, student, bonus in zip(*(np.asarray(column).tolist() for column in classes[0])):
+                bonuses[names2[school]][names1[student]] = bonus
+        return side1_preferences, {school: {"scores": scores, "bonuses": bonuses[school], "capacity": capacity}
+                                   for school, capacity in zip(names2, capacities.tolist())}
+    priority_lists = to_dict(priorities, names2, names1)
+    if classes:
+        # Group each list into its classes, in class order
+        for school, row in zip(names2, classes[0]):
+            levels = row[row >= 0].tolist()
+            members = priority_lists[school]
+            starts = [i for i in range(len(levels)) if i == 0 or levels[i] != levels[i - 1]]
+            priority_lists[school] = [members[start:end] for start, end in zip(starts, starts[1:] + [len(levels)])]
+    side2_data = {school: {"priorities": priority_lists[school], "capacity": capacity}
+                  for school, capacity in zip(names2, capacities.tolist())}
+    return side1_preferences, side2_data
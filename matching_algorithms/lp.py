@@ -0,0 +1,1392 @@
+import bisect
+import collections
+import pulp
+import numpy as np
+from matching_algorithms.cache import cached
+from matching_algorithms.profiles import _marriage_profile
+from matching_algorithms.combinatorial import deferred_acceptance, _deferred_acceptance_engine
+
+##Linear Programming Model Construction
+# Programs have one variable per mutually acceptable pair (an "edge"), so truncated lists and unbalanced
+# markets only pay for the pairs that can actually be matched.
+
+_Edges = collections.namedtuple('_Edges', ['num_men', 'num_women', 'man', 'woman', 'men_score', 'women_score'])
+_Edges.__doc__ = """
+The mutually acceptable pairs of a marriage market, ordered by man and then by his preference.
+
+Fields:
+num_men (int): Number of men.
+num_women (int): Number of women.
+man (numpy.ndarray): Man of every pair.
+woman (numpy.ndarray): Woman of every pair.
+men_score (numpy.ndarray): Score the man gives the pair: his valuation, or minus the position of the woman in his list.
+women_score (numpy.ndarray): Score the woman gives the pair, in the same way.
+"""
+
+
+def _edge_instance(profile):
+    """
+    Collects the mutually acceptable pairs of a PreferenceProfile with the score both partners give them.
+    
+    Returns:
+    _Edges: The pairs.
+    """
+    indptr, indices = profile.csr(0)
+    partner_ranks = profile.partner_ranks(0)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    acceptable = np.flatnonzero(partner_ranks >= 0)
+    man, woman = rows[acceptable], indices[acceptable].astype(np.int64)
+    if profile.is_cardinal:
+        men_score = profile.weights(0)[acceptable]
+        women_score = profile.weights(1)[profile.csr(1)[0][woman] + partner_ranks[acceptable]]
+    else:
+        men_score = -(acceptable - indptr[man]).astype(np.float64)
+        women_score = -partner_ranks[acceptable].astype(np.float64)
+    return _Edges(len(profile.names[0]), len(profile.names[1]), man, woman, men_score, women_score)
+
+
+def _agent_orders(agent, partner, score, num_agents):
+    """
+    Sorts the pairs of every agent by decreasing score and counts the strictly better partners of each pair.
+    
+    Args:
+    agent (numpy.ndarray): Agent of every pair.
+    partner (numpy.ndarray): Partner of every pair; ties in score are broken by partner id.
+    score (numpy.ndarray): Score the agent gives every pair; higher is better.
+    num_agents (int): Number of agents.
+    
+    Returns:
+    tuple: (order, indptr, better) where order[indptr[i]:indptr[i+1]] lists the pairs of agent i from best to
+           worst and better[e] is the number of partners the agent of pair e strictly prefers to its partner.
+    """
+    order = np.lexsort((partner, -score, agent))
+    indptr = np.zeros(num_agents + 1, dtype=np.int64)
+    np.cumsum(np.bincount(agent, minlength=num_agents), out=indptr[1:])
+    
+    # Partners with equal scores share the position of the first partner of their tie group
+    sorted_agent, sorted_score = agent[order], score[order]
+    positions = np.arange(len(order))
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (sorted_agent[1:] != sorted_agent[:-1]) | (sorted_score[1:] != sorted_score[:-1])
+    group_start = np.where(new_group, positions, 0)
+    np.maximum.accumulate(group_start, out=group_start)
+    
+    better = np.empty(len(order), dtype=np.int64)
+    better[order] = group_start - indptr[sorted_agent]
+    return order, indptr, better
+
+
+def _prefix_rows(order, indptr, prefix_base, row_base):
+    """
+    Builds the rows defining prefix variables P[i, k] = sum of x over the first k pairs of agent i,
+    for k from 1 to the length of the list minus one.
+    
+    Args:
+    order (numpy.ndarray): Pairs of every agent sorted from best to worst, as returned by _agent_orders.
+    indptr (numpy.ndarray): Row pointers of order.
+    prefix_base (int): Variable index of the first prefix variable.
+    row_base (int): Row index of the first prefix row.
+    
+    Returns:
+    tuple: (rows, cols, coefs) of the equality rows, all with right-hand side 0, and the index of P[i, 1]
+           of every agent relative to prefix_base.
+    """
+    width = np.maximum(np.diff(indptr) - 1, 0)
+    start = np.cumsum(width) - width
+    agent = np.repeat(np.arange(len(width)), width)
+    count = int(width.sum())
+    k = np.arange(count) - start[agent] + 1
+    row = row_base + np.arange(count)
+    prefix = prefix_base + np.arange(count)
+    
+    # P[i, k] - x[order_i[k - 1]] - P[i, k - 1] = 0, where P[i, 0] is the constant 0
+    x = order[indptr[agent] + k - 1]
+    has_previous = k > 1
+    rows = np.concatenate([row, row, row[has_previous]])
+    cols = np.concatenate([prefix, x, prefix[has_previous] - 1])
+    coefs = np.concatenate([np.ones(count), -np.ones(count), -np.ones(int(has_previous.sum()))])
+    return rows, cols, coefs, start
+
+
+def _matching_system(edges, stable=True, cardinality=None):
+    """
+    Builds the constraint matrix of the (stable) matching polytope in sparse COO form.
+    
+    The first variables are x[e], one per acceptable pair. For stable matchings, every agent also
+    gets prefix variables holding the sum of x over their k most preferred partners, so the stability
+    constraint of each pair needs three non-zeros instead of one per better partner, and the whole
+    model has O(number of pairs) non-zeros. The prefix variables are fixed by the x variables, so
+    the feasible region in x is exactly the classical stable matching polytope.
+    
+    Args:
+    edges (_Edges): The acceptable pairs.
+    stable (bool): If True, stability constraints are included. Default is True.
+    cardinality (int, optional): If given, exactly this many pairs are matched.
+    
+    Returns:
+    dict: A dictionary with the number of variables ('num_variables'), the COO arrays of the
+          constraint matrix ('rows', 'cols', 'coefs') and the bounds of every row ('lower', 'upper').
+    """
+    num_pairs = len(edges.man)
+    pairs = np.arange(num_pairs, dtype=np.int64)
+    rows, cols, coefs, lower, upper = [], [], [], [], []
+    num_rows = 0
+    
+    # Each participant is matched at most once; agents without acceptable partners get no row
+    for agent in (edges.man, edges.woman):
+        listed = np.unique(agent)
+        rows.append(num_rows + np.searchsorted(listed, agent))
+        cols.append(pairs)
+        coefs.append(np.ones(num_pairs))
+        lower.append(np.full(len(listed), -np.inf))
+        upper.append(np.ones(len(listed)))
+        num_rows += len(listed)
+    
+    if cardinality is not None:
+        rows.append(np.full(num_pairs, num_rows))
+        cols.append(pairs)
+        coefs.append(np.ones(num_pairs))
+        lower.append(np.array([float(cardinality)]))
+        upper.append(np.array([float(cardinality)]))
+        num_rows += 1
+    num_variables = num_pairs
+    
+    if stable:
+        sides = _edge_orders(edges)
+        
+        # Prefix variables of the men and of the women
+        prefix_start = []
+        for order, indptr, _ in sides:
+            prefix_rows, prefix_cols, prefix_coefs, start = _prefix_rows(order, indptr, num_variables, num_rows)
+            rows.append(prefix_rows)
+            cols.append(prefix_cols)
+            coefs.append(prefix_coefs)
+            num_prefix_rows = len(order) - np.count_nonzero(np.diff(indptr))
+            lower.append(np.zeros(num_prefix_rows))
+            upper.append(np.zeros(num_prefix_rows))
+            prefix_start.append(num_variables + start)
+            num_rows += num_prefix_rows
+            num_variables += num_prefix_rows
+        
+        # Stability: x[m, w] + P_m[better_m(w)] + P_w[better_w(m)] >= 1
+        pair_row = num_rows + pairs
+        stability_rows, stability_cols = [pair_row], [pairs]
+        for agent, (_, _, better), start in zip((edges.man, edges.woman), sides, prefix_start):
+            term = better > 0
+            stability_rows.append(pair_row[term])
+            stability_cols.append(start[agent[term]] + better[term] - 1)
+        rows.append(np.concatenate(stability_rows))
+        cols.append(np.concatenate(stability_cols))
+        coefs.append(np.ones(len(rows[-1])))
+        lower.append(np.ones(num_pairs))
+        upper.append(np.full(num_pairs, np.inf))
+        num_rows += num_pairs
+    
+    return {
+        'num_variables': num_variables,
+        'rows': np.concatenate(rows),
+        'cols': np.concatenate(cols),
+        'coefs': np.concatenate(coefs),
+        'lower': np.concatenate(lower),
+        'upper': np.concatenate(upper),
+    }
+
+
+def _ordinal_instance(men_prefs, women_prefs):
+    """
+    Compiles an ordinal marriage market (or takes a PreferenceProfile) into its acceptable pairs,
+    scored by minus the position of the partner in each agent's list.
+    
+    Returns:
+    tuple: (men, women, edges).
+    """
+    profile = _marriage_profile(men_prefs, women_prefs, is_cardinal=False)
+    return profile.names[0], profile.names[1], _edge_instance(profile)
+
+
+def _cardinal_instance(men_valuations, women_valuations):
+    """
+    Compiles a cardinal marriage market (or takes a PreferenceProfile) into its acceptable pairs,
+    scored by valuation. Partners an agent gives no valuation are unacceptable to them.
+    
+    Returns:
+    tuple: (men, women, edges).
+    """
+    profile = _marriage_profile(men_valuations, women_valuations, is_cardinal=True)
+    if not profile.is_cardinal:
+        raise ValueError("The profile holds ordinal preferences, not cardinal valuations")
+    return profile.names[0], profile.names[1], _edge_instance(profile)
+
+
+def _edge_matching(men, women, edges, x):
+    """
+    Reads a matching from the values of the pair variables, considering a pair matched if x > 0.5.
+    """
+    matched = np.flatnonzero(x > 0.5)
+    return {men[m]: women[w] for m, w in zip(edges.man[matched].tolist(), edges.woman[matched].tolist())}
+
+#------------------------------------------------------------------------------------------------------------
+##Linear Programming Solvers
+
+_PULP_SOLVERS = {'cbc': 'PULP_CBC_CMD', 'glpk': 'GLPK_CMD', 'highs': 'HiGHS', 'highs_cmd': 'HiGHS_CMD'}
+
+
+class LPSolver:
+    """
+    The solver used by the linear programming functions, with its options.
+    
+    Args:
+    name (str): 'cbc' (shipped with PuLP), 'glpk', 'highs' (in-process through highspy), 'highs_cmd'
+                (HiGHS executable) or 'scipy' (scipy.optimize.linprog with HiGHS, in-process, which skips
+                building a PuLP model). Default is 'cbc'.
+    threads (int, optional): Number of threads, for the solvers that support it (CBC and HiGHS).
+    time_limit (float, optional): Time limit in seconds. A solve that stops before optimality raises a RuntimeError.
+    msg (bool): If True, the solver prints its log. Default is False.
+    """
+    __slots__ = ('name', 'threads', 'time_limit', 'msg')
+    
+    def __init__(self, name='cbc', threads=None, time_limit=None, msg=False):
+        if name not in _PULP_SOLVERS and name != 'scipy':
+            raise ValueError(f"Unknown solver '{name}', expected one of {sorted(_PULP_SOLVERS) + ['scipy']}")
+        self.name = name
+        self.threads = threads
+        self.time_limit = time_limit
+        self.msg = msg
+    
+    def __repr__(self):
+        return f"LPSolver({self.name!r}, threads={self.threads}, time_limit={self.time_limit}, msg={self.msg})"
+    
+    def pulp_solver(self, warm_start=False):
+        """
+        Returns the PuLP solver command configured with these options.
+        
+        Args:
+        warm_start (bool): If True, the initial values of the variables are passed to solvers that accept them.
+        """
+        options = {'msg': self.msg, 'timeLimit': self.time_limit}
+        if self.threads is not None and self.name != 'glpk':
+            options['threads'] = self.threads
+        if warm_start and self.name in ('cbc', 'highs_cmd'):
+            options['warmStart'] = True
+        return getattr(pulp, _PULP_SOLVERS[self.name])(**options)
+
+
+def _lp_solver(solver):
+    """
+    Returns the LPSolver for a solver argument: None (CBC), a solver name or an LPSolver.
+    """
+    if solver is None:
+        return LPSolver()
+    if isinstance(solver, str):
+        return LPSolver(solver)
+    if isinstance(solver, LPSolver):
+        return solver
+    raise TypeError(f"solver must be a solver name or an LPSolver, got {type(solver).__name__}")
+
+
+def _add_pulp_rows(problem, variables, rows, cols, coefs, lower, upper):
+    """
+    Adds the rows of a sparse constraint system to a PuLP problem.
+    
+    Args:
+    problem (pulp.LpProblem): The problem, updated in place.
+    variables (list): The PuLP variables, indexed like the columns.
+    rows, cols, coefs (numpy.ndarray): COO arrays of the rows, numbered from 0.
+    lower, upper (numpy.ndarray): Bounds of every row.
+    """
+    # Constraints, emitted row by row from the CSR form of the matrix
+    order = np.argsort(rows, kind='stable')
+    cols = cols[order].tolist()
+    coefs = coefs[order].tolist()
+    indptr = np.searchsorted(rows[order], np.arange(len(lower) + 1)).tolist()
+    for row, (low, up) in enumerate(zip(lower.tolist(), upper.tolist())):
+        start, end = indptr[row], indptr[row + 1]
+        expr = pulp.LpAffineExpression(zip(map(variables.__getitem__, cols[start:end]), coefs[start:end]))
+        if low == up:
+            problem.addConstraint(pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=low))
+        elif up == np.inf:
+            problem.addConstraint(pulp.LpConstraint(expr, pulp.LpConstraintGE, rhs=low))
+        else:
+            problem.addConstraint(pulp.LpConstraint(expr, pulp.LpConstraintLE, rhs=up))
+
+
+def _solve_scipy(sense, objective, system, solver):
+    """
+    Solves a sparse linear program in-process with scipy.optimize.linprog (HiGHS).
+    
+    Returns:
+    numpy.ndarray: Values of the first len(objective) variables in the optimal solution.
+    """
+    try:
+        from scipy.optimize import linprog
+        from scipy.sparse import coo_matrix, vstack
+    except ImportError:
+        raise ImportError("The 'scipy' solver requires scipy>=1.6 (pip install matching_algorithms[scipy])") from None
+    
+    num_variables = system['num_variables']
+    costs = np.zeros(num_variables)
+    costs[:len(objective)] = objective if sense == pulp.LpMinimize else -objective
+    lower, upper = system['lower'], system['upper']
+    matrix = coo_matrix((system['coefs'], (system['rows'], system['cols'])),
+                        shape=(len(lower), num_variables)).tocsr()
+    
+    # Equality rows, then ">=" rows negated into "<=" rows
+    equal = lower == upper
+    at_least = ~equal & np.isinf(upper)
+    at_most = ~equal & ~at_least
+    options = {'disp': solver.msg}
+    if solver.time_limit is not None:
+        options['time_limit'] = solver.time_limit
+    result = linprog(costs, A_ub=vstack([-matrix[at_least], matrix[at_most]]),
+                     b_ub=np.concatenate([-lower[at_least], upper[at_most]]), A_eq=matrix[equal], b_eq=lower[equal],
+                     bounds=(0, 1), method='highs', options=options)
+    if result.status != 0:
+        raise RuntimeError(f"The LP solver stopped without an optimal solution: {result.message}")
+    return result.x[:len(objective)]
+
+
+class _LinearProgram:
+    """
+    A linear program over a sparse constraint system whose solver model is built once and kept,
+    so it can be solved again with another objective or after adding rows.
+    
+    Args:
+    name (str): Name of the problem.
+    system (dict): Sparse constraint system as returned by _matching_system.
+    """
+    __slots__ = ('name', 'system', '_problem', '_variables', '_num_built_rows')
+    
+    def __init__(self, name, system):
+        self.name = name
+        self.system = dict(system)
+        self._problem = None
+        self._variables = None
+        self._num_built_rows = 0
+    
+    @property
+    def num_rows(self):
+        """
+        int: Number of constraint rows.
+        """
+        return len(self.system['lower'])
+    
+    def add_rows(self, rows, cols, coefs, lower, upper):
+        """
+        Appends constraint rows, numbered from 0 in rows, over the existing variables.
+        """
+        system = self.system
+        system['rows'] = np.concatenate([system['rows'], self.num_rows + rows])
+        system['cols'] = np.concatenate([system['cols'], cols])
+        system['coefs'] = np.concatenate([system['coefs'], coefs])
+        system['lower'] = np.concatenate([system['lower'], lower])
+        system['upper'] = np.concatenate([system['upper'], upper])
+    
+    def _pulp_model(self):
+        """
+        Returns the PuLP problem and variables, adding the rows that are not in the model yet.
+        """
+        system = self.system
+        if self._problem is None:
+            self._problem = pulp.LpProblem(self.name)
+            self._variables = [pulp.LpVariable(f"x{i}", lowBound=0, upBound=1) for i in range(system['num_variables'])]
+        
+        if self._num_built_rows < self.num_rows:
+            new = system['rows'] >= self._num_built_rows
+            _add_pulp_rows(self._problem, self._variables, system['rows'][new] - self._num_built_rows,
+                           system['cols'][new], system['coefs'][new], system['lower'][self._num_built_rows:],
+                           system['upper'][self._num_built_rows:])
+            self._num_built_rows = self.num_rows
+        return self._problem, self._variables
+    
+    def solve(self, sense, objective, solver=None, initial=None):
+        """
+        Solves the program with the given objective.
+        
+        Args:
+        sense (int): pulp.LpMinimize or pulp.LpMaximize.
+        objective (numpy.ndarray): Objective coefficients of the first len(objective) variables.
+        solver (str or LPSolver, optional): The solver. Default is None (CBC).
+        initial (numpy.ndarray, optional): Starting values of the first len(initial) variables (warm start).
+        
+        Returns:
+        numpy.ndarray: Values of the first len(objective) variables in the optimal solution.
+        """
+        solver = _lp_solver(solver)
+        if solver.name == 'scipy':
+            return _solve_scipy(sense, objective, self.system, solver)
+        
+        problem, variables = self._pulp_model()
+        problem.sense = sense
+        problem.setObjective(pulp.LpAffineExpression(zip(variables, objective.tolist())))
+        if initial is not None:
+            for variable, value in zip(variables, initial.tolist()):
+                variable.setInitialValue(value)
+        
+        # Solve the problem
+        problem.solve(solver.pulp_solver(warm_start=initial is not None))
+        if problem.status != pulp.LpStatusOptimal:
+            raise RuntimeError(f"The LP solver stopped without an optimal solution: {pulp.LpStatus[problem.status]}")
+        
+        return np.array([variables[i].varValue for i in range(len(objective))], dtype=np.float64)
+
+
+def _solve_lp(name, sense, objective, system, solver=None):
+    """
+    Solves a linear program given in sparse form.
+    
+    Args:
+    name (str): Name of the problem.
+    sense (int): pulp.LpMinimize or pulp.LpMaximize.
+    objective (numpy.ndarray): Objective coefficients of the first len(objective) variables.
+    system (dict): Sparse constraint system as returned by _matching_system.
+    solver (str or LPSolver, optional): The solver. Default is None (CBC).
+    
+    Returns:
+    numpy.ndarray: Values of the first len(objective) variables in the optimal solution.
+    """
+    return _LinearProgram(name, system).solve(sense, objective, solver)
+
+#------------------------------------------------------------------------------------------------------------
+##Lazy Stability Constraints
+# Instead of adding a stability constraint for every pair, the program starts from the matching polytope and
+# only receives the constraints violated by its solutions, written directly over the x variables.
+
+_CUT_TOLERANCE = 1e-7
+
+
+def _stability_violations(x, edges, orders):
+    """
+    Evaluates every stability constraint on a (possibly fractional) solution at once.
+    
+    The left-hand side of the constraint of (m, w) is x[m, w] plus the sum of x over the partners m strictly
+    prefers to w plus the sum of x over the partners w strictly prefers to m; both sums are read from
+    prefix sums of x along the preference orders.
+    
+    Args:
+    x (numpy.ndarray): The solution, one value per acceptable pair.
+    edges (_Edges): The acceptable pairs.
+    orders (tuple): The orders of the men and of the women, from _agent_orders.
+    
+    Returns:
+    numpy.ndarray: One minus the left-hand side of every pair; positive values are violations.
+    """
+    violation = 1 - x
+    for agent, (order, indptr, better) in zip((edges.man, edges.woman), orders):
+        prefix = np.zeros(len(x) + 1)
+        np.cumsum(x[order], out=prefix[1:])
+        violation -= prefix[indptr[agent] + better] - prefix[indptr[agent]]
+    return violation
+
+
+def _stability_cuts(violation, edges, orders):
+    """
+    Builds the stability constraints of the most violated pair of every man and of every woman.
+    
+    Returns:
+    tuple: (rows, cols, coefs, lower, upper) of the cuts with rows numbered from 0, or None if no
+           constraint is violated.
+    """
+    worst = []
+    for agent in (edges.man, edges.woman):
+        order = np.lexsort((-violation, agent))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = agent[order][1:] != agent[order][:-1]
+        worst.append(order[first])
+    pairs = np.unique(np.concatenate(worst))
+    pairs = pairs[violation[pairs] > _CUT_TOLERANCE]
+    if not len(pairs):
+        return None
+    
+    # Each cut holds the pair, the k_man partners the man prefers, then the k_woman partners the woman prefers
+    (men_order, men_indptr, men_better), (women_order, women_indptr, women_better) = orders
+    k_man = men_better[pairs]
+    lengths = 1 + k_man + women_better[pairs]
+    rows = np.repeat(np.arange(len(pairs)), lengths)
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cut, k_man = pairs[rows], k_man[rows]
+    
+    cols = cut.copy()
+    in_man = (offset >= 1) & (offset <= k_man)
+    cols[in_man] = men_order[men_indptr[edges.man[cut[in_man]]] + offset[in_man] - 1]
+    in_woman = offset > k_man
+    cols[in_woman] = women_order[women_indptr[edges.woman[cut[in_woman]]] + offset[in_woman] - k_man[in_woman] - 1]
+    return rows, cols, np.ones(len(rows)), np.ones(len(pairs)), np.full(len(pairs), np.inf)
+
+
+def _solve_with_cuts(program, sense, objective, edges, orders, solver=None, initial=None):
+    """
+    Solves a matching program, adding the violated stability constraints and solving again until
+    the solution is stable. The optimum of the relaxation is then the optimum over stable matchings.
+    
+    Args:
+    program (_LinearProgram): The program, starting from the matching polytope; cuts are added to it
+                              and kept for later solves.
+    sense (int): pulp.LpMinimize or pulp.LpMaximize.
+    objective (numpy.ndarray): Objective coefficients of the x variables.
+    edges (_Edges): The acceptable pairs.
+    orders (tuple): The orders of the men and of the women, from _agent_orders.
+    solver (str or LPSolver, optional): The solver. Default is None (CBC).
+    initial (numpy.ndarray, optional): Starting values of the x variables.
+    
+    Returns:
+    numpy.ndarray: Values of the x variables in the optimal solution.
+    """
+    while True:
+        x = program.solve(sense, objective, solver, initial)
+        cuts = _stability_cuts(_stability_violations(x, edges, orders), edges, orders)
+        if cuts is None:
+            return x
+        program.add_rows(*cuts)
+
+
+def _edge_orders(edges):
+    """
+    Returns the orders of the men and of the women over the acceptable pairs, from _agent_orders.
+    """
+    return (_agent_orders(edges.man, edges.woman, edges.men_score, edges.num_men),
+            _agent_orders(edges.woman, edges.man, edges.women_score, edges.num_women))
+
+
+def _solve_stable_lp(name, sense, objective, edges, solver=None, lazy=False):
+    """
+    Optimizes over the stable matching polytope, either with every stability constraint or lazily.
+    
+    Returns:
+    numpy.ndarray: Values of the x variables in the optimal solution, one per acceptable pair.
+    """
+    if not lazy:
+        return _solve_lp(name, sense, objective, _matching_system(edges), solver)
+    program = _LinearProgram(name, _matching_system(edges, stable=False))
+    return _solve_with_cuts(program, sense, objective, edges, _edge_orders(edges), solver)
+
+#------------------------------------------------------------------------------------------------------------
+##Rotation Poset
+
+def _strict_lists(edges):
+    """
+    Converts the acceptable pairs into strict preference lists of both sides, breaking ties by partner id.
+    
+    Args:
+    edges (_Edges): The acceptable pairs.
+    
+    Returns:
+    tuple: (men_lists, women_lists, men_pairs) where each side's lists are (indptr, indices, partner_ranks), with
+           partner_ranks the position of the agent in the partner's list for every entry, and men_pairs maps every
+           entry of the men's lists to its pair.
+    """
+    sides = []
+    orders = _edge_orders(edges)
+    positions = []
+    for (order, indptr, _), agent in zip(orders, (edges.man, edges.woman)):
+        # Position of every pair in the list of the agent of this side
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order)) - indptr[agent[order]]
+        positions.append(position)
+    for (order, indptr, _), partner, partner_position in zip(orders, (edges.woman, edges.man), positions[::-1]):
+        sides.append((indptr, partner[order].astype(np.int32), partner_position[order]))
+    return sides[0], sides[1], orders[0][0]
+
+
+def _stable_matching_rotations(men_indptr, men_indices, men_ranks, women_indptr, women_indices, women_ranks):
+    """
+    Enumerates the rotations of a stable marriage instance together with their precedence relation.
+    
+    Starting from the man-optimal matching, exposed rotations are found by walking the successor
+    graph with a stack and eliminated one after another until the woman-optimal matching is
+    reached. Every man's pointer only moves forward, so the enumeration is linear in the number of
+    acceptable pairs. Predecessors are derived with the two labelling rules of Gusfield and Irving
+    while rotations are found.
+    
+    Args:
+    men_indptr (numpy.ndarray): CSR row pointers of the men's preference lists.
+    men_indices (numpy.ndarray): CSR woman ids of the men's preference lists.
+    men_ranks (numpy.ndarray): Rank the woman gives the man, for every entry of the men's lists.
+    women_indptr (numpy.ndarray): CSR row pointers of the women's preference lists.
+    women_indices (numpy.ndarray): CSR man ids of the women's preference lists.
+    women_ranks (numpy.ndarray): Rank the man gives the woman, for every entry of the women's lists.
+    
+    Returns:
+    tuple: (man_optimal, rotations, predecessors) where man_optimal gives the entry of the wife of every man
+           in men_indices (-1 if unmatched), rotations lists each rotation as [(man, entry, next entry), ...]
+           in cyclic order (eliminating it moves every man from his entry to the next one) and predecessors[r]
+           is the set of rotations that must be eliminated before rotation r. Rotations are returned in
+           elimination order, which is a linear extension of the precedence relation.
+    """
+    num_men = len(men_indptr) - 1
+    num_women = len(women_indptr) - 1
+    
+    # The man-optimal and woman-optimal matchings bound the lattice of stable matchings
+    husband = _deferred_acceptance_engine(men_indptr, men_indices, men_ranks, num_women)
+    woman_optimal_wife = _deferred_acceptance_engine(women_indptr, women_indices, women_ranks, num_men)
+    wife = [-1] * num_men
+    for woman, man in enumerate(husband):
+        if man != -1:
+            wife[man] = woman
+    
+    # Entry of every man's wife in his list
+    rows = np.repeat(np.arange(num_men), np.diff(men_indptr))
+    is_wife = men_indices == np.array(wife, dtype=np.int64)[rows]
+    wife_entry = np.full(num_men, -1, dtype=np.int64)
+    wife_entry[rows[is_wife]] = np.flatnonzero(is_wife)
+    wife_entry = wife_entry.tolist()
+    man_optimal = list(wife_entry)
+    men_indices = men_indices.tolist()
+    men_ranks = men_ranks.tolist()
+    
+    # pointer[m] is the position in m's list of the candidate next woman
+    pointer = [entry + 1 if entry != -1 else 0 for entry in wife_entry]
+    
+    # Partner history of every woman: ranks of successive husbands and the rotations that gave them
+    history_ranks = [[] for _ in range(num_women)]
+    history_rotations = [[] for _ in range(num_women)]
+    husband_rank = [men_ranks[wife_entry[husband[w]]] if husband[w] != -1 else -1 for w in range(num_women)]
+    initial_rank = list(husband_rank)
+    moved_by = {}
+    
+    def next_woman(man):
+        # First woman after the current wife who prefers this man to her current husband
+        position = pointer[man]
+        while True:
+            woman = men_indices[position]
+            if husband[woman] != -1 and men_ranks[position] < husband_rank[woman]:
+                pointer[man] = position
+                return woman
+            position += 1
+    
+    rotations = []
+    predecessors = []
+    on_stack = [False] * num_men
+    stack = []
+    
+    for start in range(num_men):
+        while wife[start] != woman_optimal_wife[start]:
+            if not stack:
+                stack.append(start)
+                on_stack[start] = True
+            
+            man = stack[-1]
+            successor = husband[next_woman(man)]
+            if not on_stack[successor]:
+                stack.append(successor)
+                on_stack[successor] = True
+                continue
+            
+            # The men from the successor up to the top of the stack form an exposed rotation
+            cycle = []
+            while True:
+                member = stack.pop()
+                on_stack[member] = False
+                cycle.append(member)
+                if member == successor:
+                    break
+            cycle.reverse()
+            
+            index = len(rotations)
+            preceding = set()
+            for m in cycle:
+                entry = wife_entry[m]
+                
+                # Rule 1: the rotation that moved m to his wife precedes this one
+                if entry in moved_by:
+                    preceding.add(moved_by[entry])
+                
+                # Rule 2: every woman m skips must already prefer her husband to m
+                for position in range(entry + 1, pointer[m]):
+                    skipped = men_indices[position]
+                    rank = men_ranks[position]
+                    if rank < initial_rank[skipped]:
+                        j = bisect.bisect_right(history_ranks[skipped], -rank)
+                        preceding.add(history_rotations[skipped][j])
+            
+            # Eliminate the rotation: every man moves to the next woman of the cycle
+            moves = []
+            for m in cycle:
+                entry, next_entry = wife_entry[m], pointer[m]
+                next_w = men_indices[next_entry]
+                wife[m] = next_w
+                wife_entry[m] = next_entry
+                husband[next_w] = m
+                husband_rank[next_w] = men_ranks[next_entry]
+                moved_by[next_entry] = index
+                history_ranks[next_w].append(-men_ranks[next_entry])
+                history_rotations[next_w].append(index)
+                pointer[m] += 1
+                moves.append((m, entry, next_entry))
+            
+            rotations.append(moves)
+            predecessors.append(preceding)
+    
+    return man_optimal, rotations, predecessors
+
+
+def _max_weight_closure(weights, predecessors):
+    """
+    Finds a maximum-weight closed set of a precedence relation by computing a minimum cut with Dinic's algorithm.
+    
+    Args:
+    weights (list): Weight of every node; the total weight of the selected nodes is maximized.
+    predecessors (list): predecessors[v] is the set of nodes that must be selected whenever v is.
+    
+    Returns:
+    list: Booleans flagging the selected nodes.
+    """
+    num_nodes = len(weights)
+    source, sink = num_nodes, num_nodes + 1
+    head, capacity, adjacency = [], [], [[] for _ in range(num_nodes + 2)]
+    
+    def add_edge(u, v, c):
+        adjacency[u].append(len(head))
+        head.append(v)
+        capacity.append(c)
+        adjacency[v].append(len(head))
+        head.append(u)
+        capacity.append(0.0)
+    
+    infinite = sum(w for w in weights if w > 0) + 1.0
+    tolerance = 1e-9 * infinite
+    for node, weight in enumerate(weights):
+        if weight > 0:
+            add_edge(source, node, weight)
+        elif weight < 0:
+            add_edge(node, sink, -weight)
+        for pred in predecessors[node]:
+            add_edge(node, pred, infinite)
+    
+    def reachable():
+        # Breadth-first search in the residual graph; returns the distance labels from the source
+        level = [-1] * (num_nodes + 2)
+        level[source] = 0
+        queue = collections.deque([source])
+        while queue:
+            u = queue.popleft()
+            for e in adjacency[u]:
+                v = head[e]
+                if level[v] == -1 and capacity[e] > tolerance:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+    
+    while True:
+        level = reachable()
+        if level[sink] == -1:
+            break
+        
+        # Blocking flow along shortest augmenting paths
+        current_edge = [0] * (num_nodes + 2)
+        path = []
+        u = source
+        while True:
+            if u == sink:
+                bottleneck = min(capacity[e] for e in path)
+                for e in path:
+                    capacity[e] -= bottleneck
+                    capacity[e ^ 1] += bottleneck
+                path = []
+                u = source
+                continue
+            
+            edges = adjacency[u]
+            while current_edge[u] < len(edges):
+                e = edges[current_edge[u]]
+                if capacity[e] > tolerance and level[head[e]] == level[u] + 1:
+                    break
+                current_edge[u] += 1
+            else:
+                # Dead end: retreat one step
+                if u == source:
+                    break
+                level[u] = -1
+                e = path.pop()
+                u = head[e ^ 1]
+                current_edge[u] += 1
+                continue
+            
+            path.append(e)
+            u = head[e]
+    
+    # The source side of the minimum cut is the maximum-weight closure
+    level = reachable()
+    return [level[node] != -1 for node in range(num_nodes)]
+
+
+def _optimal_stable_matching_by_rotations(men_lists, women_lists, costs):
+    """
+    Finds a stable matching of minimum total cost by solving a minimum-weight closure over the rotation poset.
+    
+    Eliminating a rotation changes the total cost by a fixed amount, so the optimal stable matching
+    corresponds to a minimum-weight closed set of rotations, which is found as a minimum cut.
+    
+    Args:
+    men_lists (tuple): (indptr, indices, partner_ranks) of the strict preferences of the men.
+    women_lists (tuple): (indptr, indices, partner_ranks) of the strict preferences of the women.
+    costs (numpy.ndarray): Cost of every entry of the men's lists, for both partners together.
+    
+    Returns:
+    list: The entry of the wife of every man in the optimal stable matching, or -1 if he is unmatched.
+    """
+    wife_entry, rotations, predecessors = _stable_matching_rotations(*men_lists, *women_lists)
+    
+    # Weight of a rotation: the decrease of the total cost when it is eliminated
+    weights = [-float(sum(costs[next_entry] - costs[entry] for _, entry, next_entry in moves)) for moves in rotations]
+    selected = _max_weight_closure(weights, predecessors)
+    
+    # Rotations are stored in elimination order, so the selected ones can be applied in sequence
+    for moves, chosen in zip(rotations, selected):
+        if chosen:
+            for m, _, next_entry in moves:
+                wife_entry[m] = next_entry
+    
+    return wife_entry
+
+
+def _stable_optimum_by_rotations(men, women, edges, men_cost, women_cost):
+    """
+    Compiles the acceptable pairs into strict preferences and returns the minimum-cost stable matching as a dictionary.
+    
+    Args:
+    men_cost (numpy.ndarray): Cost of every acceptable pair for the man.
+    women_cost (numpy.ndarray): Cost of every acceptable pair for the woman.
+    """
+    men_lists, women_lists, men_pairs = _strict_lists(edges)
+    wife_entry = _optimal_stable_matching_by_rotations(men_lists, women_lists, (men_cost + women_cost)[men_pairs])
+    men_indices = men_lists[1]
+    return {men[m]: women[men_indices[entry]] for m, entry in enumerate(wife_entry) if entry != -1}
+
+#------------------------------------------------------------------------------------------------------------
+##Linear Programming Algorithms with Stability Constraints
+
+##Stable Matching via Linear Programming
+
+@cached()
+def stable_matching_lp(men_prefs, women_prefs=None, solver=None, lazy=False):
+    """
+    Finds a stable matching using linear programming.
+    
+    Args:
+    men_prefs (dict or PreferenceProfile): A dictionary where keys are men and values are lists of women in order
+                                           of preference, or a PreferenceProfile of the whole market.
+    women_prefs (dict): A dictionary where keys are women and values are lists of men in order of preference.
+                        Omitted when a PreferenceProfile is given.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    lazy (bool): If True, the LP starts without stability constraints and only the ones violated by its
+                 solutions are added, solving again until the solution is stable. This keeps the model
+                 small for large markets. Default is False.
+    
+    Returns:
+    dict: A dictionary representing the stable matching, where keys are men and values are their matched women.
+    """
+    
+    men, women, edges = _ordinal_instance(men_prefs, women_prefs)
+    # Objective function: maximize the number of matched pairs
+    objective = np.ones(len(edges.man))
+    x = _solve_stable_lp("Stable_Matching_LP", pulp.LpMaximize, objective, edges, solver=solver, lazy=lazy)
+    
+    # Extract the solution, considering a match if x[m, w] > 0.5
+    return _edge_matching(men, women, edges, x)
+
+#------------------------------------------------------------------------------------------------------------
+##Egalitarian Stable Matching 
+
+@cached()
+def egalitarian_stable_matching(men_prefs, women_prefs=None, method='lp', solver=None, lazy=False):
+    """
+    Calculates the Egalitarian Stable Matching.
+    
+    Args:
+    men_prefs (dict or PreferenceProfile): A dictionary where keys are men and values are lists of women in order
+                                           of preference, or a PreferenceProfile of the whole market.
+    women_prefs (dict): A dictionary where keys are women and values are lists of men in order of preference.
+                        Omitted when a PreferenceProfile is given.
+    method (str): 'lp' solves the linear program with CBC. 'rotations' solves a minimum-weight closure
+                  over the rotation poset with a max-flow computation, which avoids the LP entirely and
+                  scales to thousands of agents per side. Default is 'lp'.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    lazy (bool): If True, the LP starts without stability constraints and only the ones violated by its
+                 solutions are added, solving again until the solution is stable. This keeps the model
+                 small for large markets. Default is False.
+    
+    Returns:
+    dict: A dictionary representing the Egalitarian Stable Matching, where keys are men 
+          and values are their matched women.
+    """
+    
+    men, women, edges = _ordinal_instance(men_prefs, women_prefs)
+    
+    if method == 'rotations':
+        return _stable_optimum_by_rotations(men, women, edges, -edges.men_score, -edges.women_score)
+    if method != 'lp':
+        raise ValueError(f"Unknown method '{method}', expected 'lp' or 'rotations'")
+    
+    # Objective function: sum of the ranks (starting at 1) both partners give each other
+    objective = 2 - edges.men_score - edges.women_score
+    x = _solve_stable_lp("Egalitarian_Stable_Matching", pulp.LpMinimize, objective, edges, solver=solver, lazy=lazy)
+    
+    # Extract the solution
+    return _edge_matching(men, women, edges, x)
+
+#------------------------------------------------------------------------------------------------------------
+##Nash Stable Matching
+@cached()
+def nash_stable_matching(men_valuations, women_valuations=None, solver=None, lazy=False):
+    """
+    Calculates the Nash Stable Matching.
+    
+    Args:
+    men_valuations (dict or PreferenceProfile): A dictionary where keys are men and values are
+                                                dictionaries of their valuations for each woman,
+                                                or a cardinal PreferenceProfile of the whole market.
+    women_valuations (dict): A dictionary where keys are women and values are 
+                             dictionaries of their valuations for each man.
+                             Omitted when a PreferenceProfile is given.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    lazy (bool): If True, the LP starts without stability constraints and only the ones violated by its
+                 solutions are added, solving again until the solution is stable. This keeps the model
+                 small for large markets. Default is False.
+    
+    Returns:
+    dict: A dictionary representing the Nash Stable Matching, where keys are men 
+          and values are their matched women.
+    """
+    
+    men, women, edges = _cardinal_instance(men_valuations, women_valuations)
+    # Objective function (logarithmic transformation)
+    objective = np.log(edges.men_score) + np.log(edges.women_score)
+    x = _solve_stable_lp("Nash_Stable_Matching", pulp.LpMaximize, objective, edges, solver=solver, lazy=lazy)
+    
+    # Extract the solution
+    return _edge_matching(men, women, edges, x)
+#------------------------------------------------------------------------------------------------------------
+##Utilitarian Stable Matching
+@cached()
+def utilitarian_stable_matching(men_valuations, women_valuations=None, method='lp', solver=None,
+                                lazy=False):
+    """
+    Calculates the Utilitarian Stable Matching.
+    
+    Args:
+    men_valuations (dict or PreferenceProfile): A dictionary where keys are men and values are
+                                                dictionaries of their valuations for each woman,
+                                                or a cardinal PreferenceProfile of the whole market.
+    women_valuations (dict): A dictionary where keys are women and values are 
+                             dictionaries of their valuations for each man.
+                             Omitted when a PreferenceProfile is given.
+    method (str): 'lp' solves the linear program with CBC. 'rotations' solves a minimum-weight closure
+                  over the rotation poset with a max-flow computation; it assumes strict valuations
+                  (ties are broken by agent order). Default is 'lp'.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    lazy (bool): If True, the LP starts without stability constraints and only the ones violated by its
+                 solutions are added, solving again until the solution is stable. This keeps the model
+                 small for large markets. Default is False.
+    
+    Returns:
+    dict: A dictionary representing the Utilitarian Stable Matching, where keys are men 
+          and values are their matched women.
+    """
+    
+    men, women, edges = _cardinal_instance(men_valuations, women_valuations)
+    
+    if method == 'rotations':
+        return _stable_optimum_by_rotations(men, women, edges, -edges.men_score, -edges.women_score)
+    if method != 'lp':
+        raise ValueError(f"Unknown method '{method}', expected 'lp' or 'rotations'")
+    
+    # Objective function
+    objective = edges.men_score + edges.women_score
+    x = _solve_stable_lp("Utilitarian_Stable_Matching", pulp.LpMaximize, objective, edges, solver=solver, lazy=lazy)
+    
+    # Extract the solution
+    return _edge_matching(men, women, edges, x)
+
+#------------------------------------------------------------------------------------------------------------
+##Reusable Matching Programs
+
+class MatchingLP:
+    """
+    The linear program of a marriage market, built once and solved with several objectives.
+    
+    The constraint matrix (for stable matchings, the stability polytope with one row per acceptable pair)
+    and the model of the solver are built on the first solve and kept, so comparing the egalitarian,
+    utilitarian and Nash optima of a market builds them only once. With lazy=True, the model starts without
+    stability constraints and keeps the cuts found by every solve, so later objectives start from them.
+    
+    Args:
+    men_preferences (dict or PreferenceProfile): A dictionary where keys are men and values are lists of women in order
+                                                 of preference (or dictionaries of valuations), or a PreferenceProfile.
+    women_preferences (dict): The preference lists (or valuations) of the women. Omitted when a PreferenceProfile is given.
+    stable (bool): If True, only stable matchings are feasible. If False, every matching of maximum cardinality is.
+                   Default is True.
+    solver (str or LPSolver, optional): Default solver of solve(). Default is None (CBC).
+    lazy (bool): If True, stability constraints are added lazily, as in stable_matching_lp. Default is False.
+    
+    Attributes:
+    profile (PreferenceProfile): The compiled market.
+    men (list): Names of the men.
+    women (list): Names of the women.
+    """
+    __slots__ = ('profile', 'men', 'women', 'stable', 'solver', 'lazy', '_edges', '_program', '_orders')
+    
+    def __init__(self, men_preferences, women_preferences=None, stable=True, solver=None, lazy=False):
+        self.profile = _marriage_profile(men_preferences, women_preferences)
+        compile_instance = _cardinal_instance if self.profile.is_cardinal else _ordinal_instance
+        self.men, self.women, self._edges = compile_instance(self.profile, None)
+        self.stable = stable
+        self.solver = solver
+        self.lazy = lazy
+        self._program = None
+        self._orders = None
+    
+    @property
+    def pairs(self):
+        """
+        tuple: (man ids, woman ids) of the mutually acceptable pairs, one per variable of the program.
+        """
+        return self._edges.man, self._edges.woman
+    
+    def objective(self, name):
+        """
+        Returns the sense and the pair coefficients of a named objective.
+        
+        Args:
+        name (str): 'cardinality' (number of matched pairs, as stable_matching_lp), 'egalitarian' (sum of the ranks
+                    both partners give each other, minimized), 'utilitarian' (sum of valuations) or 'nash'
+                    (sum of log valuations). The last two need cardinal valuations.
+        
+        Returns:
+        tuple: pulp.LpMinimize or pulp.LpMaximize, and the coefficient of every pair of MatchingLP.pairs.
+        """
+        edges = self._edges
+        if name == 'cardinality':
+            return pulp.LpMaximize, np.ones(len(edges.man))
+        if name == 'egalitarian':
+            # Positions (from 1) of the partners in both lists, which are sorted by valuation for cardinal profiles
+            indptr = self.profile.csr(0)[0]
+            partner_ranks = self.profile.partner_ranks(0)
+            acceptable = np.flatnonzero(partner_ranks >= 0)
+            return pulp.LpMinimize, 2.0 + (acceptable - indptr[edges.man]) + partner_ranks[acceptable]
+        if name in ('utilitarian', 'nash'):
+            if not self.profile.is_cardinal:
+                raise ValueError(f"The '{name}' objective needs cardinal valuations")
+            if name == 'utilitarian':
+                return pulp.LpMaximize, edges.men_score + edges.women_score
+            return pulp.LpMaximize, np.log(edges.men_score) + np.log(edges.women_score)
+        raise ValueError(f"Unknown objective '{name}', expected 'cardinality', 'egalitarian', 'utilitarian' or 'nash'")
+    
+    def _start_values(self, warm_start):
+        """
+        Converts a warm start (a matching, or True for the men-proposing deferred acceptance matching) into x values.
+        """
+        matching = deferred_acceptance(self.profile) if warm_start is True else warm_start
+        man_index, woman_index = self.profile.index
+        edges = self._edges
+        start = np.searchsorted(edges.man, np.arange(edges.num_men + 1))
+        initial = np.zeros(len(edges.man))
+        for man, woman in matching.items():
+            m, w = man_index[man], woman_index[woman]
+            initial[start[m] + np.flatnonzero(edges.woman[start[m]:start[m + 1]] == w)] = 1
+        return initial
+    
+    def solve(self, objective='egalitarian', sense=None, solver=None, warm_start=None):
+        """
+        Solves the program with an objective, building it on the first call.
+        
+        Args:
+        objective (str or numpy.ndarray): A named objective (see MatchingLP.objective), a men x women matrix of
+                                          pair weights, or one weight per pair of MatchingLP.pairs.
+                                          Default is 'egalitarian'.
+        sense (int, optional): pulp.LpMaximize or pulp.LpMinimize for weights. Default is maximize.
+        solver (str or LPSolver, optional): The solver of this call. Default is the solver of the model.
+        warm_start (dict or bool, optional): A matching (men to women) passed to the solver as a starting point,
+                                             or True to start from the men-proposing deferred acceptance matching.
+                                             Used by solvers that accept start values (CBC, HiGHS executable).
+        
+        Returns:
+        dict: A dictionary representing the optimal matching, where keys are men and values are their matched women.
+        """
+        edges = self._edges
+        if isinstance(objective, str):
+            sense, weights = self.objective(objective)
+        else:
+            weights = np.asarray(objective, dtype=np.float64)
+            if weights.shape == (edges.num_men, edges.num_women):
+                weights = weights[edges.man, edges.woman]
+            elif weights.shape != edges.man.shape:
+                raise ValueError(f"Expected a {(edges.num_men, edges.num_women)} matrix of weights or one weight "
+                                 f"per pair, got {weights.shape}")
+            sense = pulp.LpMaximize if sense is None else sense
+        
+        lazy = self.stable and self.lazy
+        if self._program is None:
+            cardinality = None if self.stable else _maximum_cardinality(edges)
+            system = _matching_system(edges, stable=self.stable and not lazy, cardinality=cardinality)
+            self._program = _LinearProgram("Matching_LP", system)
+            if lazy:
+                self._orders = _edge_orders(edges)
+        
+        initial = self._start_values(warm_start) if warm_start is not None and warm_start is not False else None
+        solver = solver if solver is not None else self.solver
+        if lazy:
+            x = _solve_with_cuts(self._program, sense, weights, edges, self._orders, solver, initial)
+        else:
+            x = self._program.solve(sense, weights, solver, initial)
+        
+        # Extract the solution, considering a match if x[m, w] > 0.5
+        return _edge_matching(self.men, self.women, edges, x)
+
+#------------------------------------------------------------------------------------------------------------
+##Linear Programming Algorithms without Stability Constraints
+
+def _linear_assignment(cost):
+    """
+    Solves the linear assignment problem with the shortest augmenting path (Jonker-Volgenant) algorithm.
+    
+    After a column reduction that assigns every column to its cheapest free row, the remaining rows
+    are inserted one at a time; each insertion grows a Dijkstra tree over the columns using reduced
+    costs and dual potentials, with every step vectorized over the columns.
+    
+    Args:
+    cost (numpy.ndarray): Cost matrix with at most as many rows as columns.
+    
+    Returns:
+    numpy.ndarray: The column assigned to every row in a minimum-cost assignment.
+    """
+    num_rows, num_cols = cost.shape
+    
+    # Dual potentials of rows and columns; column 0 is a virtual column used as the tree root
+    row_potential = np.zeros(num_rows + 1)
+    col_potential = np.zeros(num_cols + 1)
+    col_owner = np.zeros(num_cols + 1, dtype=np.int64)
+    predecessor = np.zeros(num_cols + 1, dtype=np.int64)
+    
+    # Column reduction: every column starts at its minimum cost and is given to that row if it is still free
+    if num_rows == num_cols:
+        best_row = np.argmin(cost, axis=0)
+        col_potential[1:] = cost[best_row, np.arange(num_cols)]
+        first_col = np.full(num_rows, -1, dtype=np.int64)
+        first_col[best_row[::-1]] = np.arange(num_cols)[::-1]
+        assigned_rows = np.flatnonzero(first_col >= 0)
+        col_owner[first_col[assigned_rows] + 1] = assigned_rows + 1
+    free_rows = np.flatnonzero(~np.isin(np.arange(1, num_rows + 1), col_owner[1:])) + 1
+    
+    for row in free_rows.tolist():
+        col_owner[0] = row
+        current_col = 0
+        min_slack = np.full(num_cols + 1, np.inf)
+        visited = np.zeros(num_cols + 1, dtype=bool)
+        
+        while True:
+            visited[current_col] = True
+            current_row = col_owner[current_col]
+            
+            # Relax the reduced costs of the row that was just reached
+            reduced = cost[current_row - 1] - row_potential[current_row] - col_potential[1:]
+            improved = ~visited[1:] & (reduced < min_slack[1:])
+            min_slack[1:][improved] = reduced[improved]
+            predecessor[1:][improved] = current_col
+            
+            # Move to the closest unvisited column and update the potentials
+            candidates = np.where(visited[1:], np.inf, min_slack[1:])
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+            row_potential[col_owner[visited]] += delta
+            col_potential[visited] -= delta
+            min_slack[1:][~visited[1:]] -= delta
+            
+            current_col = next_col
+            if col_owner[current_col] == 0:
+                break
+        
+        # Augment along the alternating path
+        while current_col:
+            previous_col = predecessor[current_col]
+            col_owner[current_col] = col_owner[previous_col]
+            current_col = previous_col
+    
+    assignment = np.empty(num_rows, dtype=np.int64)
+    assigned = np.flatnonzero(col_owner[1:])
+    assignment[col_owner[1:][assigned] - 1] = assigned
+    return assignment
+
+
+def _maximum_cardinality(edges):
+    """
+    Computes the size of a maximum matching over the acceptable pairs with augmenting paths.
+    
+    Args:
+    edges (_Edges): The acceptable pairs, ordered by man.
+    
+    Returns:
+    int: The largest number of pairs that can be matched at once.
+    """
+    start = np.searchsorted(edges.man, np.arange(edges.num_men + 1)).tolist()
+    partners = edges.woman.tolist()
+    owner = [-1] * edges.num_women
+    visited = [-1] * edges.num_women
+    size = 0
+    
+    for man in range(edges.num_men):
+        # Depth-first search for an augmenting path; chosen[i] is the woman taken by stack[i]
+        stack, cursor, chosen = [man], [start[man]], []
+        while stack:
+            m = stack[-1]
+            if cursor[-1] == start[m + 1]:
+                stack.pop()
+                cursor.pop()
+                if chosen:
+                    chosen.pop()
+                continue
+            w = partners[cursor[-1]]
+            cursor[-1] += 1
+            if visited[w] == man:
+                continue
+            visited[w] = man
+            chosen.append(w)
+            if owner[w] == -1:
+                break
+            stack.append(owner[w])
+            cursor.append(start[owner[w]])
+        
+        if stack:
+            for m, w in zip(stack, chosen):
+                owner[w] = m
+            size += 1
+    
+    return size
+
+
+def _optimal_assignment(name, sense, men, women, edges, objective, backend, solver=None):
+    """
+    Finds an optimal matching of maximum cardinality for the given pair objective with the selected backend.
+    
+    Args:
+    name (str): Name of the LP problem.
+    sense (int): pulp.LpMinimize or pulp.LpMaximize.
+    men (list): Names of the men.
+    women (list): Names of the women.
+    edges (_Edges): The acceptable pairs.
+    objective (numpy.ndarray): Objective value of every acceptable pair.
+    backend (str): 'lp' solves the problem with PuLP and CBC, 'hungarian' solves it in-process.
+    solver (str or LPSolver, optional): LP solver of the 'lp' backend. Default is None (CBC).
+    
+    Returns:
+    dict: A dictionary where keys are men and values are their matched women.
+    """
+    if backend == 'hungarian':
+        if not len(edges.man):
+            return {}
+        
+        # Unacceptable pairs cost more than any set of acceptable ones, so the assignment uses as few as possible
+        pair_cost = objective if sense == pulp.LpMinimize else -objective
+        penalty = (np.ptp(pair_cost) + 1.0) * (min(edges.num_men, edges.num_women) + 1)
+        cost = np.full((edges.num_men, edges.num_women), pair_cost.max() + penalty)
+        cost[edges.man, edges.woman] = pair_cost
+        acceptable = np.zeros(cost.shape, dtype=bool)
+        acceptable[edges.man, edges.woman] = True
+        if len(men) <= len(women):
+            assignment = _linear_assignment(cost)
+            return {men[m]: women[w] for m, w in enumerate(assignment) if acceptable[m, w]}
+        assignment = _linear_assignment(cost.T)
+        return {men[m]: women[w] for w, m in enumerate(assignment) if acceptable[m, w]}
+    if backend != 'lp':
+        raise ValueError(f"Unknown backend '{backend}', expected 'lp' or 'hungarian'")
+    
+    system = _matching_system(edges, stable=False, cardinality=_maximum_cardinality(edges))
+    x = _solve_lp(name, sense, objective, system, solver)
+    
+    # Extract the solution
+    return _edge_matching(men, women, edges, x)
+
+##Egalitarian Matching
+@cached()
+def egalitarian_matching(men_prefs, women_prefs=None, backend='lp', solver=None):
+    """
+    Calculates the Egalitarian Matching without stability constraint.
+    
+    Args:
+    men_prefs (dict or PreferenceProfile): A dictionary where keys are men and values are lists of women in order
+                                           of preference, or a PreferenceProfile of the whole market.
+    women_prefs (dict): A dictionary where keys are women and values are lists of men in order of preference.
+                        Omitted when a PreferenceProfile is given.
+    backend (str): 'lp' solves the problem with PuLP and CBC. 'hungarian' builds the cost matrix with NumPy
+                   and solves it in-process with the Jonker-Volgenant algorithm. Default is 'lp'.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    
+    Returns:
+    dict: A dictionary representing the Egalitarian Stable Matching, where keys are men 
+          and values are their matched women.
+    """
+    
+    men, women, edges = _ordinal_instance(men_prefs, women_prefs)
+    
+    # Objective function: sum of the ranks (starting at 1) both partners give each other
+    objective = 2 - edges.men_score - edges.women_score
+    
+    return _optimal_assignment("Egalitarian_Stable_Matching", pulp.LpMinimize, men, women, edges, objective, backend,
+                               solver)
+#------------------------------------------------------------------------------------------------------------
+
+##Nash Matching
+@cached()
+def nash_matching(men_valuations, women_valuations=None, backend='lp', solver=None):
+    """
+    Calculates the Nash Matching without stability constraint.
+    
+    Args:
+    men_valuations (dict or PreferenceProfile): A dictionary where keys are men and values are
+                                                dictionaries of their valuations for each woman,
+                                                or a cardinal PreferenceProfile of the whole market.
+    women_valuations (dict): A dictionary where keys are women and values are 
+                             dictionaries of their valuations for each man.
+                             Omitted when a PreferenceProfile is given.
+    backend (str): 'lp' solves the problem with PuLP and CBC. 'hungarian' builds the cost matrix with NumPy
+                   and solves it in-process with the Jonker-Volgenant algorithm. Default is 'lp'.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    
+    Returns:
+    dict: A dictionary representing the Nash Matching, where keys are men 
+          and values are their matched women.
+    """
+    
+    men, women, edges = _cardinal_instance(men_valuations, women_valuations)
+    
+    # Objective function (logarithmic transformation)
+    objective = np.log(edges.men_score) + np.log(edges.women_score)
+    
+    return _optimal_assignment("Nash_Stable_Matching", pulp.LpMaximize, men, women, edges, objective, backend, solver)
+
+#------------------------------------------------------------------------------------------------------------
+##Utilitarian Matching
+@cached()
+def utilitarian_matching(men_valuations, women_valuations=None, backend='lp', solver=None):
+    """
+    Calculates the Utilitarian Matching without stability constraint.
+    
+    Args:
+    men_valuations (dict or PreferenceProfile): A dictionary where keys are men and values are
+                                                dictionaries of their valuations for each woman,
+                                                or a cardinal PreferenceProfile of the whole market.
+    women_valuations (dict): A dictionary where keys are women and values are 
+                             dictionaries of their valuations for each man.
+                             Omitted when a PreferenceProfile is given.
+    backend (str): 'lp' solves the problem with PuLP and CBC. 'hungarian' builds the cost matrix with NumPy
+                   and solves it in-process with the Jonker-Volgenant algorithm. Default is 'lp'.
+    solver (str or LPSolver, optional): LP solver: 'cbc', 'glpk', 'highs', 'highs_cmd', 'scipy', or an LPSolver
+                                        with threads and a time limit. Default is None (CBC).
+    
+    Returns:
+    dict: A dictionary representing the Utilitarian Stable Matching, where keys are men 
+          and values are their matched women.
+    """
+    
+    men, women, edges = _cardinal_instance(men_valuations, women_valuations)
+    
+    # Objective function
+    objective = edges.men_score + edges.women_score
+    
+    return _optimal_assignment("Utilitarian_Stable_Matching", pulp.LpMaximize, men, women, edges, objective, backend,
+                               solver)
@@ -0,0 +1,254 @@
+import collections
+import concurrent.futures
+import itertools
+import numbers
+import os
+import numpy as np
+
+##Compact Instances
+# Instances are shipped to worker processes as a name table plus numpy arrays instead of
+# nested dictionaries, which pickle (and unpickle) much faster and smaller.
+
+def _name_ids(values, names):
+    """
+    Maps names to ids in a shared name table, adding new names as they are seen.
+    
+    Args:
+    values (iterable): Names to map.
+    names (dict): Name table mapping each name to its id, extended in place.
+    
+    Returns:
+    numpy.ndarray: The id of every name.
+    """
+    ids = [names.setdefault(value, len(names)) for value in values]
+    return np.array(ids, dtype=np.int32)
+
+
+def _pack_argument(value, names):
+    """
+    Packs one mechanism argument into a compact tuple of arrays.
+    
+    Dictionaries of preference lists (weak priority lists included), of valuations, of capacities and of
+    school records are packed; any other value is shipped as it is.
+    
+    Args:
+    value: The argument.
+    names (dict): Name table shared by the instances of a chunk, extended in place.
+    
+    Returns:
+    tuple: A tag followed by the packed fields.
+    """
+    if not isinstance(value, dict) or not value:
+        return ('raw', value)
+    
+    items = list(value.values())
+    if all(isinstance(item, (list, tuple)) for item in items):
+        indptr = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in items], out=indptr[1:])
+        groups = (list, set, frozenset)
+        if any(isinstance(member, groups) for item in items for member in item):
+            # Weak priority lists: every entry becomes a class of equally ranked names, delimited by a second indptr
+            entries = [member if isinstance(member, groups) else (member,) for item in items for member in item]
+            class_indptr = np.zeros(len(entries) + 1, dtype=np.int64)
+            np.cumsum([len(entry) for entry in entries], out=class_indptr[1:])
+            indices = _name_ids(itertools.chain.from_iterable(entries), names)
+            return ('classes', _name_ids(value.keys(), names), indptr, indices, class_indptr)
+        indices = _name_ids(itertools.chain.from_iterable(items), names)
+        return ('lists', _name_ids(value.keys(), names), indptr, indices)
+    
+    if all(isinstance(item, dict) for item in items) and not all(
+            isinstance(weight, numbers.Number) for item in items for weight in item.values()):
+        # Records such as school data ({"priorities": [...], "capacity": 2}) are packed field by field
+        fields = list(items[0])
+        if any(list(item) != fields for item in items):
+            return ('raw', value)
+        columns = []
+        for field in fields:
+            first = items[0][field]
+            if len(items) > 1 and isinstance(first, dict) and all(item[field] is first for item in items):
+                # A dictionary every record refers to, such as shared scores, is packed once
+                columns.append(('shared', _pack_argument(first, names)))
+            else:
+                columns.append(_pack_argument({key: item[field] for key, item in value.items()}, names))
+        return ('records', _name_ids(value.keys(), names), fields, columns)
+    
+    if all(isinstance(item, dict) for item in items):
+        indptr = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in items], out=indptr[1:])
+        indices = _name_ids(itertools.chain.from_iterable(items), names)
+        weights = np.array([weight for item in items for weight in item.values()])
+        return ('dicts', _name_ids(value.keys(), names), indptr, indices, weights)
+    
+    if all(isinstance(item, numbers.Number) for item in items):
+        return ('numbers', _name_ids(value.keys(), names), np.array(items))
+    
+    return ('raw', value)
+
+
+def _unpack_argument(packed, names):
+    """
+    Rebuilds an argument packed by _pack_argument.
+    
+    Args:
+    packed (tuple): The packed argument.
+    names (numpy.ndarray): Name table as an object array.
+    
+    Returns:
+    The original argument.
+    """
+    tag = packed[0]
+    if tag == 'raw':
+        return packed[1]
+    
+    keys = names[packed[1]].tolist()
+    if tag == 'records':
+        # A shared field is rebuilt once and given to every record, so they keep referring to one object
+        columns = [itertools.repeat(_unpack_argument(field[1], names)) if field[0] == 'shared'
+                   else _unpack_argument(field, names).values() for field in packed[3]]
+        return {key: dict(zip(packed[2], values)) for key, *values in zip(keys, *columns)}
+    
+    if tag == 'numbers':
+        return dict(zip(keys, packed[2].tolist()))
+    
+    indptr = packed[2].tolist()
+    partners = names[packed[3]].tolist()
+    if tag == 'lists':
+        return {key: partners[start:end] for key, start, end in zip(keys, indptr, indptr[1:])}
+    
+    if tag == 'classes':
+        class_indptr = packed[4].tolist()
+        classes = [partners[start:end] for start, end in zip(class_indptr, class_indptr[1:])]
+        return {key: classes[start:end] for key, start, end in zip(keys, indptr, indptr[1:])}
+    
+    weights = packed[4].tolist()
+    return {key: dict(zip(partners[start:end], weights[start:end]))
+            for key, start, end in zip(keys, indptr, indptr[1:])}
+
+
+def _narrow_ids(packed, dtype):
+    """
+    Stores the name ids of a packed argument with the smallest integer type that fits the name table.
+    """
+    tag = packed[0]
+    if tag == 'raw':
+        return packed
+    if tag == 'shared':
+        return (tag, _narrow_ids(packed[1], dtype))
+    if tag == 'records':
+        return (tag, packed[1].astype(dtype), packed[2], [_narrow_ids(field, dtype) for field in packed[3]])
+    if tag == 'numbers':
+        return (tag, packed[1].astype(dtype), packed[2])
+    return (tag, packed[1].astype(dtype), packed[2], packed[3].astype(dtype)) + packed[4:]
+
+
+def _pack_chunk(instances):
+    """
+    Packs a chunk of instances with one shared name table.
+    
+    Args:
+    instances (list): Instances, each a tuple of positional arguments of the mechanism.
+    
+    Returns:
+    tuple: The name table as a list and the packed instances.
+    """
+    names = {}
+    packed = [tuple(_pack_argument(argument, names) for argument in instance) for instance in instances]
+    dtype = np.min_scalar_type(max(len(names) - 1, 0))
+    return list(names), [tuple(_narrow_ids(argument, dtype) for argument in instance) for instance in packed]
+
+
+def _run_chunk(mechanism, options, names, packed):
+    """
+    Unpacks a chunk of instances in a worker process and runs the mechanism on each of them.
+    
+    Returns:
+    list: The result of every instance, in order.
+    """
+    name_array = np.empty(len(names), dtype=object)
+    name_array[:] = names
+    return [mechanism(*(_unpack_argument(argument, name_array) for argument in instance), **options)
+            for instance in packed]
+
+#------------------------------------------------------------------------------------------------------------
+##Running Many Instances
+
+def _as_arguments(instance):
+    """
+    Returns an instance as a tuple of positional arguments.
+    """
+    return instance if isinstance(instance, tuple) else (instance,)
+
+
+def iter_many(mechanism, instances, workers=None, chunksize=16, ordered=True, **options):
+    """
+    Runs a mechanism on many independent instances over a process pool and yields the results.
+    
+    Instances are consumed lazily, in chunks, and only a bounded number of chunks is in flight at
+    any time, so instances can come from a generator without all being held in memory. Each chunk
+    is packed into a name table and numpy arrays before being sent to a worker.
+    
+    Args:
+    mechanism (callable): A module-level function, e.g. deferred_acceptance or utilitarian_stable_matching.
+    instances (iterable): Instances, each a tuple of positional arguments of the mechanism
+                          (a single argument may be passed without a tuple).
+    workers (int, optional): Number of worker processes. Default is None (one per CPU). 0 or 1 runs in this process.
+    chunksize (int): Number of instances sent to a worker at once. Default is 16.
+    ordered (bool): If True, results are yielded in the order of the instances. If False, (index, result)
+                    pairs are yielded as soon as their chunk finishes.
+    **options: Keyword arguments passed to the mechanism for every instance.
+    
+    Yields:
+    The result of each instance, or (index, result) pairs if ordered is False.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    instances = map(_as_arguments, instances)
+    if workers <= 1:
+        for index, instance in enumerate(instances):
+            result = mechanism(*instance, **options)
+            yield result if ordered else (index, result)
+        return
+    
+    chunks = iter(lambda: list(itertools.islice(instances, chunksize)), [])
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        # Keep every worker busy with one chunk queued behind it
+        pending = collections.deque()
+        start = 0
+        for chunk in itertools.islice(chunks, 2 * workers):
+            pending.append((start, executor.submit(_run_chunk, mechanism, options, *_pack_chunk(chunk))))
+            start += len(chunk)
+        
+        while pending:
+            if ordered:
+                offset, future = pending.popleft()
+            else:
+                done, _ = concurrent.futures.wait([future for _, future in pending],
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                offset, future = next(item for item in pending if item[1] in done)
+                pending.remove((offset, future))
+            
+            for chunk in itertools.islice(chunks, 1):
+                pending.append((start, executor.submit(_run_chunk, mechanism, options, *_pack_chunk(chunk))))
+                start += len(chunk)
+            
+            for index, result in enumerate(future.result(), offset):
+                yield result if ordered else (index, result)
+
+
+def run_many(mechanism, instances, workers=None, chunksize=16, **options):
+    """
+    Runs a mechanism on many independent instances over a process pool.
+    
+    Args:
+    mechanism (callable): A module-level function, e.g. deferred_acceptance or utilitarian_stable_matching.
+    instances (iterable): Instances, each a tuple of positional arguments of the mechanism
+                          (a single argument may be passed without a tuple).
+    workers (int, optional): Number of worker processes. Default is None (one per CPU). 0 or 1 runs in this process.
+    chunksize (int): Number of instances sent to a worker at once. Default is 16.
+    **options: Keyword arguments passed to the mechanism for every instance.
+    
+    Returns:
+    list: The result of every instance, in the order of the instances.
+    """
+    return list(iter_many(mechanism, instances, workers=workers, chunksize=chunksize, **options))
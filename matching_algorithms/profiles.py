@@ -0,0 +1,817 @@
+import numpy as np
+
+##Compiled Instances
+# Markets are stored as a sparse bipartite acceptability graph: every agent's list is a row of CSR
+# arrays, and whatever a mechanism needs per pair (the rank the partner gives the agent, a valuation)
+# is an array aligned with those rows. Time and memory grow with the number of listed pairs, so
+# truncated lists and unbalanced markets cost nothing for the pairs nobody lists.
+
+def _agent_index(agents):
+    """
+    Maps agent names to dense integer ids.
+    
+    Args:
+    agents (iterable): Agent names in the order their ids should be assigned.
+    
+    Returns:
+    dict: A dictionary mapping each agent name to its integer id.
+    """
+    return {agent: i for i, agent in enumerate(agents)}
+
+
+def _agent_names(preferences):
+    """
+    Lists the agents of a preference dictionary, or the row ids of a preference matrix.
+    
+    Args:
+    preferences (dict or numpy.ndarray): Preferences or valuations keyed by agent, or a matrix with one row per agent.
+    
+    Returns:
+    list: Agent names, or the integers 0 to n-1 for a matrix.
+    """
+    if isinstance(preferences, np.ndarray):
+        return list(range(preferences.shape[0]))
+    return list(preferences.keys())
+
+
+def _school_data(schools):
+    """
+    Splits school data into school names, capacities, priorities, priority classes and priority scores.
+    
+    Args:
+    schools (dict, tuple or numpy.ndarray): A dictionary where keys are school names and values are dictionaries
+                                            with 'priorities' (or 'scores' and optional 'bonuses') and 'capacity',
+                                            or a (priorities, capacities) pair of arrays as returned by
+                                            generate_instance_arrays, optionally followed by a matrix of priority
+                                            classes aligned with the priorities, or a (scores, capacities) pair
+                                            optionally followed by (schools, students, bonuses) arrays. Capacities
+                                            alone (a dictionary of school capacities or an array) give no priorities.
+    
+    Returns:
+    tuple: (school_names, capacities, priorities, classes, scores) where priorities is accepted by _preference_csr,
+           or None, classes is aligned with the flattened priority lists, or None for strict priorities, and scores
+           is a (scores, bonuses) pair for score-based priorities, or None.
+    """
+    if isinstance(schools, tuple):
+        priorities, capacities, *extra = schools
+        school_names, capacities = list(range(len(capacities))), np.asarray(capacities).tolist()
+        if np.ndim(priorities) == 1:
+            return school_names, capacities, None, None, (priorities, extra[0] if extra else None)
+        classes = np.asarray(extra[0])[priorities >= 0].astype(np.int64) if extra else None
+        return school_names, capacities, priorities, classes, None
+    if isinstance(schools, np.ndarray):
+        return list(range(len(schools))), schools.tolist(), None, None, None
+    school_names = list(schools.keys())
+    if all(isinstance(data, dict) for data in schools.values()):
+        capacities = [schools[school]['capacity'] for school in school_names]
+        if school_names and all('scores' in schools[school] for school in school_names):
+            scores = schools[school_names[0]]['scores']
+            for school in school_names[1:]:
+                other = schools[school]['scores']
+                if other is not scores and not (other == scores if isinstance(scores, dict)
+                                                else np.array_equal(other, scores)):
+                    raise ValueError("Schools must share one score array; give the differences as bonuses")
+            bonuses = {school: schools[school].get('bonuses', {}) for school in school_names}
+            return school_names, capacities, None, None, (scores, bonuses)
+        priorities, classes = _priority_classes({school: schools[school]['priorities'] for school in school_names},
+                                                school_names)
+        return school_names, capacities, priorities, classes, None
+    return school_names, [schools[school] for school in school_names], None, None, None
+
+
+def _priority_classes(priorities, school_names):
+    """
+    Flattens weak priority lists, where a list or set of students inside a list is a class of equally ranked students.
+    
+    Args:
+    priorities (dict): A dictionary where keys are school names and values are priority lists.
+    school_names (list): School names, in the order of the compiled rows.
+    
+    Returns:
+    tuple: (priorities, classes) where priorities holds flat lists and classes the class of every entry of the lists,
+           concatenated in school order, or (priorities, None) when every list is strict.
+    """
+    groups = (list, set, frozenset)
+    if not any(isinstance(member, groups) for school in school_names for member in priorities[school]):
+        return priorities, None
+    flat = {}
+    classes = []
+    for school in school_names:
+        members = []
+        for level, member in enumerate(priorities[school]):
+            group = member if isinstance(member, groups) else (member,)
+            members.extend(group)
+            classes.extend([level] * len(group))
+        flat[school] = members
+    return flat, np.array(classes, dtype=np.int64)
+
+
+def _score_arrays(scores, bonuses, student_names, student_index, school_index):
+    """
+    Compiles score-based priorities into a score array and a CSR array of bonuses.
+    
+    Args:
+    scores (dict or numpy.ndarray): Score of every student, keyed by name or indexed by id.
+    bonuses (dict or tuple): A dictionary where keys are school names and values map students to their bonus at the
+                             school, or (schools, students, bonuses) arrays of ids and bonuses. None gives no bonuses.
+    student_names (list): Student names indexed by id.
+    student_index (dict): A dictionary mapping student names to ids.
+    school_index (dict): A dictionary mapping school names to ids.
+    
+    Returns:
+    tuple: (scores, (indptr, students, bonuses)) where the bonuses of school c are entries indptr[c]:indptr[c+1],
+           sorted by student.
+    """
+    if isinstance(scores, dict):
+        scores = np.fromiter(map(scores.__getitem__, student_names), dtype=np.float64, count=len(student_names))
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.shape != (len(student_names),):
+        raise ValueError(f"Expected one score per student ({len(student_names)}), got shape {scores.shape}")
+    
+    if bonuses is None:
+        schools = students = np.zeros(0, dtype=np.int64)
+        values = np.zeros(0)
+    elif isinstance(bonuses, dict):
+        pairs = [(school_index[school], student_index[student], bonus)
+                 for school, given in bonuses.items() for student, bonus in given.items()]
+        schools, students, values = (np.array(column, dtype=dtype) for column, dtype in
+                                     zip(zip(*pairs) if pairs else ((), (), ()), (np.int64, np.int64, np.float64)))
+    else:
+        schools, students, values = (np.asarray(column) for column in bonuses)
+    
+    order = np.lexsort((students, schools))
+    schools, students, values = schools[order], students[order].astype(np.int32), values[order].astype(np.float64)
+    if np.any((np.diff(schools) == 0) & (np.diff(students) == 0)):
+        raise ValueError("A student has two bonuses at the same school")
+    indptr = np.zeros(len(school_index) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(schools, minlength=len(school_index)), out=indptr[1:])
+    return scores, (indptr, students, values)
+
+
+def _preference_csr(preferences, agents, partner_index):
+    """
+    Converts preference lists into compressed sparse row (CSR) arrays of partner ids.
+    
+    Args:
+    preferences (dict or numpy.ndarray): A dictionary where keys are agents and values are lists of partners in order
+                                         of preference, or a matrix of partner ids with one row per agent, where -1
+                                         pads the end of truncated lists.
+    agents (list): Agent names; row i of the result holds the preferences of agents[i].
+    partner_index (dict): A dictionary mapping partner names to integer ids.
+    
+    Returns:
+    tuple: (indptr, indices) where the preferences of agent i are indices[indptr[i]:indptr[i+1]].
+    """
+    if isinstance(preferences, np.ndarray):
+        # A preference matrix already holds partner ids
+        listed = preferences >= 0
+        indptr = np.zeros(len(agents) + 1, dtype=np.int64)
+        np.cumsum(listed.sum(axis=1), out=indptr[1:])
+        return indptr, preferences[listed].astype(np.int32)
+    
+    lengths = np.fromiter((len(preferences[agent]) for agent in agents), dtype=np.int64, count=len(agents))
+    indptr = np.zeros(len(agents) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    lookup = partner_index.__getitem__
+    for i, agent in enumerate(agents):
+        indices[indptr[i]:indptr[i + 1]] = np.fromiter(map(lookup, preferences[agent]), dtype=np.int32, count=lengths[i])
+    return indptr, indices
+
+
+def _rank_matrix(indptr, indices, num_partners):
+    """
+    Builds the inverse rank matrix of CSR preference lists.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the preference lists.
+    indices (numpy.ndarray): CSR partner ids of the preference lists.
+    num_partners (int): Number of agents on the other side of the market.
+    
+    Returns:
+    numpy.ndarray: An int32 matrix where entry [i, j] is the position of partner j in the list of agent i.
+                   Partners missing from a list get rank num_partners, i.e. below every listed partner.
+    """
+    num_agents = len(indptr) - 1
+    lengths = np.diff(indptr)
+    ranks = np.full((num_agents, num_partners), num_partners, dtype=np.int32)
+    rows = np.repeat(np.arange(num_agents), lengths)
+    positions = np.arange(len(indices), dtype=np.int64) - np.repeat(indptr[:-1], lengths)
+    ranks[rows, indices] = positions
+    return ranks
+
+
+def _partner_ranks(indptr, indices, partner_indptr, partner_indices):
+    """
+    Looks up, for every entry of CSR preference lists, the rank the listed partner gives the agent.
+    
+    The entries of both sides are matched by sorting (partner, agent) keys, so the lookup takes
+    O(E log E) time and O(E) memory for E listed pairs, instead of an inverse rank matrix over all pairs.
+    When the lists cover a large part of all pairs, a rank matrix is no larger than the sort buffers and
+    much faster to fill, so it is used instead.
+    
+    Args:
+    indptr (numpy.ndarray): CSR row pointers of the agents' preference lists.
+    indices (numpy.ndarray): CSR partner ids of the agents' preference lists.
+    partner_indptr (numpy.ndarray): CSR row pointers of the partners' preference lists.
+    partner_indices (numpy.ndarray): CSR agent ids of the partners' preference lists.
+    
+    Returns:
+    numpy.ndarray: An int32 array aligned with indices: the position of the agent in the list of the partner
+                   of each entry, or -1 if the partner does not list the agent.
+    """
+    num_agents = len(indptr) - 1
+    num_partners = len(partner_indptr) - 1
+    partner_lengths = np.diff(partner_indptr)
+    positions = np.arange(len(partner_indices), dtype=np.int32) - np.repeat(partner_indptr[:-1], partner_lengths)
+    agent = np.repeat(np.arange(num_agents, dtype=np.int64), np.diff(indptr))
+    
+    if num_agents * num_partners <= 4 * (len(indices) + len(partner_indices)):
+        rank_matrix = np.full((num_partners, num_agents), -1, dtype=np.int32)
+        rank_matrix[np.repeat(np.arange(num_partners), partner_lengths), partner_indices] = positions
+        return rank_matrix[indices, agent]
+    
+    keys = indices.astype(np.int64) * num_agents + agent
+    partner = np.repeat(np.arange(num_partners, dtype=np.int64), partner_lengths)
+    partner_keys = partner * num_agents + partner_indices
+    order = np.argsort(partner_keys)
+    sorted_keys = partner_keys[order]
+    
+    ranks = np.full(len(indices), -1, dtype=np.int32)
+    if not len(sorted_keys):
+        return ranks
+    
+    # Searching sorted queries walks the sorted keys once instead of jumping around them
+    query_order = np.argsort(keys)
+    queries = keys[query_order]
+    found = np.minimum(np.searchsorted(sorted_keys, queries), len(sorted_keys) - 1)
+    listed = sorted_keys[found] == queries
+    ranks[query_order[listed]] = positions[order[found[listed]]]
+    return ranks
+
+
+def _valuation_csr(valuations):
+    """
+    Converts a valuation matrix into CSR preference lists sorted by decreasing valuation.
+    
+    Args:
+    valuations (numpy.ndarray): Valuation matrix; -inf marks unacceptable partners.
+    
+    Returns:
+    tuple: (indptr, indices, weights) of the preference lists, ties broken by partner id, where weights
+           holds the valuation of every entry.
+    """
+    order = np.argsort(-valuations, axis=1, kind='stable')
+    sorted_valuations = np.take_along_axis(valuations, order, axis=1)
+    acceptable = np.isfinite(sorted_valuations)
+    indptr = np.zeros(valuations.shape[0] + 1, dtype=np.int64)
+    np.cumsum(acceptable.sum(axis=1), out=indptr[1:])
+    return indptr, order[acceptable].astype(np.int32), sorted_valuations[acceptable].astype(np.float64)
+
+
+def _valuation_lists(valuations, agents, partner_index):
+    """
+    Converts valuation dictionaries (or a valuation matrix) into CSR preference lists sorted by decreasing valuation.
+    
+    Args:
+    valuations (dict or numpy.ndarray): A dictionary where keys are agents and values are dictionaries of their
+                                        valuations for the partners they find acceptable, or a valuation matrix
+                                        where -inf marks unacceptable partners.
+    agents (list): Agent names; row i of the result holds the list of agents[i].
+    partner_index (dict): A dictionary mapping partner names to integer ids.
+    
+    Returns:
+    tuple: (indptr, indices, weights) as returned by _valuation_csr.
+    """
+    if isinstance(valuations, np.ndarray):
+        return _valuation_csr(valuations.astype(np.float64))
+    
+    lengths = np.fromiter((len(valuations[agent]) for agent in agents), dtype=np.int64, count=len(agents))
+    partners = np.fromiter((partner_index[partner] for agent in agents for partner in valuations[agent]),
+                           dtype=np.int32, count=int(lengths.sum()))
+    values = np.fromiter((value for agent in agents for value in valuations[agent].values()),
+                         dtype=np.float64, count=len(partners))
+    rows = np.repeat(np.arange(len(agents)), lengths)
+    
+    # Sort every row by decreasing valuation, ties by partner id, and drop -inf entries
+    order = np.lexsort((partners, -values, rows))
+    order = order[np.isfinite(values[order])]
+    indptr = np.zeros(len(agents) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[order], minlength=len(agents)), out=indptr[1:])
+    return indptr, partners[order], values[order]
+
+
+def _is_cardinal(preferences):
+    """
+    Tells whether preferences are cardinal valuations (dictionaries or float matrices) rather than lists.
+    """
+    if isinstance(preferences, np.ndarray):
+        return np.issubdtype(preferences.dtype, np.floating)
+    return any(isinstance(value, dict) for value in preferences.values())
+
+
+class PreferenceProfile:
+    """
+    A two-sided market compiled once into integer arrays, accepted by every marriage market function.
+    
+    Agents of each side get dense integer ids (side 0 for men, side 1 for women). Preference lists
+    are stored as CSR arrays, so truncated lists take no padding and the two sides may differ in size;
+    the rank every partner gives back is looked up once per listed pair and cached, so several
+    mechanisms run on the same profile compile it only once. A pair is acceptable when both agents
+    list each other.
+    
+    Args:
+    side1_preferences (dict or numpy.ndarray): Preference lists (or valuation dictionaries) of side1 agents, or a matrix.
+    side2_preferences (dict or numpy.ndarray): Preference lists (or valuation dictionaries) of side2 agents, or a matrix.
+    is_cardinal (bool, optional): Whether preferences are cardinal valuations. Default is None (inferred).
+    
+    Attributes:
+    names (tuple): For each side, the list of agent names indexed by id.
+    index (tuple): For each side, a dictionary mapping agent names to ids.
+    is_cardinal (bool): Whether the profile holds cardinal valuations.
+    """
+    __slots__ = ('names', 'index', 'is_cardinal', '_csr', '_weights', '_partner_ranks', '_ranks')
+    
+    def __init__(self, side1_preferences, side2_preferences, is_cardinal=None):
+        preferences = (side1_preferences, side2_preferences)
+        self.names = tuple(_agent_names(side) for side in preferences)
+        self.index = tuple(_agent_index(names) for names in self.names)
+        self.is_cardinal = _is_cardinal(side1_preferences) if is_cardinal is None else is_cardinal
+        self._partner_ranks = [None, None]
+        self._ranks = [None, None]
+        
+        if self.is_cardinal:
+            # Lists are sorted by decreasing valuation; missing valuations mark unacceptable partners
+            lists = [_valuation_lists(preferences[side], self.names[side], self.index[1 - side]) for side in (0, 1)]
+            self._csr = [(indptr, indices) for indptr, indices, _ in lists]
+            self._weights = [weights for _, _, weights in lists]
+        else:
+            self._csr = [_preference_csr(preferences[side], self.names[side], self.index[1 - side]) for side in (0, 1)]
+            self._weights = None
+    
+    @property
+    def shape(self):
+        """
+        tuple: Number of agents on each side.
+        """
+        return len(self.names[0]), len(self.names[1])
+    
+    def _content(self):
+        """
+        Returns the names and arrays defining the profile, from which result caching fingerprints it.
+        """
+        return ('PreferenceProfile', self.names, self.is_cardinal, self._csr, self._weights)
+    
+    def csr(self, side):
+        """
+        Returns the preference lists of a side as CSR arrays of partner ids.
+        
+        Args:
+        side (int): 0 for side1 (men), 1 for side2 (women).
+        
+        Returns:
+        tuple: (indptr, indices); for cardinal profiles, acceptable partners by decreasing valuation.
+        """
+        return self._csr[side]
+    
+    def weights(self, side):
+        """
+        Returns the valuations of a side of a cardinal profile, aligned with its CSR lists.
+        
+        Args:
+        side (int): 0 for side1 (men), 1 for side2 (women).
+        
+        Returns:
+        numpy.ndarray: The valuation of every entry of csr(side)[1].
+        """
+        if not self.is_cardinal:
+            raise ValueError("The profile holds ordinal preferences, not cardinal valuations")
+        return self._weights[side]
+    
+    def partner_ranks(self, side):
+        """
+        Returns the rank each listed partner gives back, aligned with the CSR lists of a side.
+        
+        Args:
+        side (int): 0 for side1 (men), 1 for side2 (women).
+        
+        Returns:
+        numpy.ndarray: For every entry of csr(side)[1], the position of the agent in the partner's list,
+                       or -1 if the partner does not list the agent (the pair is unacceptable).
+        """
+        if self._partner_ranks[side] is None:
+            self._partner_ranks[side] = _partner_ranks(*self._csr[side], *self._csr[1 - side])
+        return self._partner_ranks[side]
+    
+    def ranks(self, side):
+        """
+        Returns the inverse rank matrix of a side, where entry [i, j] is the position of partner j in the list of i.
+        The matrix covers every pair, so it is meant for small markets; the mechanisms use partner_ranks.
+        
+        Args:
+        side (int): 0 for side1 (men), 1 for side2 (women).
+        
+        Returns:
+        numpy.ndarray: An int32 matrix; unranked partners get the number of partners as rank.
+        """
+        if self._ranks[side] is None:
+            self._ranks[side] = _rank_matrix(*self._csr[side], len(self.names[1 - side]))
+        return self._ranks[side]
+    
+    def valuations(self, side):
+        """
+        Returns the valuation matrix of a side of a cardinal profile. Like ranks, it covers every pair.
+        
+        Args:
+        side (int): 0 for side1 (men), 1 for side2 (women).
+        
+        Returns:
+        numpy.ndarray: A float matrix where entry [i, j] is the valuation of agent i for partner j (-inf if missing).
+        """
+        indptr, indices = self._csr[side]
+        scores = np.full(self.shape[::1 - 2 * side], -np.inf)
+        scores[np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), indices] = self.weights(side)
+        return scores
+
+
+class SchoolMarket:
+    """
+    A school choice market compiled once into integer arrays, accepted by every school choice function.
+    
+    Students and schools get dense integer ids. Student preferences and school priorities are stored
+    as CSR arrays, and the ranks each side gives the other along those lists are looked up on first
+    use and cached. Students only attend schools on their own (possibly truncated) lists; a school
+    that does not list a student ranks them below every listed student.
+    
+    Priorities may be weak: a list or set of students inside a priority list is a class of equally
+    ranked students (e.g. siblings, then the walk zone, then everyone else), and the students a school
+    does not list form its last class. The mechanisms need strict priorities, which break_ties draws.
+    
+    Priorities may also be scores: every school ranks all students by one shared score (higher first,
+    ties broken by id) plus the bonuses it gives some students. The priority order of a school is never
+    built; ranks are counted in one sorted order of the scores when needed.
+    
+    Args:
+    students (dict or numpy.ndarray): A dictionary where keys are student names and values are lists of school
+                                      preferences, or a matrix of school ids.
+    schools (dict, tuple or numpy.ndarray): A dictionary where keys are school names and values are dictionaries
+                                            with 'priorities' and 'capacity', or a (priorities, capacities) pair of
+                                            arrays, optionally followed by a matrix giving the class of every
+                                            priority entry (non-decreasing along each list). For score-based
+                                            priorities, the dictionaries hold 'scores' (the same student scores,
+                                            keyed by name, for every school) and optionally 'bonuses' (a dictionary
+                                            of students and their bonus at the school) instead of 'priorities', or
+                                            the arrays are a (scores, capacities) pair, optionally followed by
+                                            (schools, students, bonuses) arrays. For the serial dictatorships,
+                                            capacities alone (a dictionary of school capacities or an array) are
+                                            enough.
+    
+    Attributes:
+    student_names (list): Student names indexed by id.
+    school_names (list): School names indexed by id.
+    student_index (dict): A dictionary mapping student names to ids.
+    school_index (dict): A dictionary mapping school names to ids.
+    capacities (numpy.ndarray): Capacity of each school.
+    student_csr (tuple): (indptr, indices) of the student preference lists.
+    priority_csr (tuple): (indptr, indices) of the school priority lists, or None without priorities.
+    priority_classes (numpy.ndarray): Class of every entry of priority_csr[1], or None for strict priorities.
+    priority_scores (numpy.ndarray): Score of every student for score-based priorities, or None.
+    priority_bonuses (tuple): (indptr, students, bonuses) CSR arrays of the bonuses of every school, with
+                              priority_scores, or None.
+    """
+    __slots__ = ('student_names', 'school_names', 'student_index', 'school_index', 'capacities',
+                 'student_csr', 'priority_csr', 'priority_classes', 'priority_scores', 'priority_bonuses',
+                 '_application_ranks', '_offer_ranks', '_priority_ranks', '_student_ranks', '_score_index',
+                 '_reopen')
+    
+    def __init__(self, students, schools):
+        self.student_names = _agent_names(students)
+        self.school_names, capacities, priorities, classes, scores = _school_data(schools)
+        self.student_index = _agent_index(self.student_names)
+        self.school_index = _agent_index(self.school_names)
+        self.capacities = np.array(capacities, dtype=np.int64)
+        self.student_csr = _preference_csr(students, self.student_names, self.school_index)
+        self.priority_csr = None
+        self.priority_classes = None
+        if priorities is not None:
+            self.priority_csr = _preference_csr(priorities, self.school_names, self.student_index)
+            if classes is not None:
+                # Classes must not decrease along a list, so that each class is a contiguous block
+                lengths = np.diff(self.priority_csr[0])
+                row_starts = np.zeros(len(classes), dtype=bool)
+                row_starts[self.priority_csr[0][:-1][lengths > 0]] = True
+                if np.any((np.diff(classes) < 0) & ~row_starts[1:]):
+                    raise ValueError("Priority classes must not decrease along a priority list")
+                self.priority_classes = classes
+        self.priority_scores = self.priority_bonuses = None
+        if scores is not None:
+            self.priority_scores, self.priority_bonuses = _score_arrays(*scores, self.student_names,
+                                                                        self.student_index, self.school_index)
+        self._application_ranks = None
+        self._offer_ranks = None
+        self._priority_ranks = None
+        self._student_ranks = None
+        self._score_index = None
+        self._reopen = None
+    
+    @classmethod
+    def from_arrays(cls, student_csr, capacities, priority_csr=None, student_names=None, school_names=None,
+                    application_ranks=None, priority_classes=None, priority_scores=None, priority_bonuses=None):
+        """
+        Builds a market directly from compiled arrays, without copying them.
+        
+        Args:
+        student_csr (tuple): (indptr, indices) of the student preference lists, as school ids.
+        capacities (numpy.ndarray): Capacity of each school.
+        priority_csr (tuple, optional): (indptr, indices) of the school priority lists, as student ids.
+        student_names (list, optional): Student names indexed by id. Default is None (the ids themselves).
+        school_names (list, optional): School names indexed by id. Default is None (the ids themselves).
+        application_ranks (numpy.ndarray, optional): Precomputed application_ranks() of the market.
+        priority_classes (numpy.ndarray, optional): Class of every entry of priority_csr[1], non-decreasing along
+                                                    each list. Default is None (strict priorities).
+        priority_scores (numpy.ndarray, optional): Score of every student, in place of priority_csr.
+        priority_bonuses (tuple, optional): (indptr, students, bonuses) CSR arrays of the bonuses of every school,
+                                            sorted by student within a school. Default is None (no bonuses).
+        
+        Returns:
+        SchoolMarket: The market.
+        """
+        market = cls.__new__(cls)
+        market.student_names = list(range(len(student_csr[0]) - 1)) if student_names is None else student_names
+        market.school_names = list(range(len(capacities))) if school_names is None else school_names
+        market.student_index = _agent_index(market.student_names)
+        market.school_index = _agent_index(market.school_names)
+        market.capacities = capacities
+        market.student_csr = student_csr
+        market.priority_csr = priority_csr
+        market.priority_classes = priority_classes
+        market.priority_scores = priority_scores
+        market.priority_bonuses = priority_bonuses
+        if priority_scores is not None and priority_bonuses is None:
+            market.priority_bonuses = (np.zeros(len(market.school_names) + 1, dtype=np.int64),
+                                       np.zeros(0, dtype=np.int32), np.zeros(0))
+        market._application_ranks = application_ranks
+        market._offer_ranks = None
+        market._priority_ranks = None
+        market._student_ranks = None
+        market._score_index = None
+        market._reopen = None
+        return market
+    
+    def _content(self):
+        """
+        Returns the names and arrays defining the market, from which result caching fingerprints it.
+        """
+        return ('SchoolMarket', self.student_names, self.school_names, self.capacities, self.student_csr,
+                self.priority_csr, self.priority_classes, self.priority_scores, self.priority_bonuses)
+    
+    def __reduce_ex__(self, protocol):
+        # Markets mapped from a file are pickled as the instruction to map the file again
+        if self._reopen is not None:
+            return self._reopen
+        return super().__reduce_ex__(protocol)
+    
+    def application_ranks(self):
+        """
+        Returns the priority every application gets, aligned with the student lists.
+        
+        Returns:
+        numpy.ndarray: For every entry of student_csr[1], the position of the student in the priority list of
+                       the school, or -1 if the school does not list the student. With score-based priorities,
+                       every student is ranked, and the position is in the order of the school over all students.
+        """
+        if self._application_ranks is None and self.priority_scores is not None:
+            indptr, indices = self.student_csr
+            students = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+            self._application_ranks = _score_ranks(self, indices, students)
+        if self._application_ranks is None:
+            if self.priority_csr is None:
+                raise ValueError("The market has no school priorities")
+            self._application_ranks = _partner_ranks(*self.student_csr, *self.priority_csr)
+        return self._application_ranks
+    
+    def offer_ranks(self):
+        """
+        Returns the rank every student gives the school, aligned with the school priority lists.
+        
+        Returns:
+        numpy.ndarray: For every entry of priority_csr[1], the position of the school in the list of the
+                       student, or -1 if the student does not list the school.
+        """
+        if self._offer_ranks is None:
+            if self.priority_csr is None:
+                raise ValueError("The market has no school priorities")
+            self._offer_ranks = _partner_ranks(*self.priority_csr, *self.student_csr)
+        return self._offer_ranks
+    
+    def priority_ranks(self):
+        """
+        Returns the inverse rank matrix of the school priorities, indexed [school, student].
+        The matrix covers every pair, so it is meant for small markets; the mechanisms use application_ranks.
+        """
+        if self._priority_ranks is None and self.priority_scores is not None:
+            num_students, num_schools = len(self.student_names), len(self.school_names)
+            ranks = _score_ranks(self, np.repeat(np.arange(num_schools), num_students),
+                                 np.tile(np.arange(num_students), num_schools))
+            self._priority_ranks = ranks.reshape(num_schools, num_students).astype(np.int32)
+        if self._priority_ranks is None:
+            if self.priority_csr is None:
+                raise ValueError("The market has no school priorities")
+            self._priority_ranks = _rank_matrix(*self.priority_csr, len(self.student_names))
+        return self._priority_ranks
+    
+    def break_ties(self, tie_breaking='single', seed=None):
+        """
+        Returns the market with strict priorities, ordering the students of each priority class by lottery.
+        
+        With single tie-breaking, every student draws one lottery number used by all schools; with multiple
+        tie-breaking, every school draws its own numbers. The students who apply to a school without being
+        listed form its last class and are ordered the same way. A market with strict priorities is returned as is.
+        
+        Args:
+        tie_breaking (str): 'single' or 'multiple'. Default is 'single'.
+        seed (int or numpy.random.Generator, optional): Seed or generator of the lotteries. Default is None.
+        
+        Returns:
+        SchoolMarket: A market with the same students, schools and names, and strict priority lists.
+        """
+        if tie_breaking not in ('single', 'multiple'):
+            raise ValueError(f"Unknown tie_breaking {tie_breaking!r}, expected 'single' or 'multiple'")
+        if self.priority_classes is None:
+            return self
+        rng = np.random.default_rng(seed)
+        indptr, indices = self.student_csr
+        priority_indptr, priority_indices = self.priority_csr
+        num_schools = len(priority_indptr) - 1
+        
+        # Listed entries keep their class; unlisted applicants join the last class of the school
+        unlisted = np.flatnonzero(self.application_ranks() < 0)
+        lengths = np.diff(priority_indptr)
+        schools = np.concatenate((np.repeat(np.arange(num_schools), lengths), indices[unlisted]))
+        students = np.concatenate((priority_indices, np.searchsorted(indptr, unlisted, side='right') - 1))
+        classes = np.concatenate((self.priority_classes, _admission_ranks(self)[unlisted]))
+        if tie_breaking == 'single':
+            lottery = rng.permutation(len(self.student_names))[students]
+        else:
+            lottery = rng.random(len(students))
+        order = np.lexsort((lottery, classes, schools))
+        
+        strict_indptr = np.zeros(num_schools + 1, dtype=np.int64)
+        np.cumsum(np.bincount(schools, minlength=num_schools), out=strict_indptr[1:])
+        return SchoolMarket.from_arrays(self.student_csr, self.capacities,
+                                        (strict_indptr, students[order].astype(np.int32)),
+                                        self.student_names, self.school_names)
+    
+    def student_ranks(self):
+        """
+        Returns the inverse rank matrix of the student preferences, indexed [student, school].
+        """
+        if self._student_ranks is None:
+            self._student_ranks = _rank_matrix(*self.student_csr, len(self.school_names))
+        return self._student_ranks
+
+
+def _admission_ranks(market):
+    """
+    Returns the priority rank of every application of a school market, aligned with the student lists.
+    Students a school does not list rank after its list, by id: their rank is the length of the list plus their id.
+    With priority classes, the rank is the class, and the students a school does not list share its last class.
+    """
+    ranks = market.application_ranks().astype(np.int64)
+    unlisted = np.flatnonzero(ranks < 0)
+    if market.priority_classes is not None:
+        indptr, indices = market.student_csr
+        priority_indptr = market.priority_csr[0]
+        classes = market.priority_classes
+        listed = np.flatnonzero(ranks >= 0)
+        ranks[listed] = classes[priority_indptr[indices[listed]] + ranks[listed]]
+        lengths = np.diff(priority_indptr)
+        last_class = np.zeros(len(lengths), dtype=np.int64)
+        last_class[lengths > 0] = classes[priority_indptr[1:][lengths > 0] - 1] + 1
+        ranks[unlisted] = last_class[indices[unlisted]]
+    elif len(unlisted):
+        indptr, indices = market.student_csr
+        students = np.searchsorted(indptr, unlisted, side='right') - 1
+        ranks[unlisted] = np.diff(market.priority_csr[0])[indices[unlisted]] + students
+    return ranks
+
+
+def _has_priorities(market):
+    """
+    Tells whether a school market has priorities, as lists or as scores.
+    """
+    return market.priority_csr is not None or market.priority_scores is not None
+
+
+def _score_index(market):
+    """
+    Sorts the students of a market with score-based priorities once, for _score_ranks and _score_lists.
+    
+    Every student gets an integer key per school, level * num_students + id, where levels number the
+    distinct priority values (scores, and scores plus bonuses) from the best down: a lower key means a
+    higher priority, and equal values go to the lower id. Bonus entries are grouped by school by adding
+    school * span to their keys, span being larger than every key.
+    
+    Returns:
+    tuple: (base_keys, sorted_keys, base_positions, holder_base_keys, holder_bonus_keys, school_bonus_keys, span)
+           where base_keys is the key of every student without bonus, sorted_keys the same keys sorted and
+           base_positions the position of every student in them, holder_base_keys the sorted school-offset base
+           keys of the bonus holders and holder_bonus_keys their keys with the bonus, and school_bonus_keys the
+           sorted school-offset keys with the bonus.
+    """
+    if market._score_index is None:
+        scores = market.priority_scores
+        indptr, holders, bonuses = market.priority_bonuses
+        num_students = len(scores)
+        _, levels = np.unique(-np.concatenate((scores, scores[holders] + bonuses)), return_inverse=True)
+        keys = levels.astype(np.int64) * num_students + np.concatenate((np.arange(num_students), holders))
+        base_keys, bonus_keys = keys[:num_students], keys[num_students:]
+        span = int(keys.max(initial=0)) + 1
+        by_key = np.argsort(base_keys)
+        base_positions = np.empty(num_students, dtype=np.int64)
+        base_positions[by_key] = np.arange(num_students)
+        offsets = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr)) * span
+        holder_base_keys = offsets + base_keys[holders]
+        by_base_key = np.argsort(holder_base_keys)
+        market._score_index = (base_keys, base_keys[by_key], base_positions, holder_base_keys[by_base_key],
+                               bonus_keys[by_base_key], np.sort(offsets + bonus_keys), span)
+    return market._score_index
+
+
+def _score_ranks(market, schools, students):
+    """
+    Returns the priority ranks of (school, student) pairs of a market with score-based priorities.
+    
+    The rank is the position of the student in the order of the school over all students. It is counted
+    rather than looked up: the students ahead are those whose key is lower in the shared sorted keys,
+    corrected for the bonus holders of the school, which takes O(log B) per pair for B bonuses. The
+    pairs are searched sorted by school and key, which keeps the searches in cache.
+    
+    Args:
+    market (SchoolMarket): A market with priority_scores.
+    schools (numpy.ndarray): School ids.
+    students (numpy.ndarray): Student ids, aligned with schools.
+    
+    Returns:
+    numpy.ndarray: The int64 rank of every pair.
+    """
+    (base_keys, sorted_keys, base_positions, holder_base_keys, holder_bonus_keys, school_bonus_keys,
+     span) = _score_index(market)
+    students = np.asarray(students, dtype=np.int64)
+    
+    # Students ahead without counting bonuses: the position of the student in the shared order
+    ranks = base_positions[students]
+    if not len(holder_base_keys):
+        return ranks
+    offsets = np.asarray(schools, dtype=np.int64) * span
+    queries = offsets + base_keys[students]
+    order = np.argsort(queries)
+    queries, offsets, sorted_ranks = queries[order], offsets[order], ranks[order]
+    
+    # Bonus holders of the school counted at their base key; a pair found among them has a bonus, and
+    # its student is placed by the key with the bonus instead
+    holders_ahead = np.searchsorted(holder_base_keys, queries)
+    found = np.minimum(holders_ahead, len(holder_base_keys) - 1)
+    has_bonus = np.flatnonzero(holder_base_keys[found] == queries)
+    keys = holder_bonus_keys[found[has_bonus]]
+    sorted_ranks[has_bonus] = np.searchsorted(sorted_keys, keys)
+    queries[has_bonus] = offsets[has_bonus] + keys
+    holders_ahead[has_bonus] = np.searchsorted(holder_base_keys, queries[has_bonus])
+    
+    # Swap the holders ahead at their base key for those ahead with their bonus (the holders of the schools
+    # before cancel out between the two)
+    sorted_ranks += np.searchsorted(school_bonus_keys, queries) - holders_ahead
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+def _score_lists(market):
+    """
+    Builds the orders top trading cycles walks for score-based priorities: the bonus holders of every school
+    sorted by priority, and all students sorted by score, with the keys merging the two.
+    
+    Returns:
+    tuple: (indptr, students, list_keys, order, order_keys).
+    """
+    base_keys, sorted_keys, _, _, _, school_bonus_keys, span = _score_index(market)
+    list_keys = school_bonus_keys % span
+    return (market.priority_bonuses[0], (list_keys % len(base_keys)).astype(np.int32), list_keys,
+            sorted_keys % len(base_keys), sorted_keys)
+
+
+def _marriage_profile(side1_preferences, side2_preferences, is_cardinal=None):
+    """
+    Returns the PreferenceProfile passed as first argument, or compiles one from the two sides.
+    """
+    if isinstance(side1_preferences, PreferenceProfile):
+        return side1_preferences
+    return PreferenceProfile(side1_preferences, side2_preferences, is_cardinal)
+
+
+def _school_market(students, schools):
+    """
+    Returns the SchoolMarket passed as first argument, or compiles one from students and schools.
+    """
+    if isinstance(students, SchoolMarket):
+        return students
+    return SchoolMarket(students, schools)
@@ -0,0 +1,388 @@
+import csv
+import os
+import struct
+import tempfile
+import numpy as np
+from matching_algorithms.profiles import SchoolMarket, _partner_ranks, _school_market
+
+##Market File Format
+# A market file starts with a fixed header (magic, version, then int64 counts) followed by
+# 64-byte aligned sections of little-endian arrays:
+#   student_indptr (int64), student_indices (int32), priority_indptr (int64), priority_indices (int32),
+#   capacities (int64), application_ranks (int32, optional), then the name tables as int64 offsets
+#   into a UTF-8 blob. Sections are found from the counts alone, so the file is mapped without parsing.
+
+_MAGIC = b'MATCHMKT'
+_VERSION = 2
+_HEADER = struct.Struct('<8sI4x8q')
+_ALIGNMENT = 64
+
+
+def _sections(counts):
+    """
+    Lists the array sections of a market file.
+    
+    Args:
+    counts (dict): The header counts.
+    
+    Returns:
+    tuple: The (name, dtype, shape, offset) of every section in file order, and the file size.
+    """
+    num_students, num_schools = counts['num_students'], counts['num_schools']
+    layout = [
+        ('student_indptr', np.int64, (num_students + 1,)),
+        ('student_indices', np.int32, (counts['student_nnz'],)),
+        ('priority_indptr', np.int64, (num_schools + 1,)),
+        ('priority_indices', np.int32, (counts['priority_nnz'],)),
+        ('capacities', np.int64, (num_schools,)),
+    ]
+    if counts['has_ranks']:
+        layout.append(('application_ranks', np.int32, (counts['student_nnz'],)))
+    for side, size in (('student', num_students), ('school', num_schools)):
+        if counts[f'{side}_name_bytes'] >= 0:
+            layout.append((f'{side}_name_offsets', np.int64, (size + 1,)))
+            layout.append((f'{side}_name_bytes', np.uint8, (counts[f'{side}_name_bytes'],)))
+    
+    sections = []
+    offset = _HEADER.size
+    for name, dtype, shape in layout:
+        offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+        sections.append((name, dtype, shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return sections, offset
+
+
+_COUNTS = ('num_students', 'num_schools', 'student_nnz', 'priority_nnz', 'has_priorities', 'has_ranks',
+           'student_name_bytes', 'school_name_bytes')
+
+
+def _section_views(buffer, sections):
+    """
+    Views every section of a mapped market file as a NumPy array sharing the mapping.
+    """
+    views = {}
+    for name, dtype, shape, offset in sections:
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        views[name] = buffer[offset:offset + size].view(dtype).reshape(shape).view(np.ndarray)
+    return views
+
+
+def _create(path, counts):
+    """
+    Creates a market file of the right size, writes its header and maps it for writing.
+    
+    Returns:
+    tuple: The writable mapping of the file and a dictionary with an array for every section.
+    """
+    sections, size = _sections(counts)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, *(counts[name] for name in _COUNTS)))
+        f.truncate(size)
+    buffer = np.memmap(path, dtype=np.uint8, mode='r+')
+    return buffer, _section_views(buffer, sections)
+
+
+def _encode_names(names):
+    """
+    Encodes a name table as UTF-8, or returns None if the names are the ids 0 to n-1.
+    
+    Returns:
+    tuple: (offsets, blob) or None.
+    """
+    if all(type(name) is int and name == i for i, name in enumerate(names)):
+        return None
+    encoded = [str(name).encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _decode_names(offsets, blob):
+    """
+    Decodes a name table written by _encode_names.
+    """
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+
+
+def _write_names(views, side, table):
+    """
+    Copies an encoded name table into its sections.
+    """
+    if table is not None:
+        views[f'{side}_name_offsets'][:] = table[0]
+        views[f'{side}_name_bytes'][:] = table[1]
+
+#------------------------------------------------------------------------------------------------------------
+##Saving and Loading
+
+def save_market(path, students, schools=None, include_ranks=False):
+    """
+    Writes a school choice market to a binary file that load_market maps into memory.
+    
+    Args:
+    path (str): Path of the file to write.
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school
+                                     preferences, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are dictionaries containing 'priorities'
+                    and 'capacity' (or capacities alone). Omitted when a SchoolMarket is given.
+    include_ranks (bool): If True, also stores the priority rank of every application (one int32 per listed pair),
+                          so that processes mapping the file share it instead of each looking it up. Default is False.
+    """
+    market = _school_market(students, schools)
+    if market.priority_classes is not None:
+        raise ValueError("Market files store strict priorities; save the market returned by break_ties")
+    if market.priority_scores is not None:
+        raise ValueError("Market files store priority lists, not scores")
+    student_indptr, student_indices = market.student_csr
+    has_priorities = market.priority_csr is not None
+    priority_indptr, priority_indices = market.priority_csr if has_priorities else (
+        np.zeros(len(market.school_names) + 1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+    
+    student_table = _encode_names(market.student_names)
+    school_table = _encode_names(market.school_names)
+    counts = {
+        'num_students': len(market.student_names),
+        'num_schools': len(market.school_names),
+        'student_nnz': len(student_indices),
+        'priority_nnz': len(priority_indices),
+        'has_priorities': int(has_priorities),
+        'has_ranks': int(has_priorities and include_ranks),
+        'student_name_bytes': -1 if student_table is None else len(student_table[1]),
+        'school_name_bytes': -1 if school_table is None else len(school_table[1]),
+    }
+    
+    buffer, views = _create(path, counts)
+    views['student_indptr'][:] = student_indptr
+    views['student_indices'][:] = student_indices
+    views['priority_indptr'][:] = priority_indptr
+    views['priority_indices'][:] = priority_indices
+    views['capacities'][:] = market.capacities
+    if counts['has_ranks']:
+        views['application_ranks'][:] = market.application_ranks()
+    _write_names(views, 'student', student_table)
+    _write_names(views, 'school', school_table)
+    buffer.flush()
+
+
+def load_market(path, names=True):
+    """
+    Maps a market file written by save_market or import_csv into memory as a SchoolMarket.
+    
+    The preference, priority and capacity arrays are views of the mapped file, so nothing is copied
+    or parsed, and processes mapping the same file share its pages. Pickling the market (e.g. to send
+    it to run_many workers) only sends the path, and each worker maps the file again.
+    
+    Args:
+    path (str): Path of the market file.
+    names (bool): If True, decodes the stored names. If False, students and schools are named by their ids.
+                  Default is True.
+    
+    Returns:
+    SchoolMarket: The market, accepted by every school choice mechanism.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    magic, version, *values = _HEADER.unpack(buffer[:_HEADER.size].tobytes())
+    if magic != _MAGIC:
+        raise ValueError(f"{path} is not a market file")
+    if version != _VERSION:
+        raise ValueError(f"Unsupported market file version {version}")
+    counts = dict(zip(_COUNTS, values))
+    
+    views = _section_views(buffer, _sections(counts)[0])
+    student_names = school_names = None
+    if names and counts['student_name_bytes'] >= 0:
+        student_names = _decode_names(views['student_name_offsets'], views['student_name_bytes'])
+    if names and counts['school_name_bytes'] >= 0:
+        school_names = _decode_names(views['school_name_offsets'], views['school_name_bytes'])
+    
+    priority_csr = None
+    if counts['has_priorities']:
+        priority_csr = (views['priority_indptr'], views['priority_indices'])
+    market = SchoolMarket.from_arrays((views['student_indptr'], views['student_indices']), views['capacities'],
+                                      priority_csr, student_names, school_names, views.get('application_ranks'))
+    market._reopen = (load_market, (os.path.abspath(path), names))
+    return market
+
+#------------------------------------------------------------------------------------------------------------
+##Streaming CSV Import
+
+def _read_rows(path, columns, delimiter, chunk_size):
+    """
+    Streams the selected columns of a CSV file with a header row, in chunks of rows.
+    
+    Yields:
+    list: For every chunk, one list of values per selected column (None columns yield None).
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        positions = [None if column is None else header.index(column) for column in columns]
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield [None if i is None else [row[i] for row in chunk] for i in positions]
+                chunk = []
+        if chunk:
+            yield [None if i is None else [row[i] for row in chunk] for i in positions]
+
+
+def _count_rows(path, columns, delimiter, chunk_size, row_index, other_index):
+    """
+    First pass over an edge file: assigns ids to new names and counts the entries of every row.
+    
+    Returns:
+    numpy.ndarray: Number of entries of every row id.
+    """
+    counts = np.zeros(0, dtype=np.int64)
+    for rows, others, _ in _read_rows(path, columns, delimiter, chunk_size):
+        ids = np.fromiter((row_index.setdefault(name, len(row_index)) for name in rows), dtype=np.int64,
+                          count=len(rows))
+        for name in others:
+            other_index.setdefault(name, len(other_index))
+        counts = np.pad(counts, (0, len(row_index) - len(counts)))
+        counts += np.bincount(ids, minlength=len(row_index))
+    return counts
+
+
+def _fill_rows(path, columns, delimiter, chunk_size, row_index, other_index, indptr, indices, keys):
+    """
+    Second pass over an edge file: scatters every entry into the segment of its row, then sorts every
+    segment by its key (rank or score, lower first; file order when there is no key column).
+    """
+    cursor = indptr[:-1].copy()
+    for rows, others, ranks in _read_rows(path, columns, delimiter, chunk_size):
+        row_ids = np.fromiter(map(row_index.__getitem__, rows), dtype=np.int64, count=len(rows))
+        other_ids = np.fromiter(map(other_index.__getitem__, others), dtype=np.int32, count=len(rows))
+        
+        # Entries of the same row keep their file order inside the chunk
+        order = np.argsort(row_ids, kind='stable')
+        sorted_rows = row_ids[order]
+        first = np.searchsorted(sorted_rows, sorted_rows)
+        positions = cursor[sorted_rows] + np.arange(len(rows)) - first
+        indices[positions] = other_ids[order]
+        if ranks is not None:
+            keys[positions] = np.array(ranks, dtype=np.float64)[order]
+        cursor += np.bincount(row_ids, minlength=len(cursor))
+    
+    if keys is None:
+        return
+    
+    # Sort the segments block by block, so memory stays bounded by the block size
+    block_entries = 1 << 22
+    start = 0
+    num_rows = len(indptr) - 1
+    while start < num_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + block_entries, side='right')) - 1
+        stop = min(max(stop, start + 1), num_rows)
+        begin, end = indptr[start], indptr[stop]
+        row = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+        order = np.lexsort((keys[begin:end], row))
+        indices[begin:end] = indices[begin:end][order]
+        start = stop
+
+
+def import_csv(path, applications, capacities, priorities=None, include_ranks=False, delimiter=',',
+               application_columns=('student', 'school', 'rank'), priority_columns=('school', 'student', 'rank'),
+               capacity_columns=('school', 'capacity'), chunk_size=65536, students=None, student_columns=('student',)):
+    """
+    Converts row-per-application CSV exports into a market file, without building dictionaries.
+    
+    Files are streamed in chunks: a first pass assigns ids and counts entries per student and school,
+    the output file is then allocated with its final size, and a second pass scatters the entries
+    straight into the mapped file. Memory use is bounded by the name tables and the chunk size.
+    
+    Args:
+    path (str): Path of the market file to write.
+    applications (str): CSV file with one row per (student, school) application.
+    capacities (str): CSV file with one row per school and its capacity; it fixes the order of the schools.
+    priorities (str, optional): CSV file with one row per (school, student) priority entry.
+    include_ranks (bool): If True, also stores the priority rank of every application. Default is False.
+    delimiter (str): CSV delimiter. Default is ','.
+    application_columns (tuple): Header names of the student, school and rank columns. Lower ranks are preferred;
+                                 if the rank column is None, the order of the rows is used.
+    priority_columns (tuple): Header names of the school, student and rank columns of the priorities.
+    capacity_columns (tuple): Header names of the school and capacity columns.
+    chunk_size (int): Number of CSV rows processed at once. Default is 65536.
+    students (str, optional): CSV file with one row per student; it fixes the order of the students. Schools rank
+                              the students they do not list after their list in this order, so giving the order of
+                              the original market reproduces its matchings. By default, students are numbered in
+                              the order they first appear in the applications, then in the priorities.
+    student_columns (tuple): Header name of the student column of the students file.
+    
+    Returns:
+    SchoolMarket: The imported market, mapped from the new file.
+    """
+    school_index = {}
+    capacity_values = []
+    for schools, values in _read_rows(capacities, capacity_columns, delimiter, chunk_size):
+        for school, value in zip(schools, values):
+            school_index.setdefault(school, len(school_index))
+            capacity_values.append(int(value))
+    
+    student_index = {}
+    if students is not None:
+        for names, in _read_rows(students, student_columns, delimiter, chunk_size):
+            for student in names:
+                student_index.setdefault(student, len(student_index))
+    num_listed = len(student_index)
+    
+    # First pass: name tables and list lengths
+    student_counts = _count_rows(applications, application_columns, delimiter, chunk_size, student_index,
+                                 school_index)
+    if len(school_index) != len(capacity_values):
+        raise ValueError("Every school in the applications must have a capacity")
+    priority_counts = np.zeros(len(school_index), dtype=np.int64)
+    if priorities is not None:
+        priority_counts = _count_rows(priorities, priority_columns, delimiter, chunk_size, school_index,
+                                      student_index)
+        if len(school_index) != len(capacity_values):
+            raise ValueError("Every school in the priorities must have a capacity")
+    if students is not None and len(student_index) != num_listed:
+        raise ValueError("Every student in the applications and priorities must be in the students file")
+    
+    num_students, num_schools = len(student_index), len(school_index)
+    student_counts = np.pad(student_counts, (0, num_students - len(student_counts)))
+    priority_counts = np.pad(priority_counts, (0, num_schools - len(priority_counts)))
+    student_table = _encode_names(list(student_index))
+    school_table = _encode_names(list(school_index))
+    counts = {
+        'num_students': num_students,
+        'num_schools': num_schools,
+        'student_nnz': int(student_counts.sum()),
+        'priority_nnz': int(priority_counts.sum()),
+        'has_priorities': int(priorities is not None),
+        'has_ranks': int(priorities is not None and include_ranks),
+        'student_name_bytes': -1 if student_table is None else len(student_table[1]),
+        'school_name_bytes': -1 if school_table is None else len(school_table[1]),
+    }
+    buffer, views = _create(path, counts)
+    np.cumsum(student_counts, out=views['student_indptr'][1:])
+    np.cumsum(priority_counts, out=views['priority_indptr'][1:])
+    views['capacities'][:] = capacity_values
+    _write_names(views, 'student', student_table)
+    _write_names(views, 'school', school_table)
+    
+    # Second pass: scatter the entries, with sort keys in a temporary mapped file
+    edges = [('student', applications, application_columns, student_index, school_index)]
+    if priorities is not None:
+        edges.append(('priority', priorities, priority_columns, school_index, student_index))
+    for section, source, columns, row_index, other_index in edges:
+        indptr, indices = views[f'{section}_indptr'], views[f'{section}_indices']
+        if columns[2] is None or len(indices) == 0:
+            _fill_rows(source, columns, delimiter, chunk_size, row_index, other_index, indptr, indices, None)
+            continue
+        with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path))) as scratch:
+            keys = np.memmap(scratch, dtype=np.float64, mode='w+', shape=(len(indices),))
+            _fill_rows(source, columns, delimiter, chunk_size, row_index, other_index, indptr, indices, keys)
+            del keys
+    
+    if counts['has_ranks']:
+        views['application_ranks'][:] = _partner_ranks(views['student_indptr'], views['student_indices'],
+                                                       views['priority_indptr'], views['priority_indices'])
+    
+    buffer.flush()
+    del views, buffer
+    return load_market(path)
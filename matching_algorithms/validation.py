@@ -0,0 +1,240 @@
+import collections
+import numpy as np
+from matching_algorithms.cache import cached
+from matching_algorithms.profiles import _admission_ranks, _marriage_profile, _school_market, _score_ranks
+
+##Stability Checks
+
+StabilityReport = collections.namedtuple(
+    'StabilityReport', ['is_stable', 'num_blocking_pairs', 'blocking_pairs', 'side1_flags', 'side2_flags'])
+StabilityReport.__doc__ = """
+Result of a stability check.
+
+Fields:
+is_stable (bool): True if the matching has no blocking pair.
+num_blocking_pairs (int): Number of blocking pairs.
+blocking_pairs (list): Blocking pairs as (side1 agent, side2 agent) tuples.
+side1_flags (dict): For every side1 agent, True if it belongs to at least one blocking pair.
+side2_flags (dict): For every side2 agent, True if it belongs to at least one blocking pair.
+"""
+
+
+def _blocking_pair_ids(indptr1, indices1, scores1, scores2, partner_ranks, indptr2, current1, current2,
+                       chunk_size=None):
+    """
+    Finds all blocking pairs of a two-sided matching, walking the listed pairs of side1 in chunks of rows.
+    
+    Args:
+    indptr1 (numpy.ndarray): CSR row pointers of the side1 preference lists.
+    indices1 (numpy.ndarray): CSR side2 ids of the side1 preference lists.
+    scores1 (numpy.ndarray): Score of every side1 entry, aligned with indices1; higher is better.
+    scores2 (numpy.ndarray): Score of every side2 entry, aligned with the side2 lists.
+    partner_ranks (numpy.ndarray): Position of the side1 agent in the list of the side2 agent of every side1 entry,
+                                   or -1 if it is not listed (the pair is unacceptable).
+    indptr2 (numpy.ndarray): CSR row pointers of the side2 preference lists.
+    current1 (numpy.ndarray): Score every side1 agent gives its current partner (-inf if unmatched).
+    current2 (numpy.ndarray): Score every side2 agent gives its current partner (-inf if unmatched).
+    chunk_size (int, optional): Number of side1 agents processed at once. By default chunks hold about 16M pairs.
+    
+    Returns:
+    tuple: (side1 ids, side2 ids) of the blocking pairs.
+    """
+    num1 = len(indptr1) - 1
+    if chunk_size is None:
+        chunk_size = max(1, (1 << 24) * num1 // max(1, len(indices1)))
+    
+    found1, found2 = [], []
+    for start in range(0, num1, chunk_size):
+        stop = min(start + chunk_size, num1)
+        entries = np.arange(indptr1[start], indptr1[stop])
+        rows = np.repeat(np.arange(start, stop), np.diff(indptr1[start:stop + 1]))
+        partners = indices1[entries].astype(np.int64)
+        ranks = partner_ranks[entries]
+        
+        # Pairs the side1 agent prefers to its partner, then the side2 agent's view of them
+        better = np.flatnonzero((ranks >= 0) & (scores1[entries] > current1[rows]))
+        back = scores2[indptr2[partners[better]] + ranks[better]]
+        blocking = better[back > current2[partners[better]]]
+        found1.append(rows[blocking])
+        found2.append(partners[blocking])
+    
+    if not found1:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs1, pairs2 = np.concatenate(found1), np.concatenate(found2)
+    order = np.lexsort((pairs2, pairs1))
+    return pairs1[order], pairs2[order]
+
+
+def _entry_scores(profile, side):
+    """
+    Returns the score every agent of a side gives each entry of its list: the valuation, or minus the position.
+    """
+    if profile.is_cardinal:
+        return profile.weights(side)
+    indptr, indices = profile.csr(side)
+    lengths = np.diff(indptr)
+    return -(np.arange(len(indices)) - np.repeat(indptr[:-1], lengths)).astype(np.float64)
+
+
+def _current_scores(indptr, indices, scores, partner):
+    """
+    Returns the score every agent gives its current partner, or -inf if unmatched or the partner is not listed.
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    current = np.full(len(indptr) - 1, -np.inf)
+    is_partner = indices == partner[rows]
+    current[rows[is_partner]] = scores[is_partner]
+    return current
+
+
+def _stability_report(side1, side2, pairs1, pairs2):
+    """
+    Assembles a StabilityReport from the ids of the blocking pairs.
+    """
+    flags1 = np.zeros(len(side1), dtype=bool)
+    flags2 = np.zeros(len(side2), dtype=bool)
+    flags1[pairs1] = True
+    flags2[pairs2] = True
+    return StabilityReport(
+        is_stable=len(pairs1) == 0,
+        num_blocking_pairs=len(pairs1),
+        blocking_pairs=[(side1[i], side2[j]) for i, j in zip(pairs1.tolist(), pairs2.tolist())],
+        side1_flags=dict(zip(side1, flags1.tolist())),
+        side2_flags=dict(zip(side2, flags2.tolist())),
+    )
+
+
+@cached()
+def stability_report(matching, side1_preferences, side2_preferences=None, is_cardinal=False, chunk_size=None):
+    """
+    Finds every blocking pair of a one-to-one matching.
+    
+    Preferences are compiled once, and every listed pair is checked with array operations over chunks
+    of rows, so the check is linear in the number of listed pairs.
+    
+    Args:
+    matching (dict): A dictionary representing the matching, where keys are side1 agents and values are their matched side2 agents.
+    side1_preferences (dict or PreferenceProfile): A dictionary where keys are side1 agents and values are either lists (ordinal) or dicts (cardinal) of side2 agents, or a PreferenceProfile.
+    side2_preferences (dict): A dictionary where keys are side2 agents and values are either lists (ordinal) or dicts (cardinal) of side1 agents. Omitted when a PreferenceProfile is given.
+    is_cardinal (bool): If True, preferences are cardinal valuations. If False, preferences are ordinal. Ignored for a PreferenceProfile.
+    chunk_size (int, optional): Number of side1 agents checked at once, bounding the memory of the check.
+    
+    Returns:
+    StabilityReport: The blocking pairs and per-agent flags. Agents missing from a preference list are
+                     treated as unacceptable and unmatched agents prefer any acceptable partner.
+    """
+    profile = _marriage_profile(side1_preferences, side2_preferences, is_cardinal)
+    side1, side2 = profile.names
+    index1, index2 = profile.index
+    (indptr1, indices1), (indptr2, indices2) = profile.csr(0), profile.csr(1)
+    scores1, scores2 = _entry_scores(profile, 0), _entry_scores(profile, 1)
+    
+    # Score every agent gives to its current partner
+    partner1 = np.full(len(side1), -1, dtype=np.int64)
+    partner2 = np.full(len(side2), -1, dtype=np.int64)
+    for agent1, agent2 in matching.items():
+        if agent2 is not None:
+            i, j = index1[agent1], index2[agent2]
+            partner1[i] = j
+            partner2[j] = i
+    current1 = _current_scores(indptr1, indices1, scores1, partner1)
+    current2 = _current_scores(indptr2, indices2, scores2, partner2)
+    
+    pairs1, pairs2 = _blocking_pair_ids(indptr1, indices1, scores1, scores2, profile.partner_ranks(0), indptr2,
+                                        current1, current2, chunk_size)
+    return _stability_report(side1, side2, pairs1, pairs2)
+
+
+@cached()
+def school_stability_report(matching, students, schools=None):
+    """
+    Finds every blocking pair of a school choice assignment, such as the output of school_choice_da.
+    
+    A student and a school block the assignment when the student prefers the school to their own
+    assignment and the school either has an empty seat (waste) or admitted a student with lower
+    priority (justified envy). Only the schools each student ranks are inspected; students a school
+    does not list rank below its listed students, by id, as in school_choice_da. With priority classes,
+    only a student of a strictly better class than an admitted student has justified envy.
+    
+    Args:
+    matching (dict): A dictionary where keys are school names and values are lists of assigned students.
+    students (dict or SchoolMarket): A dictionary where keys are student names and values are lists of school names
+                                     in order of preference, or a SchoolMarket of the whole market.
+    schools (dict): A dictionary where keys are school names and values are dictionaries containing:
+                    'priorities': list of student names in order of priority
+                    'capacity': integer representing the school's capacity
+                    Omitted when a SchoolMarket is given.
+    
+    Returns:
+    StabilityReport: The blocking (student, school) pairs, with side1 flags for students and side2 flags for schools.
+    """
+    market = _school_market(students, schools)
+    student_names, school_names = market.student_names, market.school_names
+    student_index, school_index = market.student_index, market.school_index
+    num_students = len(student_names)
+    
+    indptr, indices = market.student_csr
+    priority_ranks = _admission_ranks(market)
+    capacities = market.capacities
+    lengths = np.diff(indptr)
+    student = np.repeat(np.arange(num_students), lengths)
+    position = np.arange(len(indices)) - indptr[student]
+    
+    # Current school of every student
+    assigned = np.full(num_students, -1, dtype=np.int64)
+    admitted = np.zeros(len(school_names), dtype=np.int64)
+    for school, members in matching.items():
+        c = school_index[school]
+        ids = np.fromiter(map(student_index.__getitem__, members), dtype=np.int64, count=len(members))
+        assigned[ids] = c
+        admitted[c] = len(ids)
+    
+    # Priority rank of the last admitted student of every school, read on the entries of the assignment
+    own_position = np.full(num_students, np.iinfo(np.int64).max)
+    is_own = indices == assigned[student]
+    own_position[student[is_own]] = position[is_own]
+    cutoff = np.full(len(school_names), -1, dtype=np.int64)
+    np.maximum.at(cutoff, indices[is_own], priority_ranks[is_own])
+    off_list = np.flatnonzero((assigned != -1) & (own_position == np.iinfo(np.int64).max))
+    if market.priority_scores is not None:
+        # Score-based priorities rank every student at every school
+        np.maximum.at(cutoff, assigned[off_list], _score_ranks(market, assigned[off_list], off_list))
+    else:
+        priority_indptr, priority_indices = market.priority_csr
+        for s in off_list.tolist():
+            # A student assigned to a school off their list
+            c = assigned[s]
+            found = np.flatnonzero(priority_indices[priority_indptr[c]:priority_indptr[c + 1]] == s)
+            if market.priority_classes is None:
+                rank = found[0] if len(found) else priority_indptr[c + 1] - priority_indptr[c] + s
+            else:
+                classes = market.priority_classes[priority_indptr[c]:priority_indptr[c + 1]]
+                rank = classes[found[0]] if len(found) else (classes[-1] + 1 if len(classes) else 0)
+            cutoff[c] = max(cutoff[c], rank)
+    
+    # Schools with empty seats accept every student
+    cutoff[admitted < capacities] = np.iinfo(np.int64).max
+    
+    # Candidate pairs are the schools a student ranks above their assignment
+    candidate = position < own_position[student]
+    student, school = student[candidate], indices[candidate].astype(np.int64)
+    blocking = priority_ranks[candidate] < cutoff[school]
+    return _stability_report(student_names, school_names, student[blocking], school[blocking])
+
+
+@cached()
+def is_stable(matching, side1_preferences, side2_preferences=None, is_cardinal=False):
+    """
+    Check if a given matching is stable under the given preferences or valuations.
+    
+    Args:
+    matching (dict): A dictionary representing the matching, where keys are side1 agents and values are their matched side2 agents.
+    side1_preferences (dict or PreferenceProfile): A dictionary where keys are side1 agents and values are either lists (ordinal) or dicts (cardinal) of side2 agents, or a PreferenceProfile.
+    side2_preferences (dict): A dictionary where keys are side2 agents and values are either lists (ordinal) or dicts (cardinal) of side1 agents. Omitted when a PreferenceProfile is given.
+    is_cardinal (bool): If True, preferences are cardinal valuations. If False, preferences are ordinal. Ignored for a PreferenceProfile.
+    
+    Returns:
+    bool: True if the matching is stable, False otherwise. Use stability_report to list the blocking pairs.
+    """
+    
+    return stability_report(matching, side1_preferences, side2_preferences, is_cardinal).is_stable
@@ -16,8 +16,12 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
-    install_requires=['numpy', 'pulp'],
+    python_requires='>=3.7',
+    install_requires=['numpy>=1.20', 'pulp'],
+    extras_require={'scipy': ['scipy>=1.6'], 'highs': ['highspy']},
+    entry_points={
+        'console_scripts': ['matching-bench=matching_algorithms.bench:main_cli'],
+    },
     
 )
 